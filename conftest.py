@@ -3,6 +3,11 @@ from tempfile import TemporaryDirectory
 import pathlib
 from unittest.mock import patch
 
+from ultra.sfjwt import CredentialModel
+
+# The fake instance the tests run against, every request to it is expected to be mocked.
+INSTANCE_URL = "https://test.my.salesforce.com"
+
 
 @pytest.fixture
 def get_temp_home():
@@ -15,3 +20,75 @@ def get_temp_home():
         with patch.object(pathlib.Path, "home") as mock_home:
             mock_home.return_value = pathlib.Path(temp_dir)
             yield temp_dir
+
+
+@pytest.fixture()
+def test_credentials():
+    """
+    Credentials pointing at INSTANCE_URL.
+    """
+    yield CredentialModel(
+        username="test@salesforce.com",
+        consumer_id="3MwDP8_5DfNOLW29.CAgn",
+        environment="sandbox",
+        instance_url=INSTANCE_URL,
+        token="test_token",
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_limits_monitor(monkeypatch):
+    """
+    Every test starts with a limits monitor without credentials or usage, as every run of the CLI does, so a
+    session opened by one test does not make another read /limits.
+    """
+    from ultra.limits import LimitsMonitor, default_monitor
+
+    for name, value in vars(LimitsMonitor()).items():
+        monkeypatch.setattr(default_monitor, name, value)
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--bench",
+        action="store_true",
+        help="Run the benchmarks marked bench, which are skipped otherwise.",
+    )
+    parser.addoption(
+        "--bench-dataset",
+        action="append",
+        default=None,
+        help="A dataset size to benchmark on, 10MB, 1GB or 10GB. Repeat to run several, defaults to 10MB.",
+    )
+    parser.addoption(
+        "--bench-work-dir",
+        default="./bench",
+        help="The directory the benchmark datasets are generated in and kept between runs.",
+    )
+    parser.addoption(
+        "--bench-output",
+        default=None,
+        help="Write the benchmark results as JSON to this path.",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "bench: a benchmark, only run when pytest is given --bench"
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "bench_dataset" in metafunc.fixturenames:
+        metafunc.parametrize(
+            "bench_dataset", metafunc.config.getoption("bench_dataset") or ["10MB"]
+        )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("bench"):
+        return
+    skip_bench = pytest.mark.skip(reason="benchmarks only run with --bench")
+    for item in items:
+        if "bench" in item.keywords:
+            item.add_marker(skip_bench)
@@ -0,0 +1,67 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from ultra import bench
+
+
+@pytest.fixture(scope="session")
+def bench_results(request):
+    """
+    Collects the result of every benchmark run, and writes them to --bench-output at the end of the session.
+    """
+    results = []
+    yield results
+    output = request.config.getoption("bench_output")
+    if output and results:
+        Path(output).write_text(json.dumps(bench.benchmark_report(results), indent=2))
+
+
+def test_write_dataset_is_reused(tmp_path):
+    files = bench.write_dataset(str(tmp_path), 100_000, record_size=100)
+    modified = [Path(file).stat().st_mtime_ns for file in files]
+
+    assert bench.write_dataset(str(tmp_path), 100_000, record_size=100) == files
+    assert [Path(file).stat().st_mtime_ns for file in files] == modified
+    lines = Path(files[0]).read_bytes().splitlines()
+    assert lines[0] == b'"LastName","Company","Description"'
+    assert {len(line) for line in lines[1:]} == {99}
+    assert 100_000 <= sum(Path(file).stat().st_size for file in files) < 101_000
+
+
+def test_compare_reports_flags_slower_benchmarks():
+    def report(*speeds):
+        return {
+            "results": [
+                {"benchmark": name, "dataset": "10MB", "mb_per_second": speed}
+                for name, speed in zip(bench.BENCHMARKS, speeds)
+            ]
+        }
+
+    regressions = bench.compare_reports(
+        report(100.0, 100.0, 100.0), report(95.0, 80.0, 200.0), tolerance=0.1
+    )
+
+    assert regressions == [
+        {
+            "benchmark": bench.BENCHMARKS[1],
+            "dataset": "10MB",
+            "baseline_mb_per_second": 100.0,
+            "mb_per_second": 80.0,
+        }
+    ]
+
+
+@pytest.mark.bench
+@pytest.mark.parametrize("name", bench.BENCHMARKS)
+def test_benchmark(name, bench_dataset, bench_results, request):
+    if name in ("download_query_data", "ingest_job_data_batches"):
+        pytest.importorskip("uvicorn")
+    result = bench.run_benchmark(
+        name, bench_dataset, request.config.getoption("bench_work_dir")
+    )
+    bench_results.append(result)
+
+    assert result.get("failed_batches", 0) == 0
+    assert result["bytes"] >= bench.DATASET_SIZES[bench_dataset]
@@ -0,0 +1,803 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+import gzip
+import json
+from pathlib import Path
+
+import httpx
+import pytest
+import respx
+
+from ultra import bulk2
+from ultra.concurrency import AIMDController
+from ultra.metrics import MetricsRecorder
+from ultra.polling import PollBackoff
+from ultra.retry import RetryBudget, RetryPolicy
+from ultra.watermarks import WatermarkStore
+from conftest import INSTANCE_URL
+
+JOB_ID = "7503h00000ABCDEFG"
+RESULTS_URL = f"{INSTANCE_URL}/services/data/v53.0/jobs/query/{JOB_ID}/results"
+
+
+def make_batch(download_path, batch_start=0, batch_size=1000, **kwargs) -> bulk2.Batch:
+    return bulk2.Batch(
+        base_path=INSTANCE_URL,
+        job_id=JOB_ID,
+        batch_start=batch_start,
+        batch_size=batch_size,
+        api_version="53.0",
+        object="Lead",
+        download_path=str(download_path),
+        **kwargs,
+    )
+
+
+class TestQueryDownload:
+    @respx.mock
+    def test_a_get_query_data_streams_to_file(self, tmp_path, test_credentials):
+        """
+        The streamed batch file should match the response body byte for byte, even when the chunk size is much
+        smaller than the body.
+        """
+        body = b'"Id","Name"\n' + b"".join(
+            f'"00Q{i:012d}","Name {i}"\n'.encode() for i in range(500)
+        )
+        route = respx.get(RESULTS_URL).mock(
+            return_value=httpx.Response(200, content=body)
+        )
+
+        batch = asyncio.run(
+            bulk2.a_get_query_data(
+                make_batch(tmp_path, chunk_size=64), credentials=test_credentials
+            )
+        )
+
+        # httpx asks for gzip by default, results are only compressed when asked for.
+        assert route.calls.last.request.headers["Accept-Encoding"] == "identity"
+        assert batch.status == "COMPLETE"
+        assert batch.attempt_count == 1
+        assert Path(batch.downloaded_file_path).read_bytes() == body
+
+    @respx.mock
+    def test_a_get_query_data_failure(self, tmp_path, test_credentials):
+        respx.get(RESULTS_URL).mock(
+            return_value=httpx.Response(400, json=[{"errorCode": "INVALIDJOBSTATE"}])
+        )
+
+        batch = asyncio.run(
+            bulk2.a_get_query_data(make_batch(tmp_path), credentials=test_credentials)
+        )
+
+        assert batch.status == "FAILED"
+        assert "INVALIDJOBSTATE" in batch.message
+        assert batch.downloaded_file_path is None
+
+    @respx.mock
+    def test_a_get_query_data_retries_interrupted_bodies_from_the_budget(
+        self, mocker, tmp_path, test_credentials
+    ):
+        """
+        A body cut off after the headers is requested again, taking a retry from the run's budget, while errors
+        before the headers are only retried by the transport.
+        """
+        mocker.patch.object(RetryPolicy, "delay", return_value=0)
+        budget = mocker.patch("ultra.retry.default_budget", RetryBudget(retries=10))
+        body = b'"Id"\n"1"\n'
+
+        async def interrupted():
+            yield body[:5]
+            raise httpx.ReadTimeout("timed out")
+
+        respx.get(RESULTS_URL).mock(
+            side_effect=[
+                httpx.Response(200, content=interrupted()),
+                httpx.Response(200, content=body),
+            ]
+        )
+
+        batch = asyncio.run(
+            bulk2.a_get_query_data(make_batch(tmp_path), credentials=test_credentials)
+        )
+
+        assert batch.status == "COMPLETE"
+        assert batch.attempt_count == 2
+        assert Path(batch.downloaded_file_path).read_bytes() == body
+        assert budget.used == 1
+
+        route = respx.get(RESULTS_URL).mock(side_effect=httpx.ReadTimeout("timed out"))
+
+        batch = asyncio.run(
+            bulk2.a_get_query_data(make_batch(tmp_path), credentials=test_credentials)
+        )
+
+        assert batch.status == "FAILED"
+        assert "timed out" in batch.message
+        # Two calls made above, and max_attempts by the transport alone.
+        assert route.call_count == 2 + RetryPolicy().max_attempts
+        assert budget.used == 1 + RetryPolicy().max_attempts - 1
+
+    def test_pull_batches_requeues_throttled_batches_from_the_budget(
+        self, mocker, tmp_path, test_credentials
+    ):
+        budget = mocker.patch("ultra.bulk2.default_budget", RetryBudget(retries=2))
+
+        class ThrottledPool:
+            calls = 0
+
+            async def apply(self, function, args):
+                self.calls += 1
+                return args[0].copy(update={"status": "FAILED", "status_code": 429})
+
+        pool = ThrottledPool()
+
+        (batch,) = asyncio.run(
+            bulk2.pull_batches(
+                [make_batch(tmp_path)],
+                credentials=test_credentials,
+                controller=AIMDController(initial=1, minimum=1, maximum=2),
+                pool=pool,
+                retry_policy=RetryPolicy(initial=0),
+            )
+        )
+
+        assert batch.status_code == 429
+        assert pool.calls == 3
+        assert budget.used == 2
+
+    @respx.mock
+    def test_pull_batches_waits_for_the_retry_after_of_throttled_batches(
+        self, mocker, tmp_path, test_credentials
+    ):
+        budget = mocker.patch("ultra.bulk2.default_budget", RetryBudget(retries=2))
+        sleep = mocker.patch("ultra.bulk2.asyncio.sleep", new=mocker.AsyncMock())
+        respx.get(RESULTS_URL).mock(
+            side_effect=[
+                httpx.Response(429, headers={"Retry-After": "7"}),
+                httpx.Response(
+                    200,
+                    content=b'"Id"\n"1"\n',
+                    headers={"Sforce-NumberOfRecords": "1"},
+                ),
+            ]
+        )
+
+        class InlinePool:
+            async def apply(self, function, args):
+                async with httpx.AsyncClient(base_url=INSTANCE_URL) as async_client:
+                    return await bulk2.a_get_query_data(
+                        args[0],
+                        async_client=async_client,
+                        credentials=test_credentials,
+                    )
+
+        (batch,) = asyncio.run(
+            bulk2.pull_batches(
+                [make_batch(tmp_path)],
+                credentials=test_credentials,
+                controller=AIMDController(initial=1, minimum=1, maximum=2),
+                pool=InlinePool(),
+                retry_policy=RetryPolicy(initial=0),
+            )
+        )
+
+        assert batch.status == "COMPLETE"
+        sleep.assert_awaited_once_with(7.0)
+        assert budget.used == 1
+
+    @respx.mock
+    def test_download_query_data_following_locators_uses_the_controller(
+        self, mocker, tmp_path, test_credentials
+    ):
+        mocker.patch.object(RetryPolicy, "delay", return_value=0)
+        respx.get(RESULTS_URL.rsplit("/", 1)[0]).mock(
+            return_value=httpx.Response(
+                200,
+                json={"id": JOB_ID, "object": "Lead", "numberRecordsProcessed": 2},
+            )
+        )
+        respx.get(RESULTS_URL).mock(return_value=httpx.Response(429))
+        controller = AIMDController(initial=4, verbose=False)
+
+        completed = bulk2.CompletedJob.parse_raw(
+            bulk2.download_query_data(
+                job_id=JOB_ID,
+                download_path=str(tmp_path),
+                controller=controller,
+                credentials=test_credentials,
+            )
+        )
+
+        assert [batch.status_code for batch in completed.batches] == [429]
+        assert controller.limit == 2
+        assert controller.in_flight == 0
+
+    @respx.mock
+    def test_a_get_query_data_decompresses_gzip(self, tmp_path, test_credentials):
+        body = b'"Id","Name"\n' + b'"00Q000000000001","Name"\n' * 500
+        route = respx.get(RESULTS_URL).mock(
+            return_value=httpx.Response(
+                200,
+                content=gzip.compress(body),
+                headers={"Content-Encoding": "gzip"},
+            )
+        )
+
+        batch = asyncio.run(
+            bulk2.a_get_query_data(
+                make_batch(tmp_path, chunk_size=64, compress=True),
+                credentials=test_credentials,
+            )
+        )
+
+        assert route.calls.last.request.headers["Accept-Encoding"] == "gzip"
+        assert batch.status == "COMPLETE"
+        assert Path(batch.downloaded_file_path).read_bytes() == body
+        assert batch.file_size == len(body)
+        assert batch.bytes_transferred < batch.file_size
+
+    @respx.mock
+    def test_a_follow_query_locators(self, tmp_path, test_credentials):
+        """
+        Pages should be requested with the locator returned by the previous page until Salesforce returns null.
+        """
+        pages = {
+            None: (b'"Id"\n"1"\n"2"\n', "MTAwMA"),
+            "MTAwMA": (b'"Id"\n"3"\n', "null"),
+        }
+
+        def results(request):
+            body, locator = pages[request.url.params.get("locator")]
+            assert request.url.params["maxRecords"] == "2"
+            return httpx.Response(
+                200,
+                content=body,
+                headers={
+                    "Sforce-Locator": locator,
+                    "Sforce-NumberOfRecords": str(body.count(b"\n") - 1),
+                },
+            )
+
+        route = respx.get(RESULTS_URL).mock(side_effect=results)
+
+        batches = asyncio.run(
+            bulk2.a_follow_query_locators(
+                make_batch(tmp_path, batch_size=2), credentials=test_credentials
+            )
+        )
+
+        assert route.call_count == 2
+        assert [batch.status for batch in batches] == ["COMPLETE", "COMPLETE"]
+        assert [batch.batch_start for batch in batches] == [0, 2]
+        assert [batch.locator for batch in batches] == [None, "MTAwMA"]
+        assert batches[-1].next_locator is None
+        assert Path(batches[1].downloaded_file_path).read_bytes() == b'"Id"\n"3"\n'
+
+    @respx.mock
+    def test_a_follow_query_locators_records_metrics(
+        self, tmp_path, test_credentials, mocker
+    ):
+        recorder = mocker.patch.object(bulk2, "default_recorder", MetricsRecorder())
+        respx.get(RESULTS_URL).mock(
+            return_value=httpx.Response(
+                200,
+                content=b'"Id"\n"1"\n"2"\n',
+                headers={"Sforce-Locator": "null", "Sforce-NumberOfRecords": "2"},
+            )
+        )
+
+        asyncio.run(
+            bulk2.a_follow_query_locators(
+                make_batch(tmp_path, batch_size=2),
+                credentials=test_credentials,
+                controller=AIMDController(),
+            )
+        )
+
+        (metric,) = recorder.batches
+        assert (metric.kind, metric.status, metric.records, metric.bytes) == (
+            "query",
+            "COMPLETE",
+            2,
+            13,
+        )
+        assert metric.elapsed >= metric.time_to_first_byte >= 0
+        assert metric.queue_wait >= 0
+
+    @respx.mock
+    def test_pull_batch_reuses_worker_client(self, tmp_path, test_credentials):
+        respx.get(RESULTS_URL).mock(
+            return_value=httpx.Response(200, content=b'"Id"\n"1"\n')
+        )
+        bulk2._init_worker(test_credentials, bulk2.ClientPoolOptions())
+
+        async def pull_two():
+            first = await bulk2._pull_batch(make_batch(tmp_path, batch_start=0))
+            client = bulk2._worker_client
+            second = await bulk2._pull_batch(make_batch(tmp_path, batch_start=1))
+            assert bulk2._worker_client is client
+            await client.aclose()
+            return [first, second]
+
+        batches = asyncio.run(pull_two())
+
+        assert [batch.status for batch in batches] == ["COMPLETE", "COMPLETE"]
+
+
+class TestBatchManifest:
+    def test_last_entry_wins_and_truncated_lines_are_ignored(self, tmp_path):
+        manifest = bulk2.BatchManifest(download_path=str(tmp_path), job_id=JOB_ID)
+        manifest.append(make_batch(tmp_path, batch_start=0, status="FAILED"))
+        manifest.append(make_batch(tmp_path, batch_start=0, status="COMPLETE"))
+        manifest.append(make_batch(tmp_path, batch_start=1000))
+        with open(manifest.path, "a") as manifest_out:
+            manifest_out.write('{"base_path": "https://')
+
+        batches = manifest.load()
+
+        assert sorted(batches) == [0, 1000]
+        assert batches[0].status == "COMPLETE"
+
+    def test_resume_locator_template(self, tmp_path):
+        def downloaded_page(batch_start, record_count, next_locator):
+            file_path = Path(tmp_path, f"{JOB_ID}_{batch_start:012d}.csv")
+            file_path.write_bytes(b'"Id"\n' * (record_count + 1))
+            return make_batch(
+                tmp_path,
+                batch_start=batch_start,
+                status="COMPLETE",
+                record_count=record_count,
+                next_locator=next_locator,
+                downloaded_file_path=str(file_path),
+                file_size=file_path.stat().st_size,
+            )
+
+        first = downloaded_page(0, 2, "Mg")
+        second = downloaded_page(2, 2, "NA")
+        # The second page's file was truncated after it was recorded, so it has to be downloaded again.
+        Path(second.downloaded_file_path).write_bytes(b"")
+
+        downloaded, template = bulk2._resume_locator_template(
+            make_batch(tmp_path, batch_size=2), {0: first, 2: second}
+        )
+
+        assert downloaded == [first]
+        assert template.batch_start == 2
+        assert template.locator == "Mg"
+
+        last = downloaded_page(2, 1, None)
+        downloaded, template = bulk2._resume_locator_template(
+            make_batch(tmp_path, batch_size=2), {0: first, 2: last}
+        )
+        assert downloaded == [first, last]
+        assert template is None
+
+    @respx.mock
+    def test_a_follow_query_locators_records_pages(self, tmp_path, test_credentials):
+        respx.get(RESULTS_URL).mock(
+            return_value=httpx.Response(
+                200,
+                content=b'"Id"\n"1"\n',
+                headers={"Sforce-Locator": "null", "Sforce-NumberOfRecords": "1"},
+            )
+        )
+        manifest = bulk2.BatchManifest(download_path=str(tmp_path), job_id=JOB_ID)
+
+        asyncio.run(
+            bulk2.a_follow_query_locators(
+                make_batch(tmp_path),
+                credentials=test_credentials,
+                manifest=manifest,
+            )
+        )
+
+        recorded = manifest.load()[0]
+        assert bulk2.batch_is_downloaded(recorded)
+        assert recorded.record_count == 1
+
+
+INGEST_URL = f"{INSTANCE_URL}/services/data/v53.0/jobs/ingest"
+
+
+class TestIngest:
+    @pytest.mark.parametrize("pipeline", [False, True])
+    @respx.mock
+    def test_ingest_job_data_batches_loads_every_batch(
+        self, tmp_path, test_credentials, pipeline
+    ):
+        source = Path(tmp_path, "source")
+        source.mkdir()
+        rows = []
+        for index in range(3):
+            file_rows = [f"Name {index}_{i},Company\n" for i in range(50)]
+            rows += file_rows
+            Path(source, f"leads_{index}.csv").write_text(
+                "LastName,Company\n" + "".join(file_rows)
+            )
+        working_directory = Path(tmp_path, "work")
+
+        job_ids = iter(f"7503h0000000{i:03d}" for i in range(100))
+        respx.post(INGEST_URL).mock(
+            side_effect=lambda request: httpx.Response(
+                200, json={"id": next(job_ids), "state": "Open"}
+            )
+        )
+        uploads = respx.put(url__regex=rf"{INGEST_URL}/\w+/batches").mock(
+            return_value=httpx.Response(201)
+        )
+        respx.patch(url__regex=rf"{INGEST_URL}/\w+").mock(
+            return_value=httpx.Response(200, json={"state": "UploadComplete"})
+        )
+
+        results = bulk2.ingest_job_data_batches(
+            object_name="Lead",
+            operation="insert",
+            path_or_file=str(source),
+            pattern="*.csv",
+            batch_size=1000,
+            version="53.0",
+            working_directory=str(working_directory),
+            credentials=test_credentials,
+            max_concurrent_jobs=3,
+            pipeline=pipeline,
+        )
+
+        assert len(results) == uploads.call_count > 1
+        assert {result["state"] for result in results} == {"UploadComplete"}
+        assert len({result["id"] for result in results}) == len(results)
+        # Every upload is sent as csv, even though the jobs share a client.
+        assert all(
+            call.request.headers["Content-Type"] == "text/csv" for call in uploads.calls
+        )
+
+    @pytest.mark.parametrize("pipeline", [False, True])
+    @respx.mock
+    def test_ingest_job_data_batches_aborts_a_failed_upload(
+        self, mocker, tmp_path, test_credentials, pipeline
+    ):
+        """
+        An upload that fails after its retries aborts its own job, and the other jobs still load and report.
+        """
+        mocker.patch.object(RetryPolicy, "delay", return_value=0)
+        source = Path(tmp_path, "source")
+        source.mkdir()
+        Path(source, "leads.csv").write_text(
+            "LastName,Company\n" + "".join(f"Name {i},Company\n" for i in range(150))
+        )
+        failing_job = "7503h0000000001"
+
+        job_ids = iter(f"7503h0000000{i:03d}" for i in range(100))
+        respx.post(INGEST_URL).mock(
+            side_effect=lambda request: httpx.Response(
+                200, json={"id": next(job_ids), "state": "Open"}
+            )
+        )
+
+        def upload(request):
+            if failing_job in request.url.path:
+                raise httpx.ConnectError("refused")
+            return httpx.Response(201)
+
+        respx.put(url__regex=rf"{INGEST_URL}/\w+/batches").mock(side_effect=upload)
+        closes = respx.patch(url__regex=rf"{INGEST_URL}/\w+").mock(
+            side_effect=lambda request: httpx.Response(
+                200, json=json.loads(request.content)
+            )
+        )
+
+        results = bulk2.ingest_job_data_batches(
+            object_name="Lead",
+            operation="insert",
+            path_or_file=str(source),
+            pattern="*.csv",
+            batch_size=1100,
+            version="53.0",
+            working_directory=str(Path(tmp_path, "work")),
+            credentials=test_credentials,
+            max_concurrent_jobs=3,
+            pipeline=pipeline,
+        )
+
+        assert len(results) == 3
+        states = {result["id"]: result["state"] for result in results}
+        assert states.pop(failing_job) == "Aborted"
+        assert set(states.values()) == {"UploadComplete"}
+        (failed,) = [result for result in results if result["id"] == failing_job]
+        assert "ConnectError" in failed["message"]
+        assert closes.call_count == 3
+        (aborted,) = [
+            call.request
+            for call in closes.calls
+            if call.request.url.path.endswith(failing_job)
+        ]
+        assert json.loads(aborted.content) == {"state": "Aborted"}
+
+    @respx.mock
+    def test_load_ingest_job_data_streams_file(self, tmp_path, test_credentials):
+        file_path = Path(tmp_path, "batch_0.csv")
+        file_path.write_bytes(b"LastName,Company\n" + b"Name,Company\n" * 100)
+        upload = respx.put(f"{INGEST_URL}/{JOB_ID}/batches").mock(
+            return_value=httpx.Response(201)
+        )
+        respx.patch(f"{INGEST_URL}/{JOB_ID}").mock(return_value=httpx.Response(200))
+
+        result = bulk2.load_ingest_job_data(
+            job_id=JOB_ID,
+            file_path=str(file_path),
+            version="53.0",
+            credentials=test_credentials,
+            chunk_size=64,
+        )
+
+        assert result["state"] == "UploadComplete"
+        request = upload.calls.last.request
+        assert request.headers["Content-Length"] == str(file_path.stat().st_size)
+        assert request.read() == file_path.read_bytes()
+
+    @respx.mock
+    def test_load_ingest_job_data_compresses_upload(self, tmp_path, test_credentials):
+        file_path = Path(tmp_path, "batch_0.csv")
+        file_path.write_bytes(b"LastName,Company\n" + b"Name,Company\n" * 1000)
+        upload = respx.put(f"{INGEST_URL}/{JOB_ID}/batches").mock(
+            return_value=httpx.Response(201)
+        )
+        respx.patch(f"{INGEST_URL}/{JOB_ID}").mock(return_value=httpx.Response(200))
+
+        result = bulk2.load_ingest_job_data(
+            job_id=JOB_ID,
+            file_path=str(file_path),
+            version="53.0",
+            credentials=test_credentials,
+            chunk_size=64,
+            compress=True,
+        )
+
+        request = upload.calls.last.request
+        assert request.headers["Content-Encoding"] == "gzip"
+        assert gzip.decompress(request.read()) == file_path.read_bytes()
+        assert result["raw_bytes"] == file_path.stat().st_size
+        assert result["transferred_bytes"] < result["raw_bytes"]
+
+    @respx.mock
+    def test_wait_for_ingest_jobs_downloads_results(self, tmp_path, test_credentials):
+        states = iter(["InProgress", "JobComplete"])
+        status = respx.get(f"{INGEST_URL}/{JOB_ID}").mock(
+            side_effect=lambda request: httpx.Response(
+                200,
+                json={
+                    "id": JOB_ID,
+                    "state": next(states),
+                    "numberRecordsProcessed": 3,
+                    "numberRecordsFailed": 1,
+                },
+            )
+        )
+        for result_name in bulk2.INGEST_RESULT_FILES:
+            respx.get(f"{INGEST_URL}/{JOB_ID}/{result_name}/").mock(
+                return_value=httpx.Response(200, content=f"{result_name}\n".encode())
+            )
+        aborted = {"id": "7503h0000000001", "state": "Aborted"}
+
+        results = bulk2.wait_for_ingest_jobs(
+            [{"id": JOB_ID, "state": "UploadComplete"}, aborted],
+            version="53.0",
+            download_path=str(tmp_path),
+            credentials=test_credentials,
+            backoff=PollBackoff(initial=0),
+        )
+
+        assert status.call_count == 2
+        assert results[1] == aborted
+        assert results[0]["state"] == "JobComplete"
+        assert results[0]["numberRecordsFailed"] == 1
+        for result_name, file_path in results[0]["result_files"].items():
+            assert Path(file_path).read_text() == f"{result_name}\n"
+
+
+QUERY_URL = f"{INSTANCE_URL}/services/data/v53.0/jobs/query"
+
+
+class TestQueryManifest:
+    def test_load_query_manifest(self, tmp_path):
+        manifest_path = Path(tmp_path, "nightly.json")
+        manifest_path.write_text(
+            '{"queries": [{"object": "Lead", "query": "SELECT Id FROM Lead"},'
+            '{"object": "Account", "query": "SELECT Id FROM Account", "operation": "queryAll"}]}'
+        )
+
+        queries = bulk2.load_query_manifest(str(manifest_path))
+
+        assert [query.object for query in queries] == ["Lead", "Account"]
+        assert [query.operation for query in queries] == ["query", "queryAll"]
+
+    @respx.mock
+    def test_run_query_manifest(self, tmp_path, test_credentials):
+        job_ids = {"Lead": "750A", "Account": "750B"}
+
+        def create(request):
+            soql = json.loads(request.content)["query"]
+            if "Broken" in soql:
+                return httpx.Response(400, json=[{"errorCode": "INVALID_FIELD"}])
+            return httpx.Response(
+                200, json={"id": job_ids[soql.split()[-1]], "state": "UploadComplete"}
+            )
+
+        respx.post(QUERY_URL).mock(side_effect=create)
+        respx.get(url__regex=rf"{QUERY_URL}/750\w$").mock(
+            return_value=httpx.Response(
+                200, json={"state": "JobComplete", "numberRecordsProcessed": 1}
+            )
+        )
+        results_route = respx.get(url__regex=rf"{QUERY_URL}/750\w/results").mock(
+            return_value=httpx.Response(
+                200,
+                content=b'"Id"\n"1"\n',
+                headers={"Sforce-Locator": "null", "Sforce-NumberOfRecords": "1"},
+            )
+        )
+        controller = AIMDController(verbose=False)
+
+        results = bulk2.run_query_manifest(
+            queries=[
+                bulk2.QuerySpec(object="Lead", query="SELECT Id FROM Lead"),
+                bulk2.QuerySpec(object="Broken", query="SELECT Nope FROM Broken"),
+                bulk2.QuerySpec(object="Account", query="SELECT Id FROM Account"),
+            ],
+            download_path=str(tmp_path),
+            backoff=PollBackoff(initial=0),
+            controller=controller,
+            credentials=test_credentials,
+        )
+
+        assert [result.job_id for result in results] == ["750A", None, "750B"]
+        assert [result.state for result in results] == [
+            "JobComplete",
+            "Failed",
+            "JobComplete",
+        ]
+        assert results_route.call_count == 2
+        assert controller.in_flight == 0
+        for result in (results[0], results[2]):
+            assert [batch.status for batch in result.batches] == ["COMPLETE"]
+            assert Path(result.download_path).name == result.object
+            assert bulk2.batch_is_downloaded(result.batches[0])
+
+    @respx.mock
+    def test_run_split_query(self, tmp_path, test_credentials):
+        respx.get(f"{INSTANCE_URL}/services/data/v53.0/query").mock(
+            return_value=httpx.Response(
+                200,
+                json={
+                    "totalSize": 3,
+                    "done": True,
+                    "records": [
+                        {"Id": "00Q3h000000AAAAEA0"},
+                        {"Id": "00Q3h000000AAABEA0"},
+                        {"Id": "00Q3h00000zzzzzEA0"},
+                    ],
+                },
+            )
+        )
+        queries = []
+
+        def create(request):
+            queries.append(json.loads(request.content)["query"])
+            return httpx.Response(
+                200, json={"id": f"750{len(queries)}", "state": "UploadComplete"}
+            )
+
+        respx.post(QUERY_URL).mock(side_effect=create)
+        respx.get(url__regex=rf"{QUERY_URL}/750\w$").mock(
+            return_value=httpx.Response(
+                200, json={"state": "JobComplete", "numberRecordsProcessed": 1}
+            )
+        )
+        respx.get(url__regex=rf"{QUERY_URL}/750\w/results").mock(
+            return_value=httpx.Response(
+                200,
+                content=b'"Id"\n"1"\n',
+                headers={"Sforce-Locator": "null", "Sforce-NumberOfRecords": "1"},
+            )
+        )
+
+        split_manifest = bulk2.run_split_query(
+            query="SELECT Id FROM Lead WHERE IsConverted = false",
+            chunks=3,
+            download_path=str(tmp_path),
+            backoff=PollBackoff(initial=0),
+            controller=AIMDController(verbose=False),
+            credentials=test_credentials,
+        )
+
+        assert len(queries) == 3
+        assert all("WHERE (IsConverted = false) AND Id" in query for query in queries)
+        assert "Id < '00Q3h000000AAABEA0'" in queries[0]
+        assert "Id >= '00Q3h00000zzzzzEA0'" in queries[2]
+        assert [job["record_count"] for job in split_manifest["jobs"]] == [1, 1, 1]
+        assert (
+            json.loads(Path(tmp_path, "Lead.split.json").read_text()) == split_manifest
+        )
+        files = [file for job in split_manifest["jobs"] for file in job["files"]]
+        assert len(set(files)) == 3
+        assert all(Path(file).parent == tmp_path for file in files)
+
+    @respx.mock
+    def test_sample_id_boundaries_follows_the_pages(self, test_credentials):
+        # Most of the records sit at the end of the Id range, the boundaries follow them.
+        ids = [f"00Q3h0000{index:09d}" for index in (1, 2)] + [
+            f"00Q3h0009{index:09d}" for index in range(10)
+        ]
+        query_route = respx.get(f"{INSTANCE_URL}/services/data/v53.0/query").mock(
+            return_value=httpx.Response(
+                200,
+                json={
+                    "totalSize": 12,
+                    "done": False,
+                    "records": [{"Id": id} for id in ids[:5]],
+                    "nextRecordsUrl": "/services/data/v53.0/query/01gA-5",
+                },
+            )
+        )
+        more_route = respx.get(f"{INSTANCE_URL}/services/data/v53.0/query/01gA-5").mock(
+            return_value=httpx.Response(
+                200,
+                json={
+                    "totalSize": 12,
+                    "done": True,
+                    "records": [{"Id": id} for id in ids[5:]],
+                },
+            )
+        )
+
+        boundaries = bulk2.sample_id_boundaries(
+            "Lead", chunks=4, version="53.0", credentials=test_credentials
+        )
+
+        assert boundaries == [ids[3], ids[6], ids[9]]
+        assert query_route.calls.last.request.url.params["q"] == (
+            "SELECT Id FROM Lead ORDER BY Id"
+        )
+        assert more_route.call_count == 1
+
+    @respx.mock
+    def test_run_query_manifest_moves_watermark(self, tmp_path, test_credentials):
+        watermarks = WatermarkStore(str(Path(tmp_path, "watermarks.json")))
+        watermarks.set(
+            INSTANCE_URL, "Lead", datetime(2021, 7, 1, 12, 30, tzinfo=timezone.utc)
+        )
+        create = respx.post(QUERY_URL).mock(
+            return_value=httpx.Response(
+                200,
+                json={
+                    "id": "750A",
+                    "state": "UploadComplete",
+                    "createdDate": "2021-07-02T08:00:00.000+0000",
+                },
+            )
+        )
+        respx.get(f"{QUERY_URL}/750A").mock(
+            return_value=httpx.Response(
+                200, json={"state": "JobComplete", "numberRecordsProcessed": 0}
+            )
+        )
+
+        bulk2.run_query_manifest(
+            queries=[
+                bulk2.QuerySpec(
+                    object="Lead", query="SELECT Id FROM Lead", incremental=True
+                )
+            ],
+            download_path=str(tmp_path),
+            backoff=PollBackoff(initial=0),
+            credentials=test_credentials,
+            watermarks=watermarks,
+            overlap=timedelta(minutes=10),
+        )
+
+        assert (
+            json.loads(create.calls.last.request.content)["query"]
+            == "SELECT Id FROM Lead WHERE SystemModstamp > 2021-07-01T12:20:00Z"
+        )
+        assert watermarks.get(INSTANCE_URL, "Lead") == datetime(
+            2021, 7, 2, 8, tzinfo=timezone.utc
+        )
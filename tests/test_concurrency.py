@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from ultra.concurrency import AIMDController
+
+
+class TestAIMDController:
+    def test_bounds_are_validated(self):
+        with pytest.raises(ValueError):
+            AIMDController(minimum=4, maximum=2)
+
+    def test_additive_increase_after_a_healthy_window(self):
+        controller = AIMDController(initial=2, maximum=4, verbose=False)
+
+        async def succeed(count):
+            for _ in range(count):
+                await controller.record_success(latency=0.1)
+
+        asyncio.run(succeed(2))
+        assert controller.limit == 3
+        asyncio.run(succeed(3))
+        assert controller.limit == 4
+        # The limit never grows past the maximum.
+        asyncio.run(succeed(10))
+        assert controller.limit == 4
+
+    def test_slow_requests_hold_the_limit(self):
+        controller = AIMDController(initial=1, verbose=False)
+
+        async def run():
+            await controller.record_success(latency=0.1)
+            assert controller.limit == 2
+            await controller.record_success(latency=1.0)
+            await controller.record_success(latency=1.0)
+
+        asyncio.run(run())
+        assert controller.limit == 2
+
+    def test_burst_of_backoffs_decreases_once(self):
+        controller = AIMDController(initial=16, verbose=False)
+
+        async def run():
+            async with controller.slot() as first:
+                async with controller.slot() as second:
+                    await controller.record_backoff("HTTP 429", epoch=first)
+                    await controller.record_backoff("HTTP 429", epoch=second)
+
+        asyncio.run(run())
+        assert controller.limit == 8
+        asyncio.run(controller.record_backoff("read timeout"))
+        assert controller.limit == 4
+
+    def test_slots_respect_the_limit(self):
+        controller = AIMDController(initial=2, verbose=False)
+        peak = 0
+
+        async def request():
+            nonlocal peak
+            async with controller.slot():
+                peak = max(peak, controller.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*[request() for _ in range(10)])
+
+        asyncio.run(run())
+        assert peak == 2
+        assert controller.in_flight == 0
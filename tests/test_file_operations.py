@@ -0,0 +1,156 @@
+from pathlib import Path
+
+import pytest
+
+import csv
+import io
+
+from ultra.file_operations import (
+    combine_file_in_buffers,
+    combine_files,
+    split_csv_files,
+    write_atomic,
+)
+
+HEADER = b"LastName,Company\n"
+
+
+@pytest.fixture()
+def csv_files(tmp_path):
+    """
+    Three csv files of varying record lengths, the last without a trailing newline.
+    """
+    files = []
+    for index in range(3):
+        records = [f"Name {index}_{i * 7},Company {i}\n".encode() for i in range(200)]
+        body = HEADER + b"".join(records)
+        if index == 2:
+            body = body.rstrip(b"\n")
+        file_path = Path(tmp_path, f"leads_{index}.csv")
+        file_path.write_bytes(body)
+        files.append(str(file_path))
+    yield files
+
+
+def records_of(files):
+    records = []
+    for file_path in files:
+        records += Path(file_path).read_bytes().splitlines(keepends=False)[1:]
+    return records
+
+
+class TestCombineFileInBuffers:
+    @pytest.mark.parametrize("block_size", [16, 100, 4096])
+    def test_chunks_respect_limit_and_keep_every_record(self, csv_files, block_size):
+        chunks = [
+            chunk.getvalue()
+            for chunk in combine_file_in_buffers(
+                files=csv_files, file_size_limit=1000, block_size=block_size
+            )
+        ]
+
+        assert len(chunks) > 1
+        assert all(len(chunk) <= 1000 for chunk in chunks)
+        assert all(chunk.startswith(HEADER) for chunk in chunks)
+        assert all(chunk.endswith(b"\n") for chunk in chunks)
+        combined = [record for chunk in chunks for record in chunk.splitlines()[1:]]
+        assert combined == records_of(csv_files)
+
+    def test_record_longer_than_limit_gets_its_own_chunk(self, tmp_path):
+        file_path = Path(tmp_path, "long.csv")
+        long_record = b"Name," + b"x" * 200 + b"\n"
+        file_path.write_bytes(HEADER + b"a,b\n" + long_record + b"c,d\n")
+
+        chunks = [
+            chunk.getvalue()
+            for chunk in combine_file_in_buffers(
+                files=[str(file_path)], file_size_limit=100, block_size=32
+            )
+        ]
+
+        assert chunks == [
+            HEADER + b"a,b\n",
+            HEADER + long_record,
+            HEADER + b"c,d\n",
+        ]
+
+
+class TestSplitCsvFiles:
+    @pytest.fixture()
+    def quoted_csv(self, tmp_path):
+        """
+        A csv with quoted fields holding newlines, escaped quotes and commas.
+        """
+        rows = [
+            [f"Name {i}", f'Line one\nline "two", {i}\n\nline four' * (i % 3)]
+            for i in range(300)
+        ]
+        file_path = Path(tmp_path, "quoted.csv")
+        with open(file_path, "w", newline="") as file_out:
+            writer = csv.writer(file_out, lineterminator="\n")
+            writer.writerow(["LastName", "Description"])
+            writer.writerows(rows)
+        yield str(file_path), rows
+
+    @pytest.mark.parametrize("block_size", [7, 64, 4096])
+    def test_quoted_newlines_are_never_split(self, quoted_csv, block_size):
+        file_path, rows = quoted_csv
+
+        parsed = []
+        for chunk in split_csv_files(
+            files=[file_path], file_size_limit=2000, block_size=block_size
+        ):
+            assert len(chunk.buffer.getvalue()) <= 2000
+            chunk_rows = list(csv.reader(io.StringIO(chunk.buffer.getvalue().decode())))
+            assert chunk_rows[0] == ["LastName", "Description"]
+            assert len(chunk_rows) - 1 == chunk.record_count
+            parsed += chunk_rows[1:]
+
+        assert parsed == rows
+
+    @pytest.mark.parametrize("block_size", [7, 4096])
+    def test_record_limit(self, quoted_csv, csv_files, block_size):
+        file_path, rows = quoted_csv
+
+        counts = [
+            chunk.record_count
+            for chunk in split_csv_files(
+                files=[file_path] + csv_files,
+                file_size_limit=100000,
+                max_records=64,
+                block_size=block_size,
+            )
+        ]
+
+        assert counts[:-1] == [64] * (len(counts) - 1)
+        assert sum(counts) == len(rows) + len(records_of(csv_files))
+
+
+def test_combine_files(csv_files, tmp_path, capsys):
+    output_directory = Path(tmp_path, "out")
+
+    result = combine_files(
+        path_or_file=str(tmp_path),
+        pattern="leads_*.csv",
+        output_directory=str(output_directory),
+        file_size_limit=2000,
+    )
+
+    assert result.status == "success"
+    assert len(result.payload) == len(result.record_counts) > 1
+    combined = records_of(result.payload)
+    assert sorted(combined) == sorted(records_of(csv_files))
+    # Progress goes to stderr, stdout is kept for the JSON results of the commands.
+    output = capsys.readouterr()
+    assert output.out == ""
+    assert output.err.count(" records\n") == len(result.payload)
+
+
+def test_write_atomic_replaces_the_file(tmp_path):
+    file_path = Path(tmp_path, "state", "watermarks.json")
+
+    write_atomic(file_path, "first")
+    write_atomic(str(file_path), "second")
+
+    assert file_path.read_text() == "second"
+    assert [path.name for path in file_path.parent.iterdir()] == ["watermarks.json"]
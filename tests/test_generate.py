@@ -0,0 +1,76 @@
+import csv
+import io
+
+import pytest
+
+from ultra.generate import OBJECT_COLUMNS, generate_batch, batch_specs, generate_csv
+
+
+def generate(**options) -> bytes:
+    out = io.BytesIO()
+    written = generate_csv(out, **options)
+    assert written == len(out.getvalue())
+    return out.getvalue()
+
+
+def read_rows(data: bytes):
+    return list(csv.DictReader(io.StringIO(data.decode(), newline="")))
+
+
+@pytest.mark.parametrize("object_name", list(OBJECT_COLUMNS))
+def test_generate_csv_writes_the_rows_asked_for(object_name):
+    rows = read_rows(
+        generate(object_name=object_name, rows=250, batch_size=100, processes=1)
+    )
+
+    assert len(rows) == 250
+    assert list(rows[0]) == [column.name for column in OBJECT_COLUMNS[object_name]]
+    if "Email" in rows[0]:
+        assert len({row["Email"] for row in rows}) == 250
+
+
+def test_generate_csv_is_the_same_for_a_seed_whatever_the_processes():
+    options = dict(
+        object_name="Lead",
+        rows=1000,
+        batch_size=100,
+        multibyte_rate=0.1,
+        newline_rate=0.1,
+    )
+
+    single = generate(seed=7, processes=1, **options)
+
+    assert generate(seed=7, processes=3, **options) == single
+    assert generate(seed=8, processes=1, **options) != single
+
+
+def test_generate_csv_embeds_newlines_and_multibyte_text():
+    data = generate(
+        object_name="Contact",
+        rows=1000,
+        batch_size=500,
+        processes=1,
+        multibyte_rate=0.2,
+        newline_rate=0.2,
+    )
+    rows = read_rows(data)
+
+    assert len(rows) == 1000
+    assert data.count(b"\n") > 1001
+    assert 150 < sum("\n" in row["Description"] for row in rows) < 250
+    assert any(not row["LastName"].isascii() for row in rows)
+    assert all(row["Email"].isascii() for row in rows)
+
+
+def test_generate_batch_quotes_values():
+    (spec,) = batch_specs("Account", rows=50, seed=0, batch_size=50)
+
+    lines = generate_batch(spec).decode().splitlines()
+
+    assert len(lines) == 50
+    assert all(line.startswith('"') and line.endswith('"') for line in lines)
+
+
+def test_generate_csv_rejects_unknown_objects():
+    with pytest.raises(ValueError):
+        generate(object_name="Opportunity", rows=1)
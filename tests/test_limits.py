@@ -0,0 +1,177 @@
+import io
+
+import httpx
+import pytest
+import respx
+
+from ultra import bulk2
+from ultra.limits import LimitsMonitor, default_monitor
+from ultra.retry import RetryPolicy, RetryTransport
+from conftest import INSTANCE_URL
+
+QUERY_URL = f"{INSTANCE_URL}/services/data/v53.0/jobs/query"
+LIMITS_URL = f"{INSTANCE_URL}/services/data/v53.0/limits"
+
+
+def usage(used: int, maximum: int = 1000) -> httpx.Response:
+    return httpx.Response(
+        200, headers={"Sforce-Limit-Info": f"api-usage={used}/{maximum}"}
+    )
+
+
+def test_observe_reads_the_api_usage_header():
+    monitor = LimitsMonitor()
+    monitor.observe(usage(25, 5000))
+    monitor.observe(usage(40, 5000))
+    monitor.observe(httpx.Response(200))
+
+    assert (monitor.first_api_used, monitor.api_used, monitor.api_max) == (25, 40, 5000)
+    assert monitor.remaining_fraction() == pytest.approx(0.992)
+
+
+@pytest.mark.parametrize(
+    "used, delay", [(500, 0.0), (800, 0.0), (850, 0.5), (900, 60.0), (990, 60.0)]
+)
+def test_delay_slows_down_then_pauses_at_the_reserve(used, delay):
+    monitor = LimitsMonitor(reserve=0.1, slow_delay=1.0, pause_interval=60.0)
+    monitor.observe(usage(used))
+
+    assert monitor.delay() == pytest.approx(delay)
+
+
+def test_no_reserve_never_delays():
+    monitor = LimitsMonitor(reserve=0)
+    monitor.observe(usage(1000))
+
+    assert monitor.delay() == 0.0
+
+
+@respx.mock
+def test_wait_reads_limits_until_requests_are_available(test_credentials, mocker):
+    sleep = mocker.patch("ultra.limits.time.sleep")
+    respx.get(LIMITS_URL).mock(
+        side_effect=[
+            httpx.Response(
+                200, json={"DailyApiRequests": {"Max": 1000, "Remaining": 50}}
+            ),
+            httpx.Response(
+                200, json={"DailyApiRequests": {"Max": 1000, "Remaining": 500}}
+            ),
+        ]
+    )
+    monitor = LimitsMonitor(reserve=0.1, pause_interval=60.0)
+    monitor.attach(test_credentials)
+    monitor.observe(usage(950))
+
+    monitor.wait()
+
+    assert [call.args for call in sleep.call_args_list] == [(60.0,), (60.0,)]
+    assert monitor.api_used == 500
+
+
+@respx.mock
+def test_transport_reports_usage_and_waits_on_the_monitor(mocker):
+    sleep = mocker.patch("ultra.limits.time.sleep")
+    respx.get(QUERY_URL).mock(return_value=usage(850))
+    monitor = LimitsMonitor(reserve=0.1, slow_delay=1.0)
+
+    with httpx.Client(
+        transport=RetryTransport(policy=RetryPolicy(initial=0), monitor=monitor)
+    ) as client:
+        client.get(QUERY_URL)
+        client.get(QUERY_URL)
+
+    assert monitor.api_used == 850
+    sleep.assert_called_once_with(pytest.approx(0.5))
+
+
+@respx.mock
+def test_report_prints_usage_and_bulk_allocations(test_credentials, mocker):
+    respx.get(LIMITS_URL).mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "DailyApiRequests": {"Max": 1000, "Remaining": 880},
+                "DailyBulkV2QueryJobs": {"Max": 10000, "Remaining": 9990},
+            },
+        )
+    )
+    err = mocker.patch("ultra.limits.stderr", new=io.StringIO())
+    monitor = LimitsMonitor()
+    monitor.attach(test_credentials)
+    monitor.observe(usage(100))
+
+    monitor.report()
+
+    assert "API requests: 20 used by this run, 880 of 1000 left today" in err.getvalue()
+    assert "DailyBulkV2QueryJobs: 9990 of 10000 left" in err.getvalue()
+
+
+@respx.mock
+def test_limits_are_read_with_the_runs_api_version(test_credentials):
+    respx.get(f"{INSTANCE_URL}/services/data/v58.0/jobs/query").mock(
+        return_value=usage(100)
+    )
+    limits = respx.get(f"{INSTANCE_URL}/services/data/v58.0/limits").mock(
+        return_value=httpx.Response(
+            200, json={"DailyApiRequests": {"Max": 1000, "Remaining": 880}}
+        )
+    )
+    monitor = LimitsMonitor()
+    monitor.attach(test_credentials)
+
+    with httpx.Client(
+        transport=RetryTransport(policy=RetryPolicy(initial=0), monitor=monitor)
+    ) as client:
+        client.get(f"{INSTANCE_URL}/services/data/v58.0/jobs/query")
+    monitor.fetch_limits()
+
+    assert monitor.version == "58.0"
+    assert limits.call_count == 1
+
+    monitor.attach(test_credentials, version="59.0")
+    assert monitor.version == "59.0"
+
+
+@respx.mock
+def test_check_job_refuses_jobs_past_the_reserve(test_credentials, mocker):
+    limits = respx.get(LIMITS_URL).mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "DailyBulkV2QueryJobs": {"Max": 100, "Remaining": 12},
+                "DailyBulkV2QueryFileStorageMB": {"Max": 1000, "Remaining": 900},
+                "DailyBulkApiBatches": {"Max": 100, "Remaining": 0},
+            },
+        )
+    )
+    monitor = LimitsMonitor(reserve=0.1)
+    monitor.attach(test_credentials)
+
+    assert monitor.check_job("query") is None
+    assert monitor.check_job("query") is None
+    refused = monitor.check_job("query")
+    assert refused.startswith("DailyBulkV2QueryJobs: 10 of 100 left")
+    assert monitor.check_job("ingest").startswith("DailyBulkApiBatches: 0 of 100")
+    # /limits is read once per refresh_interval, the jobs created are counted in between.
+    assert limits.call_count == 1
+
+
+@respx.mock
+def test_create_query_job_is_not_sent_past_the_reserve(test_credentials, mocker):
+    respx.get(LIMITS_URL).mock(
+        return_value=httpx.Response(
+            200, json={"DailyBulkV2QueryJobs": {"Max": 100, "Remaining": 5}}
+        )
+    )
+    create = respx.post(QUERY_URL).mock(return_value=httpx.Response(200, json={}))
+    mocker.patch("ultra.bulk2.stderr", new=io.StringIO())
+    default_monitor.reserve = 0.1
+    default_monitor.attach(test_credentials)
+
+    job = bulk2.create_query_job(
+        query="SELECT Id FROM Lead", version="53.0", credentials=test_credentials
+    )
+
+    assert job[0]["errorCode"] == "API_RESERVE_REACHED"
+    assert create.call_count == 0
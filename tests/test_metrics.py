@@ -0,0 +1,124 @@
+import json
+
+import httpx
+import pytest
+import respx
+
+from ultra.metrics import (
+    BatchMetric,
+    MetricsRecorder,
+    percentile,
+    summarize,
+    write_json_report,
+    write_prometheus_textfile,
+)
+from ultra.retry import RetryPolicy, RetryTransport
+
+URL = "https://test.my.salesforce.com/services/data/v53.0/jobs/query"
+
+
+def make_recorder() -> MetricsRecorder:
+    recorder = MetricsRecorder()
+    for index in range(1, 101):
+        recorder.record_batch(
+            BatchMetric(
+                kind="query",
+                status="COMPLETE" if index < 100 else "FAILED",
+                records=10,
+                bytes=1_000_000,
+                bytes_transferred=500_000,
+                elapsed=index / 100,
+                time_to_first_byte=0.1,
+                retries=1 if index % 10 == 0 else 0,
+            )
+        )
+    return recorder
+
+
+@pytest.mark.parametrize(
+    "quantile, expected", [(0.0, 1.0), (0.5, 2.5), (0.75, 3.25), (1.0, 4.0)]
+)
+def test_percentile_interpolates_between_ranks(quantile, expected):
+    assert percentile([4.0, 1.0, 3.0, 2.0], quantile) == pytest.approx(expected)
+
+
+def test_summarize_skips_missing_values():
+    assert summarize([None, None]) is None
+    summary = summarize([None, 2.0, 1.0])
+    assert (summary["count"], summary["sum"], summary["max"]) == (2, 3.0, 2.0)
+    assert summary["p50"] == pytest.approx(1.5)
+
+
+def test_report_totals_and_percentiles():
+    report = make_recorder().report()
+
+    totals = report["totals"]
+    assert (totals["batches"], totals["failed_batches"], totals["records"]) == (
+        100,
+        1,
+        1000,
+    )
+    assert (totals["bytes"], totals["bytes_transferred"], totals["retries"]) == (
+        100_000_000,
+        50_000_000,
+        10,
+    )
+    assert totals["mb_per_second"] > 0
+    assert report["batch_seconds"]["p50"] == pytest.approx(0.505)
+    assert report["batch_seconds"]["p99"] == pytest.approx(0.9901)
+    assert report["batch_mb_per_second"]["max"] == pytest.approx(50.0)
+    assert report["batch_queue_wait_seconds"] is None
+    assert len(report["batches"]) == 100
+
+
+def test_write_reports(tmp_path):
+    report = make_recorder().report()
+    json_path = tmp_path / "stats" / "run.json"
+    prometheus_path = tmp_path / "ultraloader.prom"
+
+    write_json_report(report, str(json_path))
+    write_prometheus_textfile(report, str(prometheus_path))
+
+    assert json.loads(json_path.read_text())["totals"]["batches"] == 100
+    lines = prometheus_path.read_text().splitlines()
+    assert "# TYPE ultraloader_batch_seconds summary" in lines
+    (p95,) = [
+        line.split()[-1]
+        for line in lines
+        if line.startswith('ultraloader_batch_seconds{quantile="0.95"}')
+    ]
+    assert float(p95) == pytest.approx(0.9505)
+    assert "ultraloader_batch_seconds_count 100" in lines
+    assert "ultraloader_records 1000" in lines
+    assert not any("queue_wait" in line for line in lines)
+    assert list(tmp_path.glob(".*.tmp")) == []
+
+
+@respx.mock
+def test_transport_records_requests_and_retries():
+    respx.get(URL).mock(side_effect=[httpx.Response(503), httpx.Response(200)])
+    respx.post(URL).mock(side_effect=httpx.ConnectError("refused"))
+    recorder = MetricsRecorder()
+
+    with httpx.Client(
+        transport=RetryTransport(
+            policy=RetryPolicy(initial=0, max_attempts=2), recorder=recorder
+        )
+    ) as client:
+        client.get(URL)
+        with pytest.raises(httpx.ConnectError):
+            client.post(URL, json={})
+
+    get, post = recorder.requests
+    assert (get.method, get.path, get.status_code, get.retries) == (
+        "GET",
+        "/services/data/v53.0/jobs/query",
+        200,
+        1,
+    )
+    assert (post.status_code, post.error, post.retries) == (None, "ConnectError", 1)
+    assert post.request_bytes == 2
+    assert recorder.report()["requests"]["status_codes"] == {
+        "200": 1,
+        "ConnectError": 1,
+    }
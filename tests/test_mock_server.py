@@ -0,0 +1,220 @@
+import asyncio
+import gzip
+import io
+
+import httpx
+from starlette.testclient import TestClient
+
+from ultra import bulk2
+from ultra.generate import generate_csv
+from ultra.mock_server import MockServerOptions, create_app
+from conftest import INSTANCE_URL
+
+JOBS_PATH = "/services/data/v53.0/jobs"
+
+
+def mock_client(**options) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=create_app(MockServerOptions(**options))),
+        base_url=INSTANCE_URL,
+    )
+
+
+async def create_completed_query_job(client: httpx.AsyncClient, query: str) -> dict:
+    job = (await client.post(f"{JOBS_PATH}/query", json={"query": query})).json()
+    return (await client.get(f"{JOBS_PATH}/query/{job['id']}")).json()
+
+
+def test_query_job_results_follow_locators(tmp_path, test_credentials):
+
+    async def run():
+        async with mock_client(records=250, record_size=100) as client:
+            job = await create_completed_query_job(client, "SELECT Id FROM Lead")
+            batches = await bulk2.a_follow_query_locators(
+                bulk2.Batch(
+                    base_path=INSTANCE_URL,
+                    job_id=job["id"],
+                    batch_start=0,
+                    batch_size=100,
+                    api_version="53.0",
+                    object="Lead",
+                    download_path=str(tmp_path),
+                ),
+                async_client=client,
+                credentials=test_credentials,
+            )
+            return job, batches
+
+    job, batches = asyncio.run(run())
+
+    assert (job["state"], job["numberRecordsProcessed"]) == ("JobComplete", 250)
+    assert [batch.record_count for batch in batches] == [100, 100, 50]
+    assert [batch.status for batch in batches] == ["COMPLETE"] * 3
+    lines = b"".join(
+        open(batch.downloaded_file_path, "rb").read() for batch in batches
+    ).splitlines()
+    assert lines[0] == b'"Id","Name","Description"'
+    assert len(lines) == 251
+    assert all(len(line) == 99 for line in lines[1:])
+
+
+def test_results_are_gzipped_and_limited_by_the_query():
+    async def run():
+        async with mock_client(records=1000) as client:
+            job = await create_completed_query_job(
+                client, "SELECT Id FROM Lead ORDER BY Id LIMIT 10"
+            )
+            return await client.get(
+                f"{JOBS_PATH}/query/{job['id']}/results",
+                headers={"Accept-Encoding": "gzip"},
+            )
+
+    response = asyncio.run(run())
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Sforce-NumberOfRecords"] == "10"
+    assert response.headers["Sforce-Locator"] == "null"
+    assert response.text.count("\n") == 11
+
+
+def test_ingest_upload_counts_records():
+    body = b'"LastName"\n' + b"".join(b'"Name %d"\n' % i for i in range(42))
+
+    async def run():
+        async with mock_client() as client:
+            job = (
+                await client.post(
+                    f"{JOBS_PATH}/ingest",
+                    json={"object": "Contact", "operation": "insert"},
+                )
+            ).json()
+            upload = await client.put(
+                f"{JOBS_PATH}/ingest/{job['id']}/batches",
+                content=gzip.compress(body),
+                headers={"Content-Type": "text/csv", "Content-Encoding": "gzip"},
+            )
+            await client.patch(
+                f"{JOBS_PATH}/ingest/{job['id']}", json={"state": "UploadComplete"}
+            )
+            status = await client.get(f"{JOBS_PATH}/ingest/{job['id']}")
+            results = await client.get(
+                f"{JOBS_PATH}/ingest/{job['id']}/successfulResults"
+            )
+            return upload, status.json(), results
+
+    upload, job, results = asyncio.run(run())
+
+    assert upload.status_code == 201
+    assert (job["state"], job["numberRecordsProcessed"]) == ("JobComplete", 42)
+    assert results.text.count("\n") == 43
+
+
+def test_ingest_upload_counts_records_with_embedded_newlines(tmp_path):
+    out = io.BytesIO()
+    generate_csv(out, "Lead", rows=300, batch_size=100, processes=1, newline_rate=0.2)
+
+    async def run():
+        async with mock_client() as client:
+            job = (
+                await client.post(
+                    f"{JOBS_PATH}/ingest",
+                    json={"object": "Lead", "operation": "insert"},
+                )
+            ).json()
+            # Sent in small chunks, so quoted fields are split between them.
+            data = out.getvalue()
+
+            async def chunks():
+                for i in range(0, len(data), 7):
+                    yield data[i : i + 7]
+
+            await client.put(
+                f"{JOBS_PATH}/ingest/{job['id']}/batches", content=chunks()
+            )
+            await client.patch(
+                f"{JOBS_PATH}/ingest/{job['id']}", json={"state": "UploadComplete"}
+            )
+            return (await client.get(f"{JOBS_PATH}/ingest/{job['id']}")).json()
+
+    job = asyncio.run(run())
+
+    assert out.getvalue().count(b"\n") > 301
+    assert job["numberRecordsProcessed"] == 300
+
+
+def test_ingest_results_are_downloaded_when_jobs_finish(mocker, tmp_path):
+    app = create_app(MockServerOptions())
+    mocker.patch(
+        "ultra.bulk2.build_async_client",
+        side_effect=lambda **kwargs: httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url=INSTANCE_URL
+        ),
+    )
+    body = b'"LastName"\n' + b"".join(b'"Name %d"\n' % i for i in range(5))
+
+    async def upload() -> dict:
+        async with bulk2.build_async_client() as client:
+            job = (
+                await client.post(
+                    f"{JOBS_PATH}/ingest",
+                    json={"object": "Contact", "operation": "insert"},
+                )
+            ).json()
+            await client.put(f"{JOBS_PATH}/ingest/{job['id']}/batches", content=body)
+            await client.patch(
+                f"{JOBS_PATH}/ingest/{job['id']}", json={"state": "UploadComplete"}
+            )
+            return {"id": job["id"], "state": "UploadComplete"}
+
+    (finished,) = bulk2.wait_for_ingest_jobs(
+        [asyncio.run(upload())],
+        version="53.0",
+        download_path=str(tmp_path),
+        credentials=mocker.Mock(),
+    )
+
+    assert finished["state"] == "JobComplete"
+    assert all(path is not None for path in finished["result_files"].values())
+    with open(finished["result_files"]["successfulResults"]) as successful:
+        assert successful.read().count("\n") == 6
+
+
+def test_errors_are_injected_and_usage_reported():
+    async def run():
+        async with mock_client(error_rate=1.0, error_status_codes=(503,)) as client:
+            failed = await client.post(
+                f"{JOBS_PATH}/query", json={"query": "SELECT Id FROM Lead"}
+            )
+            limits = await client.get("/services/data/v53.0/limits")
+            return failed, limits
+
+    failed, limits = asyncio.run(run())
+
+    assert failed.status_code == 503
+    assert failed.json()[0]["errorCode"] == "SERVER_UNAVAILABLE"
+    assert limits.status_code == 200
+    assert limits.headers["Sforce-Limit-Info"] == "api-usage=2/100000"
+    assert limits.json()["DailyApiRequests"]["Remaining"] == 99998
+
+
+def test_query_splits_on_ids_read_from_the_rest_query_endpoint(test_credentials):
+    app = create_app(MockServerOptions(records=5000))
+
+    with TestClient(app) as client:
+        parts = bulk2.split_query(
+            "SELECT Id, Name FROM Lead",
+            chunks=4,
+            client=client,
+            credentials=test_credentials,
+        )
+        bad_query = client.get(
+            "/services/data/v53.0/query", params={"q": "SELECT Name FROM Lead"}
+        )
+
+    assert [predicate for predicate, _ in parts] == [
+        "Id < '00Q000000001250AAA'",
+        "Id >= '00Q000000001250AAA' AND Id < '00Q000000002500AAA'",
+        "Id >= '00Q000000002500AAA' AND Id < '00Q000000003750AAA'",
+        "Id >= '00Q000000003750AAA'",
+    ]
+    assert bad_query.status_code == 400
@@ -0,0 +1,91 @@
+import asyncio
+
+import httpx
+import respx
+
+from ultra.polling import PollBackoff, a_wait_for_job, a_watch_jobs
+from conftest import INSTANCE_URL
+
+JOB_ID = "7503h00000ABCDEFG"
+JOB_URL = f"{INSTANCE_URL}/services/data/v53.0/jobs/query/{JOB_ID}"
+
+
+@respx.mock
+def test_a_wait_for_job_backs_off_until_terminal(mocker):
+    states = iter(["UploadComplete", "InProgress", "InProgress", "JobComplete"])
+    route = respx.get(JOB_URL).mock(
+        side_effect=lambda request: httpx.Response(
+            200, json={"id": JOB_ID, "state": next(states)}
+        )
+    )
+    sleep = mocker.patch("ultra.polling.asyncio.sleep", new=mocker.AsyncMock())
+
+    async def wait():
+        async with httpx.AsyncClient(base_url=INSTANCE_URL) as async_client:
+            return await a_wait_for_job(
+                async_client,
+                job_id=JOB_ID,
+                kind="query",
+                version="53.0",
+                backoff=PollBackoff(initial=1, maximum=3, multiplier=2, jitter=0),
+            )
+
+    job = asyncio.run(wait())
+
+    assert job["state"] == "JobComplete"
+    assert route.call_count == 4
+    assert [call.args[0] for call in sleep.call_args_list] == [1, 2, 3]
+
+
+@respx.mock
+def test_a_wait_for_job_returns_errors():
+    respx.get(JOB_URL).mock(
+        return_value=httpx.Response(404, json=[{"errorCode": "NOT_FOUND"}])
+    )
+
+    async def wait():
+        async with httpx.AsyncClient(base_url=INSTANCE_URL) as async_client:
+            return await a_wait_for_job(
+                async_client, job_id=JOB_ID, kind="query", version="53.0"
+            )
+
+    assert asyncio.run(wait()) == [{"errorCode": "NOT_FOUND"}]
+
+
+def test_poll_backoff_delays_stay_within_jitter():
+    delays = PollBackoff(initial=1, maximum=8, multiplier=2, jitter=0.5).delays()
+
+    for expected in [1, 2, 4, 8, 8]:
+        assert expected * 0.5 <= next(delays) <= expected * 1.5
+
+
+@respx.mock
+def test_a_watch_jobs_yields_jobs_as_they_finish():
+    polls = {
+        "750A": iter(["InProgress", "InProgress", "JobComplete"]),
+        "750B": iter(["JobComplete"]),
+    }
+    respx.get(url__regex=rf"{INSTANCE_URL}/services/data/v53.0/jobs/query/\w+").mock(
+        side_effect=lambda request: httpx.Response(
+            200,
+            json={
+                "id": request.url.path.split("/")[-1],
+                "state": next(polls[request.url.path.split("/")[-1]]),
+            },
+        )
+    )
+
+    async def watch():
+        async with httpx.AsyncClient(base_url=INSTANCE_URL) as async_client:
+            return [
+                (job_id, job["state"])
+                async for job_id, job in a_watch_jobs(
+                    async_client,
+                    job_ids=["750A", "750B"],
+                    kind="query",
+                    version="53.0",
+                    backoff=PollBackoff(initial=0.01),
+                )
+            ]
+
+    assert asyncio.run(watch()) == [("750B", "JobComplete"), ("750A", "JobComplete")]
@@ -0,0 +1,56 @@
+import io
+
+from rich.console import Console
+
+from ultra.metrics import BatchMetric, MetricsRecorder
+from ultra.progress import RunProgress
+
+
+def make_batch(records: int, retries: int = 0) -> BatchMetric:
+    return BatchMetric(
+        kind="query",
+        status="COMPLETE",
+        records=records,
+        bytes=records * 100,
+        retries=retries,
+    )
+
+
+def test_progress_follows_the_recorder():
+    recorder = MetricsRecorder()
+    output = io.StringIO()
+    console = Console(file=output, force_terminal=True, width=200)
+
+    with RunProgress(
+        "Downloading", recorder=recorder, enabled=True, console=console
+    ) as progress:
+        recorder.expect(records=300, batches=3)
+        recorder.record_batch(make_batch(100))
+        recorder.record_batch(make_batch(100, retries=2))
+        (task,) = progress.progress.tasks
+
+        assert task.started
+        assert (task.completed, task.total) == (200, 300)
+        assert task.fields["batches"] == "2/3 batches"
+        assert task.fields["retries"] == 2
+
+    assert recorder.listeners == []
+    assert "200/300 records" in output.getvalue()
+
+
+def test_progress_waits_for_the_expected_records():
+    recorder = MetricsRecorder()
+
+    with RunProgress("Loading", recorder=recorder, enabled=False) as progress:
+        recorder.record_batch(make_batch(50))
+        (task,) = progress.progress.tasks
+
+        assert not task.started
+        assert task.fields["expected"] == "?"
+        assert task.fields["batches"] == "1 batches"
+
+
+def test_progress_is_off_without_a_terminal():
+    progress = RunProgress("Downloading", recorder=MetricsRecorder())
+
+    assert progress.progress.disable
@@ -0,0 +1,175 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+import respx
+
+from ultra.file_operations import FileChunks
+from ultra.retry import (
+    AsyncRetryTransport,
+    RetryBudget,
+    RetryPolicy,
+    RetryTransport,
+    parse_retry_after,
+)
+
+URL = "https://test.my.salesforce.com/services/data/v53.0/jobs/query"
+
+
+def build_client(budget: RetryBudget = None) -> httpx.Client:
+    return httpx.Client(
+        transport=RetryTransport(
+            policy=RetryPolicy(initial=0, max_attempts=3),
+            budget=budget or RetryBudget(),
+        )
+    )
+
+
+@respx.mock
+def test_retries_gateway_errors_and_lists_them():
+    route = respx.get(URL).mock(
+        side_effect=[
+            httpx.Response(503),
+            httpx.Response(502),
+            httpx.Response(200, json={"done": True}),
+        ]
+    )
+
+    with build_client() as client:
+        response = client.get(URL)
+
+    assert response.json() == {"done": True}
+    assert route.call_count == 3
+    assert response.extensions["retries"] == ["HTTP 503", "HTTP 502"]
+
+
+@pytest.mark.parametrize("status_code, call_count", [(500, 1), (429, 2)])
+@respx.mock
+def test_posts_are_only_retried_when_not_processed(status_code, call_count):
+    route = respx.post(URL).mock(
+        side_effect=[httpx.Response(status_code), httpx.Response(200)]
+    )
+
+    with build_client() as client:
+        client.post(URL, json={"operation": "query"})
+
+    assert route.call_count == call_count
+
+
+@respx.mock
+def test_retries_request_limit_exceeded():
+    route = respx.get(URL).mock(
+        side_effect=[
+            httpx.Response(403, json=[{"errorCode": "REQUEST_LIMIT_EXCEEDED"}]),
+            httpx.Response(403, json=[{"errorCode": "INSUFFICIENT_ACCESS"}]),
+        ]
+    )
+
+    with build_client() as client:
+        response = client.get(URL)
+
+    assert route.call_count == 2
+    assert response.json() == [{"errorCode": "INSUFFICIENT_ACCESS"}]
+
+
+@respx.mock
+def test_budget_is_shared_between_requests():
+    respx.get(URL).mock(return_value=httpx.Response(503))
+    budget = RetryBudget(retries=3)
+
+    with build_client(budget) as client:
+        first = client.get(URL)
+        second = client.get(URL)
+
+    assert len(first.extensions["retries"]) == 2
+    assert len(second.extensions["retries"]) == 1
+    assert budget.used == 3
+
+
+@respx.mock
+def test_async_retries_connection_errors():
+    route = respx.post(URL).mock(
+        side_effect=[httpx.ConnectError("refused"), httpx.Response(200)]
+    )
+
+    async def post():
+        async with httpx.AsyncClient(
+            transport=AsyncRetryTransport(
+                policy=RetryPolicy(initial=0), budget=RetryBudget()
+            )
+        ) as client:
+            return await client.post(URL, json={"operation": "query"})
+
+    response = asyncio.run(post())
+
+    assert response.status_code == 200
+    assert route.call_count == 2
+    assert response.extensions["retries"] == ["ConnectError"]
+
+
+def unavailable_then_ok():
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(request.read())
+        return httpx.Response(503 if len(bodies) == 1 else 200)
+
+    return bodies, handler
+
+
+def test_generator_bodies_are_not_retried():
+    bodies, handler = unavailable_then_ok()
+
+    def rows():
+        yield b"Name\n"
+        yield b"Acme\n"
+
+    with httpx.Client(
+        transport=RetryTransport(
+            transport=httpx.MockTransport(handler),
+            policy=RetryPolicy(initial=0),
+            budget=RetryBudget(),
+        )
+    ) as client:
+        response = client.put(URL, content=rows())
+
+    assert response.status_code == 503
+    assert response.extensions["retries"] == []
+    assert bodies == [b"Name\nAcme\n"]
+
+
+def test_file_bodies_are_retried(tmp_path):
+    bodies, handler = unavailable_then_ok()
+    csv_file = tmp_path / "leads.csv"
+    csv_file.write_bytes(b"Name\nAcme\n")
+
+    with httpx.Client(
+        transport=RetryTransport(
+            transport=httpx.MockTransport(handler),
+            policy=RetryPolicy(initial=0),
+            budget=RetryBudget(),
+        )
+    ) as client:
+        response = client.put(URL, content=FileChunks(str(csv_file), chunk_size=4))
+
+    assert response.status_code == 200
+    assert bodies == [b"Name\nAcme\n", b"Name\nAcme\n"]
+
+
+def test_parse_retry_after():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    assert parse_retry_after(httpx.Response(429, headers={"Retry-After": "7"})) == 7
+    assert (
+        25
+        < parse_retry_after(
+            httpx.Response(503, headers={"Retry-After": format_datetime(retry_at)})
+        )
+        <= 30
+    )
+    assert parse_retry_after(httpx.Response(503)) is None
+    assert (
+        RetryPolicy().delay(1, httpx.Response(429, headers={"Retry-After": "7"})) == 7
+    )
@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+import respx
+
+from ultra import bulk2
+from ultra.session import BulkSession
+from conftest import INSTANCE_URL
+
+QUERY_URL = f"{INSTANCE_URL}/services/data/v53.0/jobs/query"
+
+
+@respx.mock
+def test_operations_share_the_session_client(test_credentials):
+    limits = respx.get(f"{INSTANCE_URL}/services/data/v53.0/limits").mock(
+        return_value=httpx.Response(200, json={})
+    )
+    respx.post(QUERY_URL).mock(
+        return_value=httpx.Response(200, json={"id": "750A", "state": "UploadComplete"})
+    )
+    status = respx.get(f"{QUERY_URL}/750A").mock(
+        return_value=httpx.Response(200, json={"id": "750A", "state": "JobComplete"})
+    )
+
+    with BulkSession(credentials=test_credentials) as session:
+        job = session.create_query_job(query="SELECT Id FROM Lead", version="53.0")
+        client = session.client
+        assert (
+            session.get_job(job_id=job["id"], version="53.0")["state"] == "JobComplete"
+        )
+        assert session.client is client
+
+    assert client.is_closed
+    assert status.calls.last.request.headers["Authorization"] == "Bearer test_token"
+    # The Bulk 2.0 allocations are read before the job is created.
+    assert limits.call_count == 1
+
+
+def test_aclose_closes_both_clients(test_credentials):
+    session = BulkSession(credentials=test_credentials)
+
+    async def use_session():
+        async with session:
+            clients = session.client, session.async_client
+        return clients
+
+    client, async_client = asyncio.run(use_session())
+
+    assert client.is_closed and async_client.is_closed
+
+
+@respx.mock
+def test_async_operations_share_the_session_async_client(mocker, test_credentials):
+    respx.get(f"{QUERY_URL}/750A").mock(
+        return_value=httpx.Response(200, json={"id": "750A", "state": "JobComplete"})
+    )
+    build_async_client = mocker.spy(bulk2, "build_async_client")
+
+    with BulkSession(credentials=test_credentials) as session:
+        for _ in range(2):
+            job = session.wait_for_job(job_id="750A", kind="query", version="53.0")
+            assert job["state"] == "JobComplete"
+        async_client = session.async_client
+
+    assert build_async_client.call_count == 1
+    assert async_client.is_closed
@@ -0,0 +1,143 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import respx
+
+from ultra import sfjwt
+from ultra.sfjwt import SalesforceAuth
+from conftest import INSTANCE_URL
+
+JOB_URL = f"{INSTANCE_URL}/services/data/v53.0/jobs/query/7503h00000ABCDEFG"
+
+
+@pytest.fixture()
+def expiring_credentials(test_credentials):
+    yield test_credentials.copy(
+        update={"token": "expired_token", "private_key": "test_key"}
+    )
+
+
+def authorized(request: httpx.Request) -> httpx.Response:
+    if request.headers["Authorization"] != "Bearer fresh_token":
+        return httpx.Response(401, json=[{"errorCode": "INVALID_SESSION_ID"}])
+    return httpx.Response(200, json={"state": "JobComplete"})
+
+
+@respx.mock
+def test_salesforce_auth_refreshes_on_401(mocker, expiring_credentials):
+    route = respx.get(JOB_URL).mock(side_effect=authorized)
+    jwt_login = mocker.patch(
+        "ultra.sfjwt.jwt_login", return_value=(INSTANCE_URL, "fresh_token")
+    )
+
+    with httpx.Client(
+        base_url=INSTANCE_URL, auth=SalesforceAuth(expiring_credentials)
+    ) as client:
+        response = client.get(JOB_URL)
+
+    assert response.json() == {"state": "JobComplete"}
+    assert route.call_count == 2
+    assert expiring_credentials.token == "fresh_token"
+    jwt_login.assert_called_once_with(
+        consumer_id="3MwDP8_5DfNOLW29.CAgn",
+        username="test@salesforce.com",
+        private_key="test_key",
+        environment="sandbox",
+    )
+
+
+@respx.mock
+def test_salesforce_auth_does_not_resend_generator_bodies(mocker, expiring_credentials):
+    route = respx.put(JOB_URL).mock(side_effect=authorized)
+    mocker.patch("ultra.sfjwt.jwt_login", return_value=(INSTANCE_URL, "fresh_token"))
+
+    def rows():
+        yield b"Name\n"
+
+    with httpx.Client(
+        base_url=INSTANCE_URL, auth=SalesforceAuth(expiring_credentials)
+    ) as client:
+        response = client.put(JOB_URL, content=rows())
+
+    assert response.status_code == 401
+    assert route.call_count == 1
+    assert expiring_credentials.token == "fresh_token"
+
+
+@respx.mock
+def test_salesforce_auth_refreshes_once_for_concurrent_requests(
+    mocker, expiring_credentials
+):
+    respx.get(JOB_URL).mock(side_effect=authorized)
+    jwt_login = mocker.patch(
+        "ultra.sfjwt.jwt_login", return_value=(INSTANCE_URL, "fresh_token")
+    )
+
+    async def get_many():
+        async with httpx.AsyncClient(
+            base_url=INSTANCE_URL, auth=SalesforceAuth(expiring_credentials)
+        ) as async_client:
+            return await asyncio.gather(*[async_client.get(JOB_URL) for _ in range(8)])
+
+    responses = asyncio.run(get_many())
+
+    assert {response.status_code for response in responses} == {200}
+    assert jwt_login.call_count == 1
+
+
+@respx.mock
+def test_salesforce_auth_returns_the_401_when_the_refresh_fails(
+    monkeypatch, capsys, expiring_credentials
+):
+    route = respx.get(JOB_URL).mock(side_effect=authorized)
+    monkeypatch.delenv("SFDC_PRIVATE_KEY", raising=False)
+    expiring_credentials.private_key = None
+
+    async def get():
+        async with httpx.AsyncClient(
+            base_url=INSTANCE_URL, auth=SalesforceAuth(expiring_credentials)
+        ) as async_client:
+            return await async_client.get(JOB_URL)
+
+    with httpx.Client(
+        base_url=INSTANCE_URL, auth=SalesforceAuth(expiring_credentials)
+    ) as client:
+        responses = [client.get(JOB_URL), asyncio.run(get())]
+
+    assert [response.status_code for response in responses] == [401, 401]
+    assert route.call_count == 2
+    assert expiring_credentials.token == "expired_token"
+    assert "Could not refresh the token: OSError" in capsys.readouterr().err
+
+
+def test_load_credentials_is_cached_and_refresh_persists(mocker, tmp_path):
+    credential_file = tmp_path / "creds.json"
+    credential_file.write_text(
+        json.dumps(
+            {
+                "username": "test@salesforce.com",
+                "consumer_id": "3MwDP8_5DfNOLW29.CAgn",
+                "environment": "sandbox",
+                "instance_url": INSTANCE_URL,
+                "token": "expired_token",
+                "private_key_path": str(tmp_path / "server.key"),
+            }
+        )
+    )
+    (tmp_path / "server.key").write_text("test_key")
+    mocker.patch("ultra.sfjwt.jwt_login", return_value=(INSTANCE_URL, "fresh_token"))
+    mocker.patch.dict(sfjwt._credential_cache, clear=True)
+
+    credentials = sfjwt.load_credentials(json_credential_file=str(credential_file))
+    assert (
+        sfjwt.load_credentials(json_credential_file=str(credential_file)) is credentials
+    )
+
+    sfjwt.refresh_credentials(credentials, stale_token="expired_token")
+
+    saved = json.loads(credential_file.read_text())
+    assert saved["token"] == "fresh_token"
+    assert saved["private_key_path"] == str(tmp_path / "server.key")
+    assert "private_key" not in saved
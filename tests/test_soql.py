@@ -0,0 +1,70 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from ultra import soql
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("SELECT Id FROM Lead", "SELECT Id FROM Lead WHERE Id < 'x'"),
+        (
+            "SELECT Id FROM Lead WHERE IsDeleted = false OR Name = 'a' ORDER BY Id LIMIT 5",
+            "SELECT Id FROM Lead WHERE (IsDeleted = false OR Name = 'a') AND Id < 'x' ORDER BY Id LIMIT 5",
+        ),
+        (
+            "SELECT Id, (SELECT Id FROM Contacts WHERE Name = 'b') FROM Account "
+            "WHERE Name = 'Limit order by'",
+            "SELECT Id, (SELECT Id FROM Contacts WHERE Name = 'b') FROM Account "
+            "WHERE (Name = 'Limit order by') AND Id < 'x'",
+        ),
+        (
+            "select Id from Account order by Name",
+            "select Id from Account WHERE Id < 'x' order by Name",
+        ),
+    ],
+)
+def test_add_where_clause(query, expected):
+    assert soql.add_where_clause(query, "Id < 'x'") == expected
+
+
+def test_get_object_name_ignores_subqueries():
+    assert (
+        soql.get_object_name("SELECT Id, (SELECT Id FROM Contacts) FROM Account")
+        == "Account"
+    )
+
+
+def test_datetime_boundaries():
+    boundaries = soql.datetime_boundaries(
+        datetime(2021, 1, 1, tzinfo=timezone.utc),
+        datetime(2021, 1, 5, tzinfo=timezone.utc),
+        4,
+    )
+
+    assert boundaries == [
+        "2021-01-02T00:00:00Z",
+        "2021-01-03T00:00:00Z",
+        "2021-01-04T00:00:00Z",
+    ]
+
+
+def test_range_predicates_cover_every_value():
+    assert soql.range_predicates("CreatedDate", ["A", "B"], quote=False) == [
+        "CreatedDate < A",
+        "CreatedDate >= A AND CreatedDate < B",
+        "CreatedDate >= B",
+    ]
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("SELECT Id FROM Lead ORDER BY Id LIMIT 10", 10),
+        ("SELECT Id, (SELECT Id FROM Contacts LIMIT 5) FROM Account", None),
+        ("SELECT Id FROM Lead WHERE Name = 'LIMIT 3'", None),
+    ],
+)
+def test_get_limit_reads_the_outer_query(query, expected):
+    assert soql.get_limit(query) == expected
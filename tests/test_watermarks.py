@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from ultra.watermarks import WatermarkStore, incremental_query
+from conftest import INSTANCE_URL
+
+
+def test_watermarks_are_kept_per_instance_and_object(tmp_path):
+    store = WatermarkStore(str(Path(tmp_path, "state", "watermarks.json")))
+    watermark = datetime(2021, 7, 1, 12, 30, 15, 500000, tzinfo=timezone.utc)
+
+    assert store.get(INSTANCE_URL, "Lead") is None
+    store.set(INSTANCE_URL, "Lead", watermark)
+    store.set("https://other.my.salesforce.com", "Lead", datetime.now(timezone.utc))
+
+    assert WatermarkStore(str(store.path)).get(INSTANCE_URL, "Lead") == watermark
+    assert store.get(INSTANCE_URL, "Account") is None
+
+
+def test_incremental_query_applies_overlap():
+    watermark = datetime(2021, 7, 1, 12, 30, tzinfo=timezone.utc)
+
+    assert (
+        incremental_query(
+            "SELECT Id FROM Lead WHERE IsConverted = false",
+            watermark,
+            timedelta(minutes=5),
+        )
+        == "SELECT Id FROM Lead WHERE (IsConverted = false) AND SystemModstamp > 2021-07-01T12:25:00Z"
+    )
+    assert incremental_query("SELECT Id FROM Lead", None) == "SELECT Id FROM Lead"
@@ -7,14 +7,66 @@ from ultra.config import (
     ULTRALOADER_CREDENTIAL_FILE_PATH,
 )
 from pathlib import Path
+from typing import List
 
-from ultra import bulk2
+from ultra.session import BulkSession
+from ultra import bench, generate, mock_server
+from ultra.limits import default_monitor
+from ultra.metrics import (
+    default_recorder,
+    write_json_report,
+    write_prometheus_textfile,
+)
 
 from ultra.query import query_app
 from ultra.ingest import ingest_app
 
 app = typer.Typer()
 
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    api_reserve: float = typer.Option(
+        default_monitor.reserve,
+        min=0.0,
+        max=1.0,
+        help="The fraction of the org's daily API requests to leave for other integrations. Requests slow down "
+        "once less than twice this is left and pause once it is reached. 0 disables the limit.",
+    ),
+    show_limits: bool = typer.Option(
+        True,
+        help="Print the API requests used and the Bulk 2.0 allocations left to stderr when the command ends.",
+    ),
+    stats: str = typer.Option(
+        None,
+        help="Write a JSON report of the timings, bytes, records and retries of every batch and HTTP call, with "
+        "p50/p95/p99 and MB/s totals, to this path when the command ends.",
+    ),
+    prometheus_textfile: str = typer.Option(
+        None,
+        help="Write the totals and timing percentiles of the run in the Prometheus text format to this path, "
+        "for the node exporter's textfile collector.",
+    ),
+):
+    """
+    Options shared by every command.
+    """
+    default_monitor.reserve = api_reserve
+    if show_limits:
+        ctx.call_on_close(default_monitor.report)
+    if stats or prometheus_textfile:
+
+        def write_stats():
+            report = default_recorder.report()
+            if stats:
+                write_json_report(report, stats)
+            if prometheus_textfile:
+                write_prometheus_textfile(report, prometheus_textfile)
+
+        ctx.call_on_close(write_stats)
+
+
 app.add_typer(query_app, name="query")
 app.add_typer(ingest_app, name="ingest")
 
@@ -87,6 +139,10 @@ def login(
             environment=environment,
             instance_url=instance_url,
             token=token,
+            # Kept so an expired token can be refreshed without logging in again.
+            private_key_path=(
+                str(Path(private_key).expanduser().resolve()) if private_key else None
+            ),
         )
     except Exception as e:
         print(
@@ -136,7 +192,195 @@ def get_job(
     :param version: The API version to use. Defaults to 53.0
 
     """
-    print(json.dumps(obj=bulk2.get_job(job_id=job_id, version=version), indent=2))
+    with BulkSession() as session:
+        print(json.dumps(obj=session.get_job(job_id=job_id, version=version), indent=2))
+
+
+@app.command("mock-server")
+def run_mock_server(
+    host: str = typer.Option("127.0.0.1", help="The address to listen on."),
+    port: int = typer.Option(8000, help="The port to listen on."),
+    latency: float = typer.Option(0.0, help="Seconds added before every response."),
+    bandwidth: int = typer.Option(
+        None,
+        help="Bytes per second shared by every result download, and separately by every upload. Unlimited if "
+        "not set.",
+    ),
+    error_rate: float = typer.Option(
+        0.0,
+        min=0.0,
+        max=1.0,
+        help="The fraction of job requests answered with an injected error.",
+    ),
+    error_status_codes: str = typer.Option(
+        "429,503", help="A comma separated list of the status codes injected."
+    ),
+    records: int = typer.Option(
+        100_000,
+        help="The records every query job returns, fewer if the query has a lower LIMIT.",
+    ),
+    record_size: int = typer.Option(
+        200, help="The approximate bytes of csv per record."
+    ),
+    page_size: int = typer.Option(
+        50_000, help="The records per results page when a request sets no maxRecords."
+    ),
+    processing_seconds: float = typer.Option(
+        0.0, help="How long each job stays InProgress before it completes."
+    ),
+    seed: int = typer.Option(None, help="Seeds the error injection."),
+    credentials_file: str = typer.Option(
+        None,
+        help="Write a credential file pointing at the server to this path, use it by setting "
+        "ULTRALOADER_CREDENTIAL_FILE_PATH.",
+    ),
+):
+    """
+    Run a local stand-in for the Bulk API 2.0 endpoints ultra uses, serving synthetic query results, to measure
+    download and load throughput without an org. Requires uvicorn, install it with: pip install ultra[mock]
+    """
+    options = mock_server.MockServerOptions(
+        latency=latency,
+        bandwidth=bandwidth,
+        error_rate=error_rate,
+        error_status_codes=tuple(
+            int(code) for code in error_status_codes.split(",") if code.strip()
+        ),
+        records=records,
+        record_size=record_size,
+        page_size=page_size,
+        processing_seconds=processing_seconds,
+        seed=seed,
+    )
+    if credentials_file:
+        mock_server.write_mock_credentials(credentials_file, f"http://{host}:{port}")
+        print(
+            f"Credentials for the mock server written to {credentials_file}",
+            file=sys.stderr,
+        )
+    try:
+        mock_server.serve(options, host=host, port=port)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+@app.command("bench")
+def run_bench(
+    dataset: List[str] = typer.Option(
+        ["10MB"],
+        help=f"The dataset sizes to run on, any of {', '.join(bench.DATASET_SIZES)}. Repeat to run several.",
+    ),
+    benchmark: List[str] = typer.Option(
+        list(bench.BENCHMARKS),
+        help=f"The benchmarks to run, any of {', '.join(bench.BENCHMARKS)}. Repeat to run several.",
+    ),
+    work_dir: str = typer.Option(
+        "./bench",
+        help="The directory the datasets are generated in and kept between runs, and the benchmarks write to.",
+    ),
+    output: str = typer.Option(
+        None, help="Write the results as JSON to this path as well as to stdout."
+    ),
+    baseline: str = typer.Option(
+        None,
+        help="The JSON results of an earlier run. Benchmarks slower than it by more than the tolerance fail the "
+        "command.",
+    ),
+    tolerance: float = typer.Option(
+        0.1, help="The fraction of the baseline's throughput a benchmark may lose."
+    ),
+):
+    """
+    Measure the throughput of combining files, downloading query results and loading ingest jobs on generated
+    datasets. Downloads and loads run against the mock server, which requires uvicorn.
+    """
+    unknown = [name for name in dataset if name not in bench.DATASET_SIZES] + [
+        name for name in benchmark if name not in bench.BENCHMARKS
+    ]
+    if unknown:
+        print(f"Unknown datasets or benchmarks: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        report = bench.benchmark_report(
+            list(bench.run_benchmarks(dataset, benchmark, work_dir))
+        )
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if output:
+        with open(output, "w") as report_out:
+            json.dump(report, report_out, indent=2)
+    print(json.dumps(report, indent=2), file=sys.stdout)
+
+    if baseline:
+        with open(baseline) as baseline_in:
+            regressions = bench.compare_reports(
+                json.load(baseline_in), report, tolerance
+            )
+        for regression in regressions:
+            print(
+                f"{regression['benchmark']} on {regression['dataset']}: {regression['mb_per_second']:.1f} MB/s, "
+                f"down from {regression['baseline_mb_per_second']:.1f} MB/s",
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+@app.command("generate")
+def run_generate(
+    rows: int = typer.Option(..., min=0, help="The records to generate."),
+    object_name: str = typer.Option(
+        "Lead",
+        "--object",
+        help=f"The object to generate records of, one of {', '.join(generate.OBJECT_COLUMNS)}.",
+    ),
+    output: str = typer.Option(
+        "-", help="The csv file to write, or - to stream to stdout."
+    ),
+    seed: int = typer.Option(
+        0, help="The same seed always generates the same file, whatever the processes."
+    ),
+    batch_size: int = typer.Option(
+        50_000, min=1, help="The records each process generates at a time."
+    ),
+    processes: int = typer.Option(
+        None, min=1, help="The processes generating batches, the cpu count if not set."
+    ),
+    multibyte_rate: float = typer.Option(
+        0.0,
+        min=0.0,
+        max=1.0,
+        help="The fraction of names and descriptions drawn from text outside ASCII.",
+    ),
+    newline_rate: float = typer.Option(
+        0.0,
+        min=0.0,
+        max=1.0,
+        help="The fraction of descriptions with an embedded newline.",
+    ),
+):
+    """
+    Generate a csv of synthetic Lead, Contact or Account records, for test fixtures of any size.
+    """
+    try:
+        written = generate.generate_to_path(
+            output,
+            object_name=object_name,
+            rows=rows,
+            seed=seed,
+            batch_size=batch_size,
+            processes=processes,
+            multibyte_rate=multibyte_rate,
+            newline_rate=newline_rate,
+        )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"Generated {rows:,} {object_name} records, {written:,} bytes", file=sys.stderr
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,302 @@
+import json
+import os
+import platform
+import shutil
+import socket
+import sys
+import threading
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from multiprocessing import cpu_count
+from pathlib import Path
+from time import perf_counter, sleep
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ultra import bulk2
+from ultra.file_operations import combine_file_in_buffers, combine_files
+from ultra.mock_server import MockServerOptions, create_app
+from ultra.sfjwt import CredentialModel
+
+# The sizes of the datasets the benchmarks run on, by name.
+DATASET_SIZES = {
+    "10MB": 10 * 1000**2,
+    "1GB": 1000**3,
+    "10GB": 10 * 1000**3,
+}
+
+BENCHMARKS = (
+    "combine_file_in_buffers",
+    "combine_files",
+    "download_query_data",
+    "ingest_job_data_batches",
+)
+
+# The approximate bytes of csv per record in the generated datasets and the mock server's results.
+RECORD_SIZE = 200
+
+# The most bytes a generated dataset file holds, larger datasets are spread over several files.
+DATASET_FILE_SIZE = 250 * 1000**2
+
+
+def write_dataset(
+    directory: str, size: int, record_size: int = RECORD_SIZE
+) -> List[str]:
+    """
+    Writes about size bytes of csv records to load, in files of at most DATASET_FILE_SIZE bytes. A dataset already
+    written to the directory with the same size is reused.
+
+    :return: The files of the dataset.
+    """
+    path = Path(directory)
+    marker = path / "dataset.json"
+    if marker.exists() and json.loads(marker.read_text()) == {
+        "size": size,
+        "record_size": record_size,
+    }:
+        return sorted(str(file) for file in path.glob("*.csv"))
+
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    padding = b"x" * max(record_size - 46, 0)
+    row = b'"Last %012d","Company %012d","' + padding + b'"\n'
+    rows_per_block = max(1_000_000 // record_size, 1)
+    files = []
+    written = 0
+    index = 0
+    while written < size:
+        file_path = path / f"part_{len(files):04d}.csv"
+        files.append(str(file_path))
+        file_size = min(DATASET_FILE_SIZE, size - written)
+        with open(file_path, "wb") as dataset_out:
+            file_written = dataset_out.write(b'"LastName","Company","Description"\n')
+            while file_written < file_size:
+                rows = min(
+                    rows_per_block,
+                    max((file_size - file_written) // record_size, 1),
+                )
+                file_written += dataset_out.write(
+                    b"".join(row % (i, i) for i in range(index, index + rows))
+                )
+                index += rows
+        written += file_written
+    marker.write_text(json.dumps({"size": size, "record_size": record_size}))
+    return files
+
+
+class MockServerThread:
+    """
+    Runs the mock server on a free local port in a background thread, for as long as the context is open.
+
+    :return: The base url of the server, from the context manager.
+    """
+
+    def __init__(self, options: MockServerOptions = None):
+        self.options = options if options is not None else MockServerOptions()
+        self.server = None
+        self.thread = None
+
+    def __enter__(self) -> str:
+        try:
+            import uvicorn
+        except ImportError:
+            raise RuntimeError(
+                "The benchmarks against the mock server require the uvicorn package, install it with: "
+                "pip install ultra[mock]"
+            )
+
+        class Server(uvicorn.Server):
+            def install_signal_handlers(self):
+                # Signals can only be handled on the main thread, which the server is not run on.
+                pass
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        self.server = Server(
+            uvicorn.Config(create_app(self.options), log_level="warning")
+        )
+        self.thread = threading.Thread(
+            target=self.server.run, kwargs={"sockets": [sock]}, daemon=True
+        )
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("The mock server did not start")
+            sleep(0.01)
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc_info):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def _mock_credentials(instance_url: str) -> CredentialModel:
+    return CredentialModel(
+        username="bench@example.com",
+        consumer_id="bench",
+        environment="sandbox",
+        instance_url=instance_url,
+        token="bench",
+        download_timeout=600,
+    )
+
+
+def _directory_size(directory: Path) -> int:
+    return sum(file.stat().st_size for file in directory.rglob("*.csv"))
+
+
+def bench_combine_file_in_buffers(files: List[str], work_dir: Path) -> Dict:
+    return {
+        "bytes": sum(
+            len(buffer.getbuffer()) for buffer in combine_file_in_buffers(files)
+        )
+    }
+
+
+def bench_combine_files(files: List[str], work_dir: Path) -> Dict:
+    output = work_dir / "combined"
+    shutil.rmtree(output, ignore_errors=True)
+    result = combine_files(
+        path_or_file=str(Path(files[0]).parent),
+        pattern="*.csv",
+        output_directory=str(output),
+    )
+    if result.status != "success":
+        raise RuntimeError(result.message)
+    return {"bytes": _directory_size(output), "records": sum(result.record_counts)}
+
+
+def bench_download_query_data(files: List[str], work_dir: Path) -> Dict:
+    size = sum(os.path.getsize(file) for file in files)
+    output = work_dir / "downloaded"
+    shutil.rmtree(output, ignore_errors=True)
+    options = MockServerOptions(records=size // RECORD_SIZE, record_size=RECORD_SIZE)
+    with MockServerThread(options) as instance_url:
+        credentials = _mock_credentials(instance_url)
+        job = bulk2.create_query_job(
+            query="SELECT Id, Name, Description FROM Lead",
+            version="53.0",
+            credentials=credentials,
+        )
+        completed = bulk2.CompletedJob.parse_raw(
+            bulk2.download_query_data(
+                job_id=job["id"],
+                download_path=str(output),
+                batch_size=50_000,
+                credentials=credentials,
+            )
+        )
+    return {
+        "bytes": _directory_size(output),
+        "records": sum(batch.record_count or 0 for batch in completed.batches),
+        "failed_batches": sum(
+            batch.status != "COMPLETE" for batch in completed.batches
+        ),
+    }
+
+
+def bench_ingest_job_data_batches(files: List[str], work_dir: Path) -> Dict:
+    with MockServerThread() as instance_url:
+        results = bulk2.ingest_job_data_batches(
+            object_name="Lead",
+            operation="insert",
+            path_or_file=str(Path(files[0]).parent),
+            pattern="*.csv",
+            batch_size=100 * 1000**2,
+            version="53.0",
+            working_directory=str(work_dir / "ingest"),
+            credentials=_mock_credentials(instance_url),
+        )
+    return {
+        "bytes": sum(os.path.getsize(file) for file in files),
+        "records": sum(result.get("record_count") or 0 for result in results),
+        "failed_batches": sum(
+            result.get("state") != "UploadComplete" for result in results
+        ),
+    }
+
+
+BENCHMARK_FUNCTIONS: Dict[str, Callable[[List[str], Path], Dict]] = {
+    "combine_file_in_buffers": bench_combine_file_in_buffers,
+    "combine_files": bench_combine_files,
+    "download_query_data": bench_download_query_data,
+    "ingest_job_data_batches": bench_ingest_job_data_batches,
+}
+
+
+def run_benchmark(name: str, dataset: str, work_dir: str) -> Dict:
+    """
+    Runs one benchmark on the dataset of that name, generating the dataset under work_dir first if needed.
+
+    :return: The result, with the seconds taken and throughput in MB/s.
+    """
+    work_path = Path(work_dir).expanduser()
+    files = write_dataset(str(work_path / "datasets" / dataset), DATASET_SIZES[dataset])
+    # What the functions print is moved to stderr, to keep stdout for the results.
+    with redirect_stdout(sys.stderr):
+        started = perf_counter()
+        result = BENCHMARK_FUNCTIONS[name](files, work_path)
+        seconds = perf_counter() - started
+    result = {"benchmark": name, "dataset": dataset, "seconds": seconds, **result}
+    result["mb_per_second"] = result["bytes"] / 1000**2 / seconds
+    return result
+
+
+def run_benchmarks(
+    datasets: List[str], benchmarks: List[str], work_dir: str
+) -> Iterator[Dict]:
+    for dataset in datasets:
+        for name in benchmarks:
+            print(f"Running {name} on {dataset}", file=sys.stderr)
+            yield run_benchmark(name, dataset, work_dir)
+
+
+def benchmark_report(results: List[Dict]) -> Dict:
+    """
+    :return: The results with the machine they were measured on, to be written out as JSON.
+    """
+    try:
+        from importlib.metadata import version
+
+        ultra_version = version("ultra")
+    except Exception:
+        ultra_version = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "ultra_version": ultra_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": cpu_count(),
+        "results": results,
+    }
+
+
+def compare_reports(
+    baseline: Dict, current: Dict, tolerance: float = 0.1
+) -> List[Dict]:
+    """
+    Compares the throughput of every benchmark run in both reports.
+
+    :param tolerance: The fraction of the baseline's throughput a benchmark may lose before it is a regression.
+
+    :return: The benchmarks that regressed, with the throughput of each run.
+    """
+    previous = {
+        (result["benchmark"], result["dataset"]): result
+        for result in baseline["results"]
+    }
+    regressions = []
+    for result in current["results"]:
+        before: Optional[Dict] = previous.get((result["benchmark"], result["dataset"]))
+        if before is None:
+            continue
+        if result["mb_per_second"] < before["mb_per_second"] * (1 - tolerance):
+            regressions.append(
+                {
+                    "benchmark": result["benchmark"],
+                    "dataset": result["dataset"],
+                    "baseline_mb_per_second": before["mb_per_second"],
+                    "mb_per_second": result["mb_per_second"],
+                }
+            )
+    return regressions
@@ -1,31 +1,63 @@
 import os
 import sys
+import json
 
 import httpx
 from sys import stderr
 from multiprocessing import cpu_count
 from math import ceil
 import base64
+import zlib
 
 import asyncio
+from time import perf_counter
 from aiomultiprocess import Pool
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 from pathlib import Path
 from pydantic import BaseModel
 import aiofiles
-from tenacity import (
-    AsyncRetrying,
-    RetryError,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-)
 
-from ultra.sfjwt import CredentialModel, load_credentials
-from ultra.file_operations import combine_files
+from ultra.sfjwt import CredentialModel, SalesforceAuth, load_credentials
+from ultra.file_operations import (
+    combine_files,
+    split_csv_files,
+    get_target_files,
+    FileChunks,
+    GzipChunks,
+    UPLOAD_CHUNK_SIZE,
+)
+from ultra.concurrency import AIMDController
+from ultra.retry import (
+    READ_ERRORS,
+    AsyncRetryTransport,
+    RetryPolicy,
+    RetryTransport,
+    StreamInterrupted,
+    default_budget,
+    parse_retry_after,
+    retry_interrupted_streams,
+)
+from ultra.limits import default_monitor
+from ultra.metrics import BatchMetric, default_recorder
+from ultra.polling import PollBackoff, a_wait_for_job, a_watch_jobs
+from ultra import soql
+from ultra.watermarks import WatermarkStore, incremental_query
 
 from tempfile import gettempdir
+from datetime import timedelta
 import shutil
+from contextlib import AsyncExitStack
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from functools import partial
+
+# zlib window bits selecting the gzip container format.
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("SFDC_DOWNLOAD_CHUNK_SIZE", 1048576))
+
+# Responses signalling the org or a gateway wants the client to slow down.
+THROTTLE_STATUS_CODES = (429, 503)
 
 
 class Organization(BaseModel):
@@ -47,6 +79,30 @@ class Batch(BaseModel):
     message: Optional[str] = None
     downloaded_file_path: Optional[str]
     attempt_count: int = 0
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE
+    locator: Optional[str] = None
+    next_locator: Optional[str] = None
+    record_count: Optional[int] = None
+    status_code: Optional[int] = None
+    time_to_first_byte: Optional[float] = None
+    file_size: Optional[int] = None
+    compress: bool = False
+    bytes_transferred: Optional[int] = None
+    retry_count: int = 0
+    elapsed: Optional[float] = None
+    queue_wait: Optional[float] = None
+    retry_after: Optional[float] = None
+
+
+class ClientPoolOptions(BaseModel):
+    """
+    Connection pool settings for the async clients used to download query results.
+    """
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    http2: bool = False
 
 
 class CompletedJob(BaseModel):
@@ -54,6 +110,142 @@ class CompletedJob(BaseModel):
     batches: List[Batch]
 
 
+class BatchManifest:
+    """
+    An append only record of the batches downloaded for a job, kept as json lines in the download directory.
+    A batch is appended as soon as it finishes, so the manifest survives the download being killed part way
+    through and a later run can pick up where it left off. When a batch appears more than once, the last
+    entry wins.
+    """
+
+    def __init__(self, download_path: str, job_id: str):
+        self.path = Path(download_path, f"{job_id}.manifest.jsonl")
+
+    def append(self, batch: Batch):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as manifest_out:
+            manifest_out.write(batch.json() + "\n")
+
+    def load(self) -> Dict[int, Batch]:
+        """
+        :return: The last recorded state of each batch keyed by batch_start.
+        """
+        batches: Dict[int, Batch] = {}
+        if not self.path.exists():
+            return batches
+        with open(self.path) as manifest_in:
+            for line in manifest_in:
+                try:
+                    batch = Batch.parse_raw(line)
+                except ValueError:
+                    # A line cut short when the previous run was killed.
+                    continue
+                batches[batch.batch_start] = batch
+        return batches
+
+    def clear(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+def batch_is_downloaded(batch: Batch) -> bool:
+    """
+    Checks a batch completed and its file is still on disk with the size it was written with.
+    """
+    if batch.status != "COMPLETE" or batch.downloaded_file_path is None:
+        return False
+    file_path = Path(batch.downloaded_file_path)
+    return file_path.is_file() and file_path.stat().st_size == batch.file_size
+
+
+def run_async(coroutine, loop: asyncio.AbstractEventLoop = None):
+    """
+    Runs a coroutine to completion from sync code. It is run on loop when one is given, so an async client
+    already bound to that loop can be used by it, and in a new event loop otherwise.
+    """
+    if loop is None:
+        return asyncio.run(coroutine)
+    return loop.run_until_complete(coroutine)
+
+
+def build_client(
+    credentials: CredentialModel, pool_options: ClientPoolOptions = None
+) -> httpx.Client:
+    """
+    Builds a connection pooled client for the credential's instance, retrying failed requests, for the job
+    requests made from the calling thread.
+    """
+    if pool_options is None:
+        pool_options = ClientPoolOptions()
+    return httpx.Client(
+        base_url=credentials.instance_url,
+        auth=SalesforceAuth(credentials),
+        headers={
+            "Accept": "application/json",
+        },
+        timeout=httpx.Timeout(
+            credentials.client_timeout, connect=credentials.client_connect_timeout
+        ),
+        transport=RetryTransport(
+            httpx.HTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=pool_options.max_connections,
+                    max_keepalive_connections=pool_options.max_keepalive_connections,
+                    keepalive_expiry=pool_options.keepalive_expiry,
+                )
+            )
+        ),
+    )
+
+
+def build_async_client(
+    credentials: CredentialModel, pool_options: ClientPoolOptions = None
+) -> httpx.AsyncClient:
+    """
+    Builds a connection pooled async client for the credential's instance, suitable for downloading results.
+    """
+    if pool_options is None:
+        pool_options = ClientPoolOptions()
+    if pool_options.http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            raise RuntimeError(
+                "HTTP/2 support requires the h2 package, install it with: pip install httpx[http2]"
+            )
+
+    return httpx.AsyncClient(
+        base_url=credentials.instance_url,
+        auth=SalesforceAuth(credentials),
+        headers={
+            "Accept": "application/json",
+        },
+        timeout=httpx.Timeout(
+            credentials.download_timeout, connect=credentials.client_connect_timeout
+        ),
+        transport=AsyncRetryTransport(
+            httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=pool_options.max_connections,
+                    max_keepalive_connections=pool_options.max_keepalive_connections,
+                    keepalive_expiry=pool_options.keepalive_expiry,
+                ),
+                http2=pool_options.http2,
+            )
+        ),
+    )
+
+
+def print_compression_savings(raw_bytes: int, transferred_bytes: int):
+    if raw_bytes == 0:
+        return
+    print(
+        f"Transferred {transferred_bytes / 1000000:.1f} MB for {raw_bytes / 1000000:.1f} MB of csv, "
+        f"{100 * (1 - transferred_bytes / raw_bytes):.0f}% saved by compression",
+        file=stderr,
+    )
+
+
 def get_query_job(
     job_id: str,
     version: str,
@@ -63,13 +255,7 @@ def get_query_job(
     if credentials is None:
         credentials = load_credentials()
     if client is None:
-        client = httpx.Client(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-                "Accept": "application/json",
-            },
-        )
+        client = build_client(credentials)
     query_path = f"services/data/v{version}/jobs/query/{job_id}"
     data = client.get(
         f"{query_path}",
@@ -89,21 +275,17 @@ def create_query_job(
     if credentials is None:
         credentials = load_credentials()
     if client is None:
-        client = httpx.Client(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-                "Accept": "application/json",
-            },
-            timeout=httpx.Timeout(
-                credentials.client_timeout, connect=credentials.client_connect_timeout
-            ),
-        )
+        client = build_client(credentials)
 
     query_path = f"services/data/v{version}/jobs/query"
 
     body = {"operation": operation, "query": query}
 
+    refused = default_monitor.check_job("query")
+    if refused is not None:
+        print(refused, file=stderr)
+        return [{"errorCode": "API_RESERVE_REACHED", "message": refused}]
+
     data = client.post(
         f"{query_path}",
         json=body,
@@ -124,13 +306,7 @@ def get_query_data(
     if credentials is None:
         credentials = load_credentials()
     if client is None:
-        client = httpx.Client(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-                "Accept": "application/json",
-            },
-        )
+        client = build_client(credentials)
     query_path = f"/services/data/v{version}/jobs/query/{job_id}/results"
 
     data = client.get(
@@ -146,39 +322,76 @@ def get_query_data(
     return data.content.decode()
 
 
+def _results_headers(compress: bool) -> Dict[str, str]:
+    # httpx asks for gzip by default, so without compress the results are asked for uncompressed.
+    return {"Accept-Encoding": "gzip" if compress else "identity"}
+
+
+async def _write_results_page(
+    response: httpx.Response, file_path: Path, chunk_size: int, decompress: bool = False
+) -> int:
+    """
+    Streams a page of results to file_path. When decompress is True and the page was sent gzip encoded, the raw
+    body is decompressed in a worker thread rather than on the event loop.
+
+    :raises StreamInterrupted: If reading the body failed, so the page can be requested again.
+
+    :return: The number of bytes received over the wire for the page.
+    """
+    # Opening the file on every attempt truncates anything a timed out attempt left behind.
+    async with aiofiles.open(file_path, mode="wb") as file_out:
+        try:
+            if decompress and response.headers.get("Content-Encoding", "") == "gzip":
+                decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+                async for chunk in response.aiter_raw(chunk_size):
+                    await file_out.write(
+                        await asyncio.to_thread(decompressor.decompress, chunk)
+                    )
+                await file_out.write(decompressor.flush())
+            else:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    await file_out.write(chunk)
+        except READ_ERRORS as e:
+            raise StreamInterrupted(f"{type(e).__name__}: {e}") from e
+    return response.num_bytes_downloaded
+
+
 async def a_get_query_data(
     batch: Batch,
     async_client: httpx.AsyncClient = None,
     credentials: CredentialModel = None,
     max_attempts: int = int(os.getenv("SFDC_MAX_DOWNLOAD_ATTEMPTS", 20)),
 ):
+    """
+    Streams a batch of query results to disk. The response body is written to the batch file in chunks
+    of at most `batch.chunk_size` bytes as it arrives, so memory use does not grow with the batch size.
+
+    Failed requests are retried by the client's transport. A body cut off after the headers arrived is
+    requested again, up to max_attempts times in all, while the run's retry budget lasts.
+    """
+    owns_client = async_client is None
     if credentials is None:
         credentials = load_credentials()
     if async_client is None:
-        async_client = httpx.AsyncClient(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-                "Accept": "application/json",
-            },
-            timeout=httpx.Timeout(
-                credentials.download_timeout, connect=credentials.client_connect_timeout
-            ),
-        )
+        async_client = build_async_client(credentials=credentials)
 
     query_path = (
         f"/services/data/v{batch.api_version}/jobs/query/{batch.job_id}/results"
     )
 
+    data_directory = Path(batch.download_path)
+    data_directory.mkdir(parents=True, exist_ok=True)
+    file_name = f"{batch.job_id}_{batch.batch_start:012d}.csv"
+    file_path = Path(data_directory, file_name)
+
+    batch_started = perf_counter()
     try:
-        async for attempt in AsyncRetrying(
-            retry=retry_if_exception_type(httpx.ReadTimeout),
-            stop=stop_after_attempt(max_attempts),
-            wait=wait_exponential(multiplier=1, min=4, max=60),
-        ):
+        async for attempt in retry_interrupted_streams(max_attempts):
             with attempt:
                 batch.attempt_count = attempt.retry_state.attempt_number
-                data = await async_client.get(
+                request_start = perf_counter()
+                async with async_client.stream(
+                    "GET",
                     f"{query_path}",
                     params={
                         "maxRecords": batch.batch_size,
@@ -186,61 +399,441 @@ async def a_get_query_data(
                             str(batch.batch_start).encode()
                         ).decode(),
                     },
-                )
-    except RetryError as e:
+                    headers=_results_headers(batch.compress),
+                ) as data:
+                    batch.time_to_first_byte = perf_counter() - request_start
+                    batch.status_code = data.status_code
+                    batch.retry_count += len(data.extensions.get("retries", []))
+                    if data.status_code != 200 and data.status_code != 201:
+                        await data.aread()
+                        batch.status = "FAILED"
+                        batch.message = f"Error occurred while downloading job data: {data.content.decode()}"
+                        batch.retry_after = parse_retry_after(data)
+                        return batch
+
+                    if "Sforce-NumberOfRecords" in data.headers:
+                        batch.record_count = int(data.headers["Sforce-NumberOfRecords"])
+
+                    batch.bytes_transferred = await _write_results_page(
+                        data, file_path, batch.chunk_size, decompress=batch.compress
+                    )
+    except (StreamInterrupted, httpx.TransportError) as e:
         batch.status = "FAILED"
-        batch.message = f"Error occurred while downloading job data after : {str(e)}"
+        batch.message = f"Error occurred while downloading job data after {batch.attempt_count} attempt(s): {str(e)}"
         return batch
     finally:
-        await async_client.aclose()
-    if data.status_code != 200 and data.status_code != 201:
-        # print(data.content.decode(), file=stderr)
-        batch.status = "FAILED"
-        batch.message = (
-            f"Error occurred while downloading job data: {data.content.decode()}"
-        )
-        return batch
-
-    data_directory = Path(batch.download_path)
-    data_directory.mkdir(exist_ok=True)
-    file_path = Path(data_directory, f"{batch.job_id}_{batch.batch_start:012d}.csv")
-
-    async with aiofiles.open(file_path, mode="w") as file_out:
-        await file_out.write(data.content.decode())
+        batch.elapsed = perf_counter() - batch_started
+        if owns_client:
+            await async_client.aclose()
 
     batch.status = "COMPLETE"
     batch.message = f"{file_path} download complete"
-    batch.downloaded_file_path = file_path
-    batch.file_name = f"{batch.job_id}_{batch.batch_start:012d}.csv"
+    batch.downloaded_file_path = str(file_path)
+    batch.file_name = file_name
+    batch.file_size = file_path.stat().st_size
 
     return batch
 
 
-async def pull_batches(lots: List[Batch]) -> List[Batch]:
+async def a_follow_query_locators(
+    template: Batch,
+    async_client: httpx.AsyncClient = None,
+    credentials: CredentialModel = None,
+    max_attempts: int = int(os.getenv("SFDC_MAX_DOWNLOAD_ATTEMPTS", 20)),
+    pool_options: ClientPoolOptions = None,
+    manifest: BatchManifest = None,
+    controller: AIMDController = None,
+) -> List[Batch]:
+    """
+    Downloads every page of a query job's results by following the Sforce-Locator header returned with each
+    page. As soon as the headers of a page arrive, the request for the next page is sent so it is in flight
+    while the current page is still being written to disk.
+
+    :param template: The batch used as a template for every page, its batch_size is sent as maxRecords.
+
+    :param pool_options: The connection pool settings used when no async_client is provided.
+
+    :param manifest: If provided, every page is recorded in the manifest as it finishes.
+
+    :param controller: If provided, every page request, including the one sent ahead, holds one of the
+        controller's slots until the page is written, so jobs downloading side by side share its limit.
+
+    :return: A batch per page downloaded, ending at the first failed page if any.
+    """
+    owns_client = async_client is None
+    if credentials is None:
+        credentials = load_credentials()
+    if async_client is None:
+        async_client = build_async_client(
+            credentials=credentials, pool_options=pool_options
+        )
+
+    query_path = (
+        f"/services/data/v{template.api_version}/jobs/query/{template.job_id}/results"
+    )
+
+    async def send_page(
+        request: httpx.Request,
+    ) -> Tuple[httpx.Response, int, float, float, float]:
+        """
+        :return: The response, the controller epoch, and the seconds waited for a slot, when the request was
+            sent, and the seconds to the response headers.
+        """
+        epoch = 0
+        queued = perf_counter()
+        if controller is not None:
+            epoch = await controller.acquire()
+        try:
+            request_start = perf_counter()
+            data = await async_client.send(request, stream=True)
+            return (
+                data,
+                epoch,
+                request_start - queued,
+                request_start,
+                perf_counter() - request_start,
+            )
+        except BaseException:
+            if controller is not None:
+                await controller.release()
+            raise
+
+    def open_page(locator: Optional[str]):
+        params = {"maxRecords": template.batch_size} if template.batch_size else {}
+        if locator is not None:
+            params["locator"] = locator
+        headers = _results_headers(template.compress)
+        return asyncio.ensure_future(
+            send_page(
+                async_client.build_request(
+                    "GET", f"{query_path}", params=params, headers=headers
+                )
+            )
+        )
+
+    async def discard_page(page: asyncio.Future):
+        if not page.done():
+            page.cancel()
+        elif not page.cancelled() and page.exception() is None:
+            data = page.result()[0]
+            await data.aclose()
+            if controller is not None:
+                await controller.release()
+
+    data_directory = Path(template.download_path)
+    data_directory.mkdir(parents=True, exist_ok=True)
+
     batches: List[Batch] = []
+    next_page = open_page(template.locator)
+    try:
+        batch_start = template.batch_start
+        locator = template.locator
+        while next_page is not None:
+            batch = template.copy(
+                update={"batch_start": batch_start, "locator": locator}
+            )
+            batches.append(batch)
+            file_name = f"{batch.job_id}_{batch.batch_start:012d}.csv"
+            file_path = Path(data_directory, file_name)
+            page, next_page = next_page, None
+
+            try:
+                async for attempt in retry_interrupted_streams(max_attempts):
+                    with attempt:
+                        batch.attempt_count = attempt.retry_state.attempt_number
+                        if page is None:
+                            page = open_page(locator)
+                        (
+                            data,
+                            epoch,
+                            batch.queue_wait,
+                            request_start,
+                            batch.time_to_first_byte,
+                        ) = await page
+                        page = None
+                        try:
+                            batch.status_code = data.status_code
+                            batch.retry_count += len(data.extensions.get("retries", []))
+                            if data.status_code != 200 and data.status_code != 201:
+                                await data.aread()
+                                batch.status = "FAILED"
+                                batch.message = f"Error occurred while downloading job data: {data.content.decode()}"
+                                if (
+                                    controller is not None
+                                    and data.status_code in THROTTLE_STATUS_CODES
+                                ):
+                                    await controller.record_backoff(
+                                        f"HTTP {data.status_code}", epoch=epoch
+                                    )
+                                batch.elapsed = perf_counter() - request_start
+                                default_recorder.record_batch(
+                                    BatchMetric.from_query_batch(batch)
+                                )
+                                return batches
+
+                            batch.record_count = int(
+                                data.headers.get("Sforce-NumberOfRecords", 0)
+                            )
+                            batch.next_locator = data.headers.get("Sforce-Locator")
+                            if batch.next_locator in (None, "", "null"):
+                                batch.next_locator = None
+                            elif next_page is None:
+                                next_page = open_page(batch.next_locator)
+
+                            batch.bytes_transferred = await _write_results_page(
+                                data,
+                                file_path,
+                                batch.chunk_size,
+                                decompress=batch.compress,
+                            )
+                        finally:
+                            await data.aclose()
+                            if controller is not None:
+                                await controller.release()
+            except (StreamInterrupted, httpx.TransportError) as e:
+                batch.status = "FAILED"
+                batch.message = f"Error occurred while downloading job data after {batch.attempt_count} attempt(s): {str(e)}"
+                default_recorder.record_batch(BatchMetric.from_query_batch(batch))
+                return batches
+
+            batch.status = "COMPLETE"
+            batch.message = f"{file_path} download complete"
+            batch.downloaded_file_path = str(file_path)
+            batch.file_name = file_name
+            batch.file_size = file_path.stat().st_size
+            batch.elapsed = perf_counter() - request_start
+            default_recorder.record_batch(BatchMetric.from_query_batch(batch))
+            if manifest is not None:
+                manifest.append(batch)
+            if controller is not None:
+                if batch.retry_count > 0:
+                    await controller.record_backoff(
+                        f"{batch.retry_count} retried request(s)", epoch=epoch
+                    )
+                else:
+                    await controller.record_success(batch.time_to_first_byte)
+
+            batch_start += batch.record_count
+            locator = batch.next_locator
+    finally:
+        if next_page is not None:
+            await discard_page(next_page)
+        if owns_client:
+            await async_client.aclose()
 
-    async with Pool() as pool:
-        async for result in pool.map(a_get_query_data, lots):
-            batches.append(result)
     return batches
 
 
+# The credentials and client shared by every batch a pull_batches worker process handles.
+_worker_credentials: Optional[CredentialModel] = None
+_worker_pool_options: Optional[ClientPoolOptions] = None
+_worker_client: Optional[httpx.AsyncClient] = None
+
+
+def _init_worker(
+    credentials: CredentialModel,
+    pool_options: ClientPoolOptions,
+    api_reserve: float = None,
+    api_version: str = None,
+):
+    global _worker_credentials, _worker_pool_options, _worker_client
+    _worker_credentials = credentials
+    _worker_pool_options = pool_options
+    _worker_client = None
+    if api_reserve is not None:
+        default_monitor.reserve = api_reserve
+    default_monitor.attach(credentials, version=api_version)
+
+
+async def _pull_batch(batch: Batch) -> Batch:
+    """
+    Downloads a batch in a pull_batches worker, reusing the worker's pooled client so connections to the instance
+    are only opened once per process rather than once per batch.
+    """
+    global _worker_client
+    if _worker_client is None:
+        _worker_client = build_async_client(
+            credentials=_worker_credentials, pool_options=_worker_pool_options
+        )
+    return await a_get_query_data(
+        batch, async_client=_worker_client, credentials=_worker_credentials
+    )
+
+
+def build_download_pool(
+    credentials: CredentialModel,
+    pool_options: ClientPoolOptions,
+    controller: AIMDController,
+) -> Pool:
+    """
+    Builds the worker process pool pull_batches downloads with, sized to run the controller's maximum number of
+    batches at once.
+    """
+    processes = min(cpu_count(), controller.maximum)
+    return Pool(
+        processes=processes,
+        childconcurrency=ceil(controller.maximum / processes),
+        initializer=_init_worker,
+        initargs=(
+            credentials,
+            pool_options,
+            default_monitor.reserve,
+            default_monitor.version,
+        ),
+    )
+
+
+async def pull_batches(
+    lots: List[Batch],
+    credentials: CredentialModel = None,
+    pool_options: ClientPoolOptions = None,
+    controller: AIMDController = None,
+    max_throttle_attempts: int = int(os.getenv("SFDC_MAX_THROTTLE_ATTEMPTS", 10)),
+    manifest: BatchManifest = None,
+    pool: Pool = None,
+    retry_policy: RetryPolicy = None,
+) -> List[Batch]:
+    """
+    Downloads the batches in a pool of worker processes. The number of batches in flight is set by an AIMD
+    controller, which grows it while downloads stay healthy and cuts it when batches are throttled or time out.
+    Throttled batches are queued again after the Retry-After the org asked for, or else the retry_policy's
+    backoff, until they have been throttled max_throttle_attempts times or the run's retry budget is used up. If a manifest is provided, every batch is
+    recorded in it as it finishes.
+
+    :param pool: A pool from build_download_pool to download with, shared with other jobs. A pool is started
+        for these batches alone if it is not provided.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+    if pool_options is None:
+        pool_options = ClientPoolOptions()
+    if controller is None:
+        controller = AIMDController()
+
+    if pool is None:
+        async with build_download_pool(credentials, pool_options, controller) as pool:
+            return await pull_batches(
+                lots=lots,
+                credentials=credentials,
+                pool_options=pool_options,
+                controller=controller,
+                max_throttle_attempts=max_throttle_attempts,
+                manifest=manifest,
+                pool=pool,
+                retry_policy=retry_policy,
+            )
+
+    if retry_policy is None:
+        retry_policy = RetryPolicy()
+
+    async def pull(batch: Batch) -> Batch:
+        for throttle_attempt in range(1, max_throttle_attempts + 1):
+            queued = perf_counter()
+            async with controller.slot() as epoch:
+                queue_wait = perf_counter() - queued
+                result = await pool.apply(_pull_batch, (batch,))
+            result.queue_wait = queue_wait
+
+            if result.status_code in THROTTLE_STATUS_CODES:
+                await controller.record_backoff(
+                    f"HTTP {result.status_code}", epoch=epoch
+                )
+                if throttle_attempt < max_throttle_attempts and default_budget.take():
+                    await asyncio.sleep(
+                        result.retry_after
+                        if result.retry_after is not None
+                        else retry_policy.delay(throttle_attempt)
+                    )
+                    continue
+            elif result.attempt_count > 1 or result.retry_count > 0:
+                await controller.record_backoff(
+                    f"{result.attempt_count - 1 + result.retry_count} retried request(s)",
+                    epoch=epoch,
+                )
+            elif result.status == "COMPLETE":
+                await controller.record_success(result.time_to_first_byte)
+            default_recorder.record_batch(BatchMetric.from_query_batch(result))
+            if manifest is not None:
+                manifest.append(result)
+            return result
+
+    return list(await asyncio.gather(*[pull(batch) for batch in lots]))
+
+
+def _resume_locator_template(
+    template: Batch, previous: Dict[int, Batch]
+) -> Tuple[List[Batch], Optional[Batch]]:
+    """
+    Walks the pages recorded by a previous run from the start of the results, following each page's
+    next_locator, for as long as the pages are still on disk.
+
+    :return: The pages that can be kept, and the template to continue downloading from or None if every page
+        is already downloaded.
+    """
+    downloaded: List[Batch] = []
+    batch_start = template.batch_start
+    while batch_start in previous and batch_is_downloaded(previous[batch_start]):
+        page = previous[batch_start]
+        downloaded.append(page)
+        if page.next_locator is None:
+            return downloaded, None
+        batch_start += page.record_count
+
+    if not downloaded:
+        return downloaded, template
+    return downloaded, template.copy(
+        update={"batch_start": batch_start, "locator": downloaded[-1].next_locator}
+    )
+
+
 def download_query_data(
     job_id: str,
     version: str = "53.0",
     download_path: str = "./data",
     batch_size: int = 10000,
     dry_run: bool = False,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    parallel_offsets: bool = False,
+    pool_options: ClientPoolOptions = None,
+    controller: AIMDController = None,
+    resume: bool = False,
+    compress: bool = False,
+    client: httpx.Client = None,
+    credentials: CredentialModel = None,
+    async_client: httpx.AsyncClient = None,
+    loop: asyncio.AbstractEventLoop = None,
 ):
-    job_data = get_query_job(job_id=job_id, version=version)
+    """
+    Downloads the results of a completed query job to download_path.
+
+    By default the pages are downloaded in order by following the Sforce-Locator header Salesforce returns with
+    each page. When parallel_offsets is True, the results are split into batches up front using record offsets
+    as locators and the batches are downloaded in parallel instead. That relies on an undocumented locator format.
+
+    When compress is True, the results are requested gzip encoded and decompressed off the event loop, and the
+    bytes saved are printed to stderr. Otherwise they are requested uncompressed.
+
+    Finished batches are recorded in a manifest in download_path. When resume is True, batches the manifest
+    shows were downloaded, and whose files are still intact, are kept and only the rest are downloaded.
+
+    :param async_client: The client pages are followed with, bound to loop, which the download is run on.
+        A client is opened for the download if it is not provided.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+    job_data = get_query_job(
+        job_id=job_id, version=version, client=client, credentials=credentials
+    )
     record_count = job_data.get("numberRecordsProcessed")
-    credentials = load_credentials()
     if record_count == 0:
         print("Record Count is 0, No results to process", file=stderr)
         exit()
 
+    if controller is None:
+        controller = AIMDController()
+
     if batch_size is None or batch_size == 0:
-        batch_size = ceil(job_data.get("numberRecordsProcessed") / cpu_count())
+        batch_size = ceil(job_data.get("numberRecordsProcessed") / controller.maximum)
 
     lots = [
         Batch(
@@ -251,6 +844,8 @@ def download_query_data(
             base_path=credentials.instance_url,
             object=job_data.get("object"),
             download_path=download_path,
+            chunk_size=chunk_size,
+            compress=compress,
         )
         for i in range(0, job_data.get("numberRecordsProcessed"), batch_size)
     ]
@@ -258,10 +853,614 @@ def download_query_data(
     if dry_run:
         return CompletedJob(id=job_id, batches=lots).json(indent=2)
 
-    return CompletedJob(id=job_id, batches=asyncio.run(pull_batches(lots=lots))).json(
-        indent=2
+    manifest = BatchManifest(download_path=download_path, job_id=job_id)
+    previous = manifest.load() if resume else {}
+    if not resume:
+        manifest.clear()
+
+    if not parallel_offsets:
+        downloaded, template = _resume_locator_template(lots[0], previous)
+        if downloaded:
+            print(
+                f"Resuming job {job_id}: {len(downloaded)} page(s) already downloaded",
+                file=stderr,
+            )
+        if template is not None:
+            default_recorder.expect(
+                records=record_count
+                - sum(batch.record_count or 0 for batch in downloaded)
+            )
+            downloaded += run_async(
+                a_follow_query_locators(
+                    template=template,
+                    async_client=async_client,
+                    credentials=credentials,
+                    pool_options=pool_options,
+                    manifest=manifest,
+                    controller=controller,
+                ),
+                loop=loop,
+            )
+    else:
+        downloaded = [
+            previous[lot.batch_start]
+            for lot in lots
+            if lot.batch_start in previous
+            and previous[lot.batch_start].batch_size == lot.batch_size
+            and batch_is_downloaded(previous[lot.batch_start])
+        ]
+        if downloaded:
+            print(
+                f"Resuming job {job_id}: {len(downloaded)} of {len(lots)} batches already downloaded",
+                file=stderr,
+            )
+        skip = {batch.batch_start for batch in downloaded}
+        remaining = [lot for lot in lots if lot.batch_start not in skip]
+
+        if remaining:
+            default_recorder.expect(
+                records=sum(
+                    min(lot.batch_size, record_count - lot.batch_start)
+                    for lot in remaining
+                ),
+                batches=len(remaining),
+            )
+            downloaded += run_async(
+                pull_batches(
+                    lots=remaining,
+                    credentials=credentials,
+                    pool_options=pool_options,
+                    controller=controller,
+                    manifest=manifest,
+                ),
+                loop=loop,
+            )
+
+    if compress:
+        transferred = [
+            batch for batch in downloaded if batch.bytes_transferred is not None
+        ]
+        print_compression_savings(
+            raw_bytes=sum(batch.file_size for batch in transferred),
+            transferred_bytes=sum(batch.bytes_transferred for batch in transferred),
+        )
+
+    return CompletedJob(
+        id=job_id, batches=sorted(downloaded, key=lambda batch: batch.batch_start)
+    ).json(indent=2)
+
+
+class QuerySpec(BaseModel):
+    """
+    A query listed in a query manifest. Without a download_path, the results go to a directory named after the
+    object, and without a batch_size the one the whole run uses applies. An incremental query only loads the
+    records modified since the object's watermark.
+    """
+
+    object: str
+    query: str
+    operation: str = "query"
+    download_path: Optional[str] = None
+    batch_size: Optional[int] = None
+    incremental: bool = False
+
+
+class QueryRunResult(BaseModel):
+    object: str
+    job_id: Optional[str] = None
+    state: Optional[str] = None
+    message: Optional[str] = None
+    download_path: str
+    created_date: Optional[str] = None
+    batches: List[Batch] = []
+
+    @property
+    def downloaded(self) -> bool:
+        return self.state == "JobComplete" and all(
+            batch.status == "COMPLETE" for batch in self.batches
+        )
+
+
+def load_query_manifest(file_path: str) -> List[QuerySpec]:
+    """
+    Reads a query manifest, a JSON file, or a YAML file when PyYAML is installed, holding either a list of
+    queries or a mapping with the list under "queries".
+    """
+    path = Path(file_path).expanduser()
+    with open(path) as manifest_in:
+        if path.suffix.lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise RuntimeError(
+                    "Reading a YAML manifest requires the PyYAML package, install it with: pip install pyyaml"
+                )
+            entries = yaml.safe_load(manifest_in)
+        else:
+            entries = json.load(manifest_in)
+    if isinstance(entries, dict):
+        entries = entries.get("queries", [])
+    return [QuerySpec.parse_obj(entry) for entry in entries]
+
+
+async def a_download_query_jobs(
+    runs: List[Tuple[QuerySpec, QueryRunResult]],
+    version: str,
+    batch_size: int,
+    chunk_size: int,
+    parallel_offsets: bool,
+    pool_options: ClientPoolOptions,
+    controller: AIMDController,
+    compress: bool,
+    backoff: Optional[PollBackoff],
+    credentials: CredentialModel,
+    async_client: httpx.AsyncClient = None,
+):
+    """
+    Polls the created jobs of a manifest run together and starts downloading each one's results as soon as it
+    completes. Every download shares one client, async_client if provided, one worker pool when
+    parallel_offsets is True, and the controller's limit on requests in flight. The results are filled in on
+    each QueryRunResult.
+    """
+    by_job_id = {
+        result.job_id: (spec, result) for spec, result in runs if result.job_id
+    }
+
+    async with AsyncExitStack() as stack:
+        if async_client is None:
+            async_client = await stack.enter_async_context(
+                build_async_client(credentials=credentials, pool_options=pool_options)
+            )
+        pool = None
+        if parallel_offsets:
+            pool = await stack.enter_async_context(
+                build_download_pool(credentials, pool_options, controller)
+            )
+
+        async def download(spec: QuerySpec, result: QueryRunResult, job: Dict):
+            record_count = job.get("numberRecordsProcessed", 0)
+            size = spec.batch_size or batch_size
+            if parallel_offsets and not size:
+                size = ceil(record_count / controller.maximum)
+            template = Batch(
+                batch_start=0,
+                batch_size=size,
+                job_id=result.job_id,
+                api_version=version,
+                base_path=credentials.instance_url,
+                object=spec.object,
+                download_path=result.download_path,
+                chunk_size=chunk_size,
+                compress=compress,
+            )
+            manifest = BatchManifest(
+                download_path=result.download_path, job_id=result.job_id
+            )
+            manifest.clear()
+            if parallel_offsets:
+                lots = [
+                    template.copy(update={"batch_start": i})
+                    for i in range(0, record_count, template.batch_size)
+                ]
+                default_recorder.expect(records=record_count, batches=len(lots))
+                result.batches = await pull_batches(
+                    lots=lots,
+                    credentials=credentials,
+                    pool_options=pool_options,
+                    controller=controller,
+                    manifest=manifest,
+                    pool=pool,
+                )
+            else:
+                default_recorder.expect(records=record_count)
+                result.batches = await a_follow_query_locators(
+                    template=template,
+                    async_client=async_client,
+                    credentials=credentials,
+                    manifest=manifest,
+                    controller=controller,
+                )
+
+            failed = [batch for batch in result.batches if batch.status != "COMPLETE"]
+            if failed:
+                result.message = failed[0].message
+            else:
+                result.message = f"{len(result.batches)} batches downloaded to {result.download_path}"
+            print(f"{spec.object}: {result.message}", file=stderr)
+
+        downloads = []
+        async for job_id, job in a_watch_jobs(
+            async_client,
+            job_ids=list(by_job_id),
+            kind="query",
+            version=version,
+            backoff=backoff,
+        ):
+            spec, result = by_job_id[job_id]
+            if not isinstance(job, dict):
+                result.message = f"Error occurred while checking the query job: {job}"
+                continue
+            result.state = job.get("state")
+            if result.state != "JobComplete":
+                result.message = job.get("errorMessage")
+                print(f"{spec.object}: job {job_id} {result.state}", file=stderr)
+            elif job.get("numberRecordsProcessed") == 0:
+                result.message = "Record Count is 0, No results to process"
+            else:
+                downloads.append(asyncio.ensure_future(download(spec, result, job)))
+
+        await asyncio.gather(*downloads)
+
+
+def run_query_manifest(
+    queries: List[QuerySpec],
+    version: str = "53.0",
+    download_path: str = "./data",
+    batch_size: int = 10000,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    parallel_offsets: bool = False,
+    pool_options: ClientPoolOptions = None,
+    controller: AIMDController = None,
+    compress: bool = False,
+    backoff: PollBackoff = None,
+    credentials: CredentialModel = None,
+    watermarks: WatermarkStore = None,
+    overlap: timedelta = timedelta(0),
+    client: httpx.Client = None,
+    async_client: httpx.AsyncClient = None,
+    loop: asyncio.AbstractEventLoop = None,
+) -> List[QueryRunResult]:
+    """
+    Creates a query job for every query up front so the org can process them side by side, then downloads the
+    results of each job as it completes. All the downloads share the controller's concurrency limit rather
+    than each job getting its own.
+
+    Incremental queries are limited to the records modified since their object's watermark, less the overlap.
+    Once every incremental query of an object has been downloaded in full, the object's watermark moves to the
+    createdDate of the earliest of their jobs.
+
+    :param async_client: The client the jobs are polled and downloaded with, bound to loop, which the downloads
+        are run on. A client is opened for the downloads if it is not provided.
+
+    :return: The job and downloaded batches of each query, in the order of queries.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+    if watermarks is None and any(spec.incremental for spec in queries):
+        watermarks = WatermarkStore()
+    if pool_options is None:
+        pool_options = ClientPoolOptions()
+    if controller is None:
+        controller = AIMDController()
+
+    owns_client = client is None
+    if client is None:
+        client = build_client(credentials, pool_options)
+    runs: List[Tuple[QuerySpec, QueryRunResult]] = []
+    try:
+        for spec in queries:
+            result = QueryRunResult(
+                object=spec.object,
+                download_path=spec.download_path
+                or str(Path(download_path, spec.object)),
+            )
+            query = spec.query
+            if spec.incremental:
+                query = incremental_query(
+                    query,
+                    watermarks.get(credentials.instance_url, spec.object),
+                    overlap,
+                )
+            job = create_query_job(
+                query=query,
+                version=version,
+                operation=spec.operation,
+                client=client,
+                credentials=credentials,
+            )
+            if not isinstance(job, dict) or job.get("id") is None:
+                result.state = "Failed"
+                result.message = f"Error occurred while creating the query job: {job}"
+            else:
+                result.job_id = job["id"]
+                result.state = job.get("state")
+                result.created_date = job.get("createdDate")
+            runs.append((spec, result))
+    finally:
+        if owns_client:
+            client.close()
+
+    run_async(
+        a_download_query_jobs(
+            runs=runs,
+            version=version,
+            batch_size=batch_size,
+            chunk_size=chunk_size,
+            parallel_offsets=parallel_offsets,
+            pool_options=pool_options,
+            controller=controller,
+            compress=compress,
+            backoff=backoff,
+            credentials=credentials,
+            async_client=async_client,
+        ),
+        loop=loop,
+    )
+
+    incremental = {}
+    for spec, result in runs:
+        if spec.incremental:
+            incremental.setdefault(spec.object, []).append(result)
+    for object_name, results in incremental.items():
+        if all(result.downloaded for result in results):
+            watermarks.set(
+                credentials.instance_url,
+                object_name,
+                min(soql.parse_datetime(result.created_date) for result in results),
+            )
+        else:
+            print(
+                f"{object_name}: the watermark was left as it was, not every job downloaded",
+                file=stderr,
+            )
+    return [result for _, result in runs]
+
+
+def _rest_query(client: httpx.Client, version: str, operation: str, query: str):
+    """
+    Runs a query with the REST query endpoint.
+
+    :return: The first page of the results.
+    """
+    data = client.get(
+        f"services/data/v{version}/{'queryAll' if operation == 'queryAll' else 'query'}",
+        params={"q": query},
+    )
+    if data.status_code != 200:
+        raise RuntimeError(
+            f"Error occurred while running {query}: {data.content.decode()}"
+        )
+    return data.json()
+
+
+def get_field_bounds(
+    object_name: str,
+    field: str,
+    version: str,
+    operation: str = "query",
+    client: httpx.Client = None,
+    credentials: CredentialModel = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Looks up the lowest and highest value of a sortable field on an object with the REST query endpoint.
+
+    :return: The lowest and highest value, or None for both if the object has no records.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+    owns_client = client is None
+    if client is None:
+        client = build_client(credentials)
+
+    bounds = []
+    try:
+        for direction in ("ASC", "DESC"):
+            records = _rest_query(
+                client,
+                version,
+                operation,
+                f"SELECT {field} FROM {object_name} WHERE {field} != null "
+                f"ORDER BY {field} {direction} LIMIT 1",
+            ).get("records", [])
+            if not records:
+                return None, None
+            bounds.append(records[0][field])
+    finally:
+        if owns_client:
+            client.close()
+    return bounds[0], bounds[1]
+
+
+def sample_id_boundaries(
+    object_name: str,
+    chunks: int,
+    version: str,
+    operation: str = "query",
+    client: httpx.Client = None,
+    credentials: CredentialModel = None,
+) -> List[str]:
+    """
+    Reads the Ids of an object in order with the REST query endpoint, a page of up to 2000 at a time, and takes
+    every total / chunks-th one, so the ranges between them hold about as many records each. Ids are rarely
+    spread evenly between the lowest and the highest one, deleted records and Ids handed out by other pods
+    leave gaps.
+
+    :return: Up to chunks - 1 Ids in increasing order, none if the object has fewer records than chunks.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+    owns_client = client is None
+    if client is None:
+        client = build_client(credentials)
+
+    boundaries: List[str] = []
+    try:
+        page = _rest_query(
+            client, version, operation, f"SELECT Id FROM {object_name} ORDER BY Id"
+        )
+        total = page.get("totalSize", 0)
+        positions = sorted({total * index // chunks for index in range(1, chunks)})
+        positions = [position for position in positions if position > 0]
+        offset = 0
+        while positions:
+            records = page.get("records", [])
+            while positions and positions[0] < offset + len(records):
+                boundaries.append(records[positions.pop(0) - offset]["Id"])
+            offset += len(records)
+            if not positions or page.get("done", True):
+                break
+            data = client.get(page["nextRecordsUrl"])
+            if data.status_code != 200:
+                raise RuntimeError(
+                    f"Error occurred while reading the Ids of {object_name}: {data.content.decode()}"
+                )
+            page = data.json()
+    finally:
+        if owns_client:
+            client.close()
+    return boundaries
+
+
+def split_query(
+    query: str,
+    chunks: int,
+    field: str = "Id",
+    version: str = "53.0",
+    operation: str = "query",
+    client: httpx.Client = None,
+    credentials: CredentialModel = None,
+) -> List[Tuple[str, str]]:
+    """
+    Splits a query into up to chunks queries over consecutive ranges of field, which together return the same
+    records as the query. Id ranges are cut at Ids sampled from the org, see sample_id_boundaries, so they hold
+    about as many records each. Datetime ranges are spaced evenly between the lowest and highest value of the
+    field, which are read from the org.
+
+    :param field: Id, or a datetime field such as CreatedDate.
+
+    :return: The range predicate and query of each part.
+    """
+    object_name = soql.get_object_name(query)
+    if field.lower() == "id":
+        boundaries = sample_id_boundaries(
+            object_name=object_name,
+            chunks=chunks,
+            version=version,
+            operation=operation,
+            client=client,
+            credentials=credentials,
+        )
+    else:
+        low, high = get_field_bounds(
+            object_name=object_name,
+            field=field,
+            version=version,
+            operation=operation,
+            client=client,
+            credentials=credentials,
+        )
+        if low is None:
+            return [("", query)]
+        boundaries = soql.datetime_boundaries(
+            soql.parse_datetime(low), soql.parse_datetime(high), chunks
+        )
+
+    return [
+        (predicate, soql.add_where_clause(query, predicate) if predicate else query)
+        for predicate in soql.range_predicates(
+            field, boundaries, quote=field.lower() == "id"
+        )
+    ]
+
+
+def run_split_query(
+    query: str,
+    chunks: int,
+    field: str = "Id",
+    version: str = "53.0",
+    operation: str = "query",
+    download_path: str = "./data",
+    batch_size: int = 10000,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    parallel_offsets: bool = False,
+    pool_options: ClientPoolOptions = None,
+    controller: AIMDController = None,
+    compress: bool = False,
+    backoff: PollBackoff = None,
+    credentials: CredentialModel = None,
+    incremental: bool = False,
+    watermarks: WatermarkStore = None,
+    overlap: timedelta = timedelta(0),
+    client: httpx.Client = None,
+    async_client: httpx.AsyncClient = None,
+    loop: asyncio.AbstractEventLoop = None,
+) -> Dict:
+    """
+    Runs a query as a query job per range of field, see split_query, so the org processes the ranges in
+    parallel. Every job downloads into download_path, and a manifest listing the jobs and the range each one
+    covers is written next to the results as <object>.split.json. With incremental, every range is limited to
+    the records modified since the object's watermark, as in run_query_manifest.
+
+    :return: The contents of the manifest.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+    object_name = soql.get_object_name(query)
+    parts = split_query(
+        query=query,
+        chunks=chunks,
+        field=field,
+        version=version,
+        operation=operation,
+        client=client,
+        credentials=credentials,
     )
 
+    results = run_query_manifest(
+        queries=[
+            QuerySpec(
+                object=object_name,
+                query=part_query,
+                operation=operation,
+                download_path=download_path,
+                incremental=incremental,
+            )
+            for _, part_query in parts
+        ],
+        version=version,
+        download_path=download_path,
+        batch_size=batch_size,
+        chunk_size=chunk_size,
+        parallel_offsets=parallel_offsets,
+        pool_options=pool_options,
+        controller=controller,
+        compress=compress,
+        backoff=backoff,
+        credentials=credentials,
+        watermarks=watermarks,
+        overlap=overlap,
+        client=client,
+        async_client=async_client,
+        loop=loop,
+    )
+
+    split_manifest = {
+        "object": object_name,
+        "query": query,
+        "field": field,
+        "jobs": [
+            {
+                "job_id": result.job_id,
+                "range": predicate,
+                "state": result.state,
+                "message": result.message,
+                "record_count": sum(
+                    batch.record_count or 0 for batch in result.batches
+                ),
+                "files": [
+                    batch.downloaded_file_path
+                    for batch in result.batches
+                    if batch.status == "COMPLETE"
+                ],
+            }
+            for (predicate, _), result in zip(parts, results)
+        ],
+    }
+    manifest_path = Path(download_path, f"{object_name}.split.json")
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(split_manifest, indent=2))
+    return split_manifest
+
 
 def get_job(
     job_id: str,
@@ -272,16 +1471,7 @@ def get_job(
     if credentials is None:
         credentials = load_credentials()
     if client is None:
-        client = httpx.Client(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-                "Accept": "application/json",
-            },
-            timeout=httpx.Timeout(
-                credentials.client_timeout, connect=credentials.client_connect_timeout
-            ),
-        )
+        client = build_client(credentials)
     data = client.get(
         f"services/data/v{version}/jobs/query/{job_id}",
     )
@@ -293,6 +1483,44 @@ def get_job(
     return data.json()
 
 
+def wait_for_job(
+    job_id: str,
+    kind: str,
+    version: str,
+    credentials: CredentialModel = None,
+    backoff: PollBackoff = None,
+    async_client: httpx.AsyncClient = None,
+    loop: asyncio.AbstractEventLoop = None,
+) -> Dict:
+    """
+    Polls a job until it is complete, failed or aborted, checking less often the longer it runs.
+
+    :param kind: The kind of job, "query" or "ingest", so the status is read from the right endpoint first time.
+    :param async_client: The client to poll with, bound to loop, which the polling is run on. A client is
+        opened for the polling if it is not provided.
+    :return: The last status read for the job.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+
+    async def wait() -> Dict:
+        async with AsyncExitStack() as stack:
+            client = async_client
+            if client is None:
+                client = await stack.enter_async_context(
+                    build_async_client(credentials=credentials)
+                )
+            return await a_wait_for_job(
+                client,
+                job_id=job_id,
+                kind=kind,
+                version=version,
+                backoff=backoff,
+            )
+
+    return run_async(wait(), loop=loop)
+
+
 def create_ingest_job(
     object_name: str,
     operation: str,
@@ -304,13 +1532,7 @@ def create_ingest_job(
     if credentials is None:
         credentials = load_credentials()
     if client is None:
-        client = httpx.Client(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-                "Accept": "application/json",
-            },
-        )
+        client = build_client(credentials)
 
     query_path = f"services/data/v{version}/jobs/ingest"
 
@@ -322,6 +1544,11 @@ def create_ingest_job(
             )
         body["externalIdFieldName"] = external_id_field_name
 
+    refused = default_monitor.check_job("ingest")
+    if refused is not None:
+        print(refused, file=stderr)
+        return [{"errorCode": "API_RESERVE_REACHED", "message": refused}]
+
     data = client.post(
         f"{query_path}",
         json=body,
@@ -337,46 +1564,218 @@ def load_ingest_job_data(
     version: str,
     client: httpx.Client = None,
     credentials: CredentialModel = None,
-) -> Batch:
+    content: Iterable[bytes] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    compress: bool = False,
+) -> Dict:
+    """
+    Uploads a csv to an ingest job and marks the upload complete, or aborts the job if the upload failed.
+    The body is streamed, so at most chunk_size bytes of it are held in memory at a time.
+
+    When compress is True, the body is gzip compressed as it is streamed and sent with Content-Encoding: gzip.
+    The result records the bytes of csv uploaded and the bytes sent for them, when they are known, and the
+    number of requests retried.
+
+    :param file_path: The csv file to upload. When content is provided, it is only used to label the result.
+
+    :param content: The csv to upload as an iterable of bytes, used instead of reading file_path. Content that
+        can only be iterated once, like a generator, is sent once and not retried if the upload fails.
+    """
 
     if credentials is None:
         credentials = load_credentials()
     if client is None:
-        client = httpx.Client(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-            },
-        )
-    client.headers.update({"Content-Type": "text/csv"})
+        client = build_client(credentials)
     query_path = f"services/data/v{version}/jobs/ingest/{job_id}"
 
-    with open(file_path, "r") as file_in:
-        data = client.put(f"{query_path}/batches", content=file_in.read(), timeout=None)
+    # The content type is set per request rather than on the client, which may be shared between threads.
+    headers = {"Content-Type": "text/csv"}
+    if content is None:
+        content = FileChunks(file_path=file_path, chunk_size=chunk_size)
+        if not compress:
+            # With a known length the file is sent as is rather than with chunked transfer encoding.
+            headers["Content-Length"] = str(content.size())
+    elif isinstance(content, (bytes, bytearray)):
+        content = [content]
+    if compress:
+        content = GzipChunks(content)
+        headers["Content-Encoding"] = "gzip"
+
+    data = None
+    try:
+        data = client.put(
+            f"{query_path}/batches",
+            content=content,
+            headers=headers,
+            timeout=None,
+        )
+    except httpx.HTTPError as e:
+        # The job is aborted below, so it is not left Open and the other batches still report.
+        message = f"Error occurred while uploading {file_path}: {type(e).__name__}: {e}"
+    else:
         if data.status_code != 200 and data.status_code != 201:
             message = data.content.decode()
-
         else:
             message = f"Batch: {file_path} loaded."
 
-    client.headers.update({"Content-Type": "application/json"})
     payload = {
-        "state": "UploadComplete" if data.status_code in (200, 201) else "Aborted"
+        "state": (
+            "UploadComplete"
+            if data is not None and data.status_code in (200, 201)
+            else "Aborted"
+        )
     }
 
-    result = client.patch(
-        f"{query_path}",
-        json=payload,
-        timeout=None,
-    )
+    result = None
+    try:
+        result = client.patch(
+            f"{query_path}",
+            json=payload,
+            headers={"Content-Type": "application/json"},
+            timeout=None,
+        )
+    except httpx.HTTPError as e:
+        message = f"{message} Error occurred while closing job {job_id}: {type(e).__name__}: {e}"
+        payload["state"] = "Failed"
     payload["id"] = job_id
     payload["url"] = f"{query_path}"
     payload["file_path"] = file_path
     payload["message"] = message
-    payload["status_code"] = result.status_code
+    payload["status_code"] = result.status_code if result is not None else None
+    payload["retry_count"] = sum(
+        len(response.extensions.get("retries", []))
+        for response in (data, result)
+        if response is not None
+    )
+    if compress:
+        payload["raw_bytes"] = content.raw_bytes
+        payload["transferred_bytes"] = content.compressed_bytes
+    elif isinstance(content, (FileChunks, list)):
+        payload["raw_bytes"] = payload["transferred_bytes"] = (
+            content.size()
+            if isinstance(content, FileChunks)
+            else sum(len(part) for part in content)
+        )
     return payload
 
 
+def _ingest_file(
+    file_path: str,
+    record_count: Optional[int],
+    object_name: str,
+    operation: str,
+    external_id_field_name: str,
+    version: str,
+    client: httpx.Client,
+    credentials: CredentialModel,
+    content: bytes = None,
+    compress: bool = False,
+    submitted_at: float = None,
+) -> Dict:
+    """
+    Creates an ingest job for a single batch file and uploads the file to it. When content is provided it is
+    uploaded instead of the file, and file_path only labels the result. The result is recorded in the
+    default_recorder, with the seconds it took and, given submitted_at, the seconds it waited to start.
+    """
+    started = perf_counter()
+    payload = _create_and_load_ingest_job(
+        file_path=file_path,
+        record_count=record_count,
+        object_name=object_name,
+        operation=operation,
+        external_id_field_name=external_id_field_name,
+        version=version,
+        client=client,
+        credentials=credentials,
+        content=content,
+        compress=compress,
+    )
+    payload["elapsed"] = perf_counter() - started
+    if submitted_at is not None:
+        payload["queue_wait"] = started - submitted_at
+    default_recorder.record_batch(BatchMetric.from_ingest_result(payload))
+    return payload
+
+
+def _create_and_load_ingest_job(
+    file_path: str,
+    record_count: Optional[int],
+    object_name: str,
+    operation: str,
+    external_id_field_name: str,
+    version: str,
+    client: httpx.Client,
+    credentials: CredentialModel,
+    content: Optional[bytes],
+    compress: bool,
+) -> Dict:
+    bulk_job = create_ingest_job(
+        object_name=object_name,
+        operation=operation.lower(),
+        external_id_field_name=external_id_field_name,
+        version=version,
+        client=client,
+        credentials=credentials,
+    )
+    if not isinstance(bulk_job, dict) or bulk_job.get("id") is None:
+        return {
+            "state": "Failed",
+            "file_path": file_path,
+            "record_count": record_count,
+            "message": f"Error occurred while creating the ingest job: {bulk_job}",
+        }
+
+    payload = load_ingest_job_data(
+        job_id=bulk_job.get("id"),
+        file_path=file_path,
+        version=version,
+        client=client,
+        credentials=credentials,
+        content=content,
+        compress=compress,
+    )
+    payload["record_count"] = record_count
+    return payload
+
+
+def _pipeline_ingest_batches(
+    files: List[str],
+    batch_size: int,
+    max_records: Optional[int],
+    max_concurrent_jobs: int,
+    ingest: partial,
+) -> List[Dict]:
+    """
+    Uploads each chunk produced by split_csv_files straight from memory while the next chunk is being
+    combined. At most max_concurrent_jobs chunks are held waiting for or in upload at once, combining pauses
+    until an upload finishes.
+    """
+    in_flight = BoundedSemaphore(max_concurrent_jobs)
+    futures = []
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_jobs) as executor:
+        for count, chunk in enumerate(
+            split_csv_files(
+                files=files, file_size_limit=batch_size, max_records=max_records
+            )
+        ):
+            # The buffer is reused for the next chunk, so take a copy of it before handing it off.
+            content = chunk.buffer.getvalue()
+            default_recorder.expect(records=chunk.record_count, batches=1)
+            in_flight.acquire()
+            future = executor.submit(
+                ingest,
+                file_path=f"batch_{count}",
+                record_count=chunk.record_count,
+                content=content,
+                submitted_at=perf_counter(),
+            )
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append(future)
+
+    return [future.result() for future in futures]
+
+
 def ingest_job_data_batches(
     object_name: str,
     operation: str,
@@ -388,59 +1787,248 @@ def ingest_job_data_batches(
     working_directory: str = None,
     client: httpx.Client = None,
     credentials: CredentialModel = None,
+    max_concurrent_jobs: int = 4,
+    pipeline: bool = False,
+    max_records: Optional[int] = None,
+    compress: bool = False,
 ):
+    """
+    Combines the matching files into batch files of at most batch_size bytes, and max_records records if set,
+    cutting them only on record boundaries, and loads each batch file with its
+    own ingest job. Up to max_concurrent_jobs batch files are uploaded at the same time, keep it below the org's
+    limit on concurrent Bulk jobs.
+
+    When compress is True, each batch is gzip compressed as it is uploaded.
+
+    When pipeline is True, the combined chunks are uploaded from memory as soon as each one is ready, while the
+    next one is being combined, and nothing is written to the working directory.
+
+    :return: The result of each upload, in the order of the batch files.
+    """
+
+    if credentials is None:
+        credentials = load_credentials()
+    if client is None:
+        client = build_client(credentials)
+
+    ingest = partial(
+        _ingest_file,
+        object_name=object_name,
+        operation=operation,
+        external_id_field_name=external_id_field_name,
+        version=version,
+        client=client,
+        credentials=credentials,
+        compress=compress,
+    )
+
+    if pipeline:
+        ingest_job_results = _pipeline_ingest_batches(
+            files=get_target_files(path_or_file, pattern),
+            batch_size=batch_size,
+            max_records=max_records,
+            max_concurrent_jobs=max_concurrent_jobs,
+            ingest=ingest,
+        )
+    else:
+        ingest_job_results = _load_batch_files(
+            object_name=object_name,
+            path_or_file=path_or_file,
+            pattern=pattern,
+            batch_size=batch_size,
+            max_records=max_records,
+            working_directory=working_directory,
+            max_concurrent_jobs=max_concurrent_jobs,
+            ingest=ingest,
+        )
+
+    if compress:
+        print_compression_savings(
+            raw_bytes=sum(result.get("raw_bytes", 0) for result in ingest_job_results),
+            transferred_bytes=sum(
+                result.get("transferred_bytes", 0) for result in ingest_job_results
+            ),
+        )
+    return ingest_job_results
+
+
+def _load_batch_files(
+    object_name: str,
+    path_or_file: str,
+    pattern: str,
+    batch_size: int,
+    max_records: Optional[int],
+    working_directory: Optional[str],
+    max_concurrent_jobs: int,
+    ingest: partial,
+) -> List[Dict]:
+    """
+    Writes the combined batch files to the working directory and then uploads them.
+    """
 
     if working_directory is None:
         working_directory = Path(gettempdir(), object_name)
+    working_directory = Path(working_directory)
     if working_directory.exists() and working_directory.is_dir():
         # working_directory.rmdir()
         shutil.rmtree(working_directory)
     working_directory.mkdir(parents=True)
 
-    if credentials is None:
-        credentials = load_credentials()
-    if client is None:
-        client = httpx.Client(
-            base_url=credentials.instance_url,
-            headers={
-                "Authorization": f"Bearer {credentials.token}",
-                "Content-Type": "application/json",
-            },
-        )
-
     file_task = combine_files(
         path_or_file=path_or_file,
         pattern=pattern,
         output_directory=working_directory,
         file_size_limit=batch_size,
+        max_records=max_records,
     )
 
     if file_task.status != "success":
         raise RuntimeError(f"Combining files failed: {file_task.message}")
 
-    ingest_job_results = []
+    default_recorder.expect(
+        records=sum(file_task.record_counts), batches=len(file_task.payload)
+    )
+    submitted_at = perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrent_jobs) as executor:
+        ingest_job_results = list(
+            executor.map(
+                partial(ingest, submitted_at=submitted_at),
+                file_task.payload,
+                file_task.record_counts,
+            )
+        )
+    return ingest_job_results
 
-    for file_path in file_task.payload:
 
-        bulk_job = create_ingest_job(
-            object_name=object_name,
-            operation=operation.lower(),
-            external_id_field_name=external_id_field_name,
+# The result files of an ingest job, each a csv of the records in that state.
+INGEST_RESULT_FILES = ("successfulResults", "failedResults", "unprocessedrecords")
+
+
+async def a_get_ingest_results(
+    job_id: str,
+    version: str,
+    download_path: str,
+    async_client: httpx.AsyncClient,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> Dict[str, Optional[str]]:
+    """
+    Streams the three result files of a finished ingest job to download_path at the same time.
+
+    :return: The path each result file was written to, keyed by result name, or None if it could not be fetched.
+    """
+    data_directory = Path(download_path)
+    data_directory.mkdir(parents=True, exist_ok=True)
+    query_path = f"services/data/v{version}/jobs/ingest/{job_id}"
+
+    async def get_result_file(result_name: str) -> Optional[str]:
+        file_path = Path(data_directory, f"{job_id}_{result_name}.csv")
+        async with async_client.stream(
+            "GET", f"{query_path}/{result_name}/", headers={"Accept": "text/csv"}
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                print(
+                    f"Could not fetch {result_name} for job {job_id}: {response.text}",
+                    file=stderr,
+                )
+                return None
+            await _write_results_page(response, file_path, chunk_size)
+        return str(file_path)
+
+    file_paths = await asyncio.gather(
+        *[get_result_file(result_name) for result_name in INGEST_RESULT_FILES]
+    )
+    return dict(zip(INGEST_RESULT_FILES, file_paths))
+
+
+async def a_wait_for_ingest_jobs(
+    ingest_job_results: List[Dict],
+    version: str,
+    download_path: str,
+    async_client: httpx.AsyncClient,
+    backoff: PollBackoff = None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> List[Dict]:
+    """
+    Polls every uploaded ingest job together, and fetches the result files of each job as soon as it finishes.
+    Results for uploads that never reached UploadComplete are passed through unchanged.
+    """
+
+    async def finish(ingest_job_result: Dict) -> Dict:
+        if ingest_job_result.get("state") != "UploadComplete":
+            return ingest_job_result
+        job_id = ingest_job_result["id"]
+        job = await a_wait_for_job(
+            async_client, job_id=job_id, kind="ingest", version=version, backoff=backoff
+        )
+        if not isinstance(job, dict):
+            return {**ingest_job_result, "state": "Unknown", "message": str(job)}
+        result_files = await a_get_ingest_results(
+            job_id=job_id,
             version=version,
-            client=client,
-            credentials=credentials,
+            download_path=download_path,
+            async_client=async_client,
+            chunk_size=chunk_size,
         )
+        return {
+            **ingest_job_result,
+            "state": job.get("state"),
+            "numberRecordsProcessed": job.get("numberRecordsProcessed", 0),
+            "numberRecordsFailed": job.get("numberRecordsFailed", 0),
+            "errorMessage": job.get("errorMessage"),
+            "result_files": result_files,
+        }
+
+    return await asyncio.gather(*[finish(result) for result in ingest_job_results])
+
 
-        ingest_job_results.append(
-            load_ingest_job_data(
-                job_id=bulk_job.get("id"),
-                file_path=file_path,
+def wait_for_ingest_jobs(
+    ingest_job_results: List[Dict],
+    version: str,
+    download_path: str = "./results",
+    credentials: CredentialModel = None,
+    backoff: PollBackoff = None,
+    pool_options: ClientPoolOptions = None,
+    async_client: httpx.AsyncClient = None,
+    loop: asyncio.AbstractEventLoop = None,
+) -> List[Dict]:
+    """
+    Waits for the jobs started by ingest_job_data_batches to finish, downloads their result files to
+    download_path and prints the records processed and failed across all of them to stderr.
+
+    :param async_client: The client to poll and download with, bound to loop, which the wait is run on. A
+        client is opened for the wait if it is not provided.
+    """
+    if credentials is None:
+        credentials = load_credentials()
+
+    async def wait() -> List[Dict]:
+        async with AsyncExitStack() as stack:
+            client = async_client
+            if client is None:
+                client = await stack.enter_async_context(
+                    build_async_client(
+                        credentials=credentials, pool_options=pool_options
+                    )
+                )
+            return await a_wait_for_ingest_jobs(
+                ingest_job_results=ingest_job_results,
                 version=version,
-                client=client,
-                credentials=credentials,
+                download_path=download_path,
+                async_client=client,
+                backoff=backoff,
             )
-        )
-    return ingest_job_results
+
+    finished = run_async(wait(), loop=loop)
+
+    processed = sum(result.get("numberRecordsProcessed", 0) for result in finished)
+    failed = sum(result.get("numberRecordsFailed", 0) for result in finished)
+    completed = sum(result.get("state") == "JobComplete" for result in finished)
+    print(
+        f"{completed} of {len(finished)} jobs complete: {processed} records processed, {failed} failed",
+        file=stderr,
+    )
+    return finished
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+import asyncio
+from contextlib import asynccontextmanager
+from math import floor
+from sys import stderr
+from typing import Optional
+
+
+class AIMDController:
+    """
+    Limits the number of requests in flight using additive increase, multiplicative decrease (AIMD).
+
+    The limit grows by `increase` after a full window of healthy requests, i.e. one request per slot of the
+    current limit, and is multiplied by `decrease` whenever the org or the network pushes back with a
+    throttling response or a timeout. Requests started before the last decrease cannot trigger another one, so a
+    burst of throttled responses only cuts the limit once. A request is healthy while its latency stays within `latency_tolerance`
+    times the fastest latency seen so far. Every change to the limit is printed to stderr.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        increase: int = 1,
+        decrease: float = 0.5,
+        latency_tolerance: float = 3.0,
+        verbose: bool = True,
+    ):
+        if not 1 <= minimum <= maximum:
+            raise ValueError(
+                f"The concurrency bounds must satisfy 1 <= minimum <= maximum, got {minimum} and {maximum}"
+            )
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = min(max(initial, minimum), maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.verbose = verbose
+        self.in_flight = 0
+        self.baseline_latency: Optional[float] = None
+        self._healthy_in_window = 0
+        self._epoch = 0
+        # Created on first use so the controller can be built outside of the event loop that uses it.
+        self._condition: Optional[asyncio.Condition] = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _set_limit(self, limit: int, reason: str):
+        limit = min(max(limit, self.minimum), self.maximum)
+        if limit != self.limit:
+            if self.verbose:
+                print(f"Concurrency {self.limit} -> {limit}: {reason}", file=stderr)
+            self.limit = limit
+        self._healthy_in_window = 0
+
+    async def _notify(self):
+        condition = self._get_condition()
+        async with condition:
+            condition.notify(max(self.limit - self.in_flight, 0))
+
+    async def acquire(self) -> int:
+        """
+        Waits until fewer requests than the current limit are in flight and takes a slot, which has to be given
+        back with release.
+
+        :return: The epoch the request started in, to be passed back to record_backoff.
+        """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+            return self._epoch
+
+    async def release(self):
+        self.in_flight -= 1
+        await self._notify()
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Waits until fewer requests than the current limit are in flight, and holds a slot until the block exits.
+        Yields the epoch the request started in, to be passed back to record_backoff.
+        """
+        epoch = await self.acquire()
+        try:
+            yield epoch
+        finally:
+            await self.release()
+
+    async def record_success(self, latency: Optional[float] = None):
+        """
+        Records a request that completed without being throttled.
+
+        :param latency: The time to first byte of the request in seconds, if known.
+        """
+        if latency is not None:
+            if self.baseline_latency is None or latency < self.baseline_latency:
+                self.baseline_latency = latency
+            if latency > self.baseline_latency * self.latency_tolerance:
+                # Slow responses are an early sign of congestion, so hold the limit where it is.
+                return
+
+        self._healthy_in_window += 1
+        if self._healthy_in_window >= self.limit:
+            self._set_limit(
+                self.limit + self.increase,
+                f"{self._healthy_in_window} healthy requests",
+            )
+            await self._notify()
+
+    async def record_backoff(self, reason: str, epoch: Optional[int] = None):
+        """
+        Records a throttled or timed out request, cutting the limit multiplicatively.
+
+        :param epoch: The epoch yielded by slot when the request started. The limit is left alone when it has
+            already been cut since then.
+        """
+        if epoch is not None and epoch < self._epoch:
+            return
+        self._epoch += 1
+        self._set_limit(floor(self.limit * self.decrease), reason)
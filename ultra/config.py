@@ -7,3 +7,7 @@ ULTRALOADER_CREDENTIAL_DIRECTORY = environ.get(
 ULTRALOADER_CREDENTIAL_FILE_PATH = environ.get(
     "ULTRALOADER_CREDENTIAL_FILE_PATH", f"{ULTRALOADER_CREDENTIAL_DIRECTORY}/creds.json"
 )
+ULTRALOADER_WATERMARK_FILE_PATH = environ.get(
+    "ULTRALOADER_WATERMARK_FILE_PATH",
+    f"{ULTRALOADER_CREDENTIAL_DIRECTORY}/watermarks.json",
+)
@@ -1,6 +1,10 @@
 import io
-from typing import List, Dict, Optional, Union
+import os
+import sys
+import zlib
+from typing import Iterable, Iterator, List, Dict, NamedTuple, Optional, Tuple, Union
 from pathlib import Path
+import httpx
 from pydantic import BaseModel
 
 
@@ -8,6 +12,95 @@ class TaskResult(BaseModel):
     status: str
     message: Optional[str]
     payload: Union[List, Dict, str]
+    record_counts: Optional[List[int]]
+
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("SFDC_UPLOAD_CHUNK_SIZE", 1048576))
+
+
+class FileChunks:
+    """
+    Reads a file in chunks of at most chunk_size bytes. The file is opened again each time the object is
+    iterated, so a request using it as content can be sent more than once.
+    """
+
+    def __init__(self, file_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+
+    def __iter__(self) -> Iterator[bytes]:
+        with open(self.file_path, "rb") as file_in:
+            while True:
+                chunk = file_in.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def size(self) -> int:
+        return os.path.getsize(self.file_path)
+
+
+class GzipChunks:
+    """
+    Gzip compresses an iterable of bytes chunk by chunk, keeping count of the bytes read and written. Like
+    FileChunks it can be iterated more than once, as long as the content it wraps can.
+    """
+
+    def __init__(self, content: Iterable[bytes], level: int = 6):
+        self.content = content
+        self.level = level
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in self.content:
+            self.raw_bytes += len(chunk)
+            compressed = compressor.compress(chunk)
+            if compressed:
+                self.compressed_bytes += len(compressed)
+                yield compressed
+        compressed = compressor.flush()
+        self.compressed_bytes += len(compressed)
+        yield compressed
+
+
+def is_replayable(content) -> bool:
+    """
+    :return: Whether content can be iterated more than once, so a request sending it can be sent again. Bytes,
+        lists, FileChunks and GzipChunks of those can, generators and other iterators cannot.
+    """
+    if isinstance(content, (bytes, bytearray, str, list, tuple, FileChunks)):
+        return True
+    if isinstance(content, GzipChunks):
+        return is_replayable(content.content)
+    return False
+
+
+def request_is_replayable(request: httpx.Request) -> bool:
+    """
+    :return: Whether the body of request can be sent again, after it was sent once.
+    """
+    if isinstance(request.stream, httpx.ByteStream):
+        return True
+    # httpx wraps iterable content in a stream which keeps the iterable it was given as _stream.
+    return is_replayable(getattr(request.stream, "_stream", None))
+
+
+def write_atomic(file_path: Union[str, Path], text: str):
+    """
+    Writes text to file_path through a temporary file next to it, which then replaces the file. A process killed
+    part way through leaves the previous contents, and processes writing the same file at once each write their
+    own temporary file.
+    """
+    path = Path(file_path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(temporary_path, "w") as file_out:
+        file_out.write(text)
+    os.replace(temporary_path, path)
 
 
 def get_target_files(path_or_file: str, pattern: str) -> List[str]:
@@ -28,27 +121,251 @@ def get_target_files(path_or_file: str, pattern: str) -> List[str]:
         )
 
 
-def combine_file_in_buffers(
-    files: List[str], file_size_limit: int = 90000000, output_buffer: io.StringIO = None
-) -> io.StringIO:
+COMBINE_BLOCK_SIZE = int(os.getenv("SFDC_COMBINE_BLOCK_SIZE", 4194304))
+
+
+class CsvChunk(NamedTuple):
+    """
+    A chunk of combined csv. The buffer holds the header followed by record_count complete records.
+    """
+
+    buffer: io.BytesIO
+    record_count: int
+
+
+# Every byte other than a quote or a newline, see count_records.
+NOT_QUOTE_OR_NEWLINE = bytes(byte for byte in range(256) if byte not in b'"\n')
+
+
+def count_records(
+    data: Union[bytes, bytearray], start: int, end: int, in_quotes: bool = False
+) -> Tuple[int, bool]:
+    """
+    Counts the newlines in data[start:end] that end a record, i.e. are not inside a quoted field.
+
+    Only the order of quotes and newlines matters for that, so everything else is deleted first. Removing two
+    adjacent quotes never changes whether a newline has an odd number of quotes before it, so every "" is
+    dropped too, leaving quotes only around the rare newlines inside a field.
+
+    :param in_quotes: Whether data[start] is inside a quoted field.
+
+    :return: The number of records ended in the range, and whether data[end] is inside a quoted field.
+    """
+    if data.find(b'"', start, end) == -1:
+        return (0 if in_quotes else data.count(b"\n", start, end)), in_quotes
+
+    reduced = (
+        bytes(memoryview(data)[start:end])
+        .translate(None, NOT_QUOTE_OR_NEWLINE)
+        .replace(b'""', b"")
+    )
+    parts = reduced.split(b'"')
+    outside = parts[1::2] if in_quotes else parts[0::2]
+    return sum(part.count(b"\n") for part in outside), in_quotes ^ (len(parts) % 2 == 0)
+
+
+def _first_record_end(
+    data: Union[bytes, bytearray], start: int, end: int, in_quotes: bool = False
+) -> int:
+    """
+    :return: The position just after the first newline in data[start:end] that ends a record, or start if none do.
+    """
+    newline = data.find(b"\n", start, end)
+    while newline != -1:
+        if not in_quotes ^ (data.count(b'"', start, newline) % 2 == 1):
+            return newline + 1
+        newline = data.find(b"\n", newline + 1, end)
+    return start
+
+
+def _last_record_end(
+    data: Union[bytes, bytearray], start: int, end: int, in_quotes: bool = False
+) -> int:
+    """
+    :param in_quotes: Whether data[end] is inside a quoted field.
+
+    :return: The position just after the last newline in data[start:end] that ends a record, or start if none do.
+    """
+    newline = data.rfind(b"\n", start, end)
+    while newline != -1:
+        if not in_quotes ^ (data.count(b'"', newline, end) % 2 == 1):
+            return newline + 1
+        newline = data.rfind(b"\n", start, newline)
+    return start
+
+
+def _nth_record_end(data: Union[bytes, bytearray], start: int, end: int, n: int) -> int:
+    """
+    :return: The position just after the nth record starting at data[start], or end if there are fewer.
+    """
+    position = start
+    in_quotes = False
+    while n > 0:
+        newline = data.find(b"\n", position, end)
+        if newline == -1:
+            return end
+        in_quotes ^= data.count(b'"', position, newline) % 2 == 1
+        if not in_quotes:
+            n -= 1
+        position = newline + 1
+    return position
+
+
+class _ChunkWriter:
+    """
+    Copies complete records into the output buffer and yields a CsvChunk whenever the next record would take
+    the chunk past file_size_limit bytes or max_records records. A record longer than the limit gets a chunk
+    to itself.
+    """
+
+    def __init__(
+        self,
+        output_buffer: io.BytesIO,
+        file_size_limit: int,
+        max_records: Optional[int],
+    ):
+        self.output_buffer = output_buffer
+        self.file_size_limit = file_size_limit
+        self.max_records = max_records
+        self.header = b""
+        self.record_count = 0
+
+    def flush(self) -> Iterator[CsvChunk]:
+        self.output_buffer.seek(0)
+        # yield out the file chunk.
+        yield CsvChunk(buffer=self.output_buffer, record_count=self.record_count)
+        self.output_buffer.seek(0)
+        self.output_buffer.truncate(0)
+        self.record_count = 0
+
+    def write(
+        self, data: Union[bytes, bytearray], start: int, end: int, count: int
+    ) -> Iterator[CsvChunk]:
+        """
+        Writes the count records in data[start:end], which must start and end on a record boundary.
+        """
+        records = memoryview(data)
+        while start < end:
+            if self.output_buffer.tell() == 0:
+                self.output_buffer.write(self.header)
+            space = self.file_size_limit - self.output_buffer.tell()
+            record_space = (
+                None
+                if self.max_records is None
+                else self.max_records - self.record_count
+            )
+            if end - start <= space and (record_space is None or count <= record_space):
+                self.output_buffer.write(records[start:end])
+                self.record_count += count
+                return
+
+            # Cut at the last record end that keeps the chunk within both limits.
+            limit = min(start + space, end)
+            cut = _last_record_end(
+                data, start, limit, data.count(b'"', start, limit) % 2 == 1
+            )
+            if record_space is not None and record_space < count:
+                cut = min(cut, _nth_record_end(data, start, end, record_space))
+
+            if cut <= start:
+                if self.record_count > 0:
+                    yield from self.flush()
+                    continue
+                cut = _nth_record_end(data, start, end, 1)
+
+            taken = count if cut == end else count_records(data, start, cut)[0]
+            self.output_buffer.write(records[start:cut])
+            self.record_count += taken
+            count -= taken
+            start = cut
+            yield from self.flush()
+
+
+def split_csv_files(
+    files: List[str],
+    file_size_limit: int = 90000000,
+    max_records: Optional[int] = None,
+    output_buffer: io.BytesIO = None,
+    block_size: int = COMBINE_BLOCK_SIZE,
+) -> Iterator[CsvChunk]:
+    """
+    Combines csv files into chunks of at most file_size_limit bytes and max_records records, each starting with
+    the header of the file it begins in. The files are read in binary blocks of block_size bytes and copied to
+    the chunk a block at a time. Chunks are only cut on record boundaries, so a quoted field containing newlines
+    is never split across two chunks.
+
+    The same buffer is yielded for every chunk and is cleared once the consumer asks for the next one.
+    """
     if output_buffer is None:
-        output_buffer = io.StringIO()
+        output_buffer = io.BytesIO()
+    writer = _ChunkWriter(
+        output_buffer=output_buffer,
+        file_size_limit=file_size_limit,
+        max_records=max_records,
+    )
 
+    block = bytearray(block_size)
+    view = memoryview(block)
     for file_path in files:
-        with open(file_path, newline="", errors="ignore") as input_csv:
+        with open(file_path, "rb") as input_csv:
             header = input_csv.readline()
-            for line in input_csv:
-                if output_buffer.tell() == 0:
-                    output_buffer.write(header)
-                output_buffer.write(bytes(line, "utf-8").decode("utf-8", "ignore"))
-                if output_buffer.tell() > file_size_limit:
-                    output_buffer.seek(0)
-                    # yield out the file chunk.
-                    yield output_buffer
-                    output_buffer.seek(0)
-                    output_buffer.truncate(0)
-    output_buffer.seek(0)
-    yield output_buffer
+            if not header:
+                continue
+            if not header.endswith(b"\n"):
+                header += b"\n"
+            writer.header = header
+
+            # The start of a record cut off by the end of the previous block.
+            carry = b""
+            in_quotes = False
+            while True:
+                read = input_csv.readinto(block)
+                if read == 0:
+                    break
+
+                count, quoted_end = count_records(block, 0, read, in_quotes)
+                if count == 0:
+                    carry += view[:read]
+                    in_quotes = quoted_end
+                    continue
+
+                start = 0
+                if carry:
+                    start = _first_record_end(block, 0, read, in_quotes)
+                    record = carry + view[:start]
+                    yield from writer.write(record, 0, len(record), 1)
+                    count -= 1
+                end = _last_record_end(block, start, read, quoted_end)
+                yield from writer.write(block, start, end, count)
+                carry = bytes(view[end:read])
+                in_quotes = quoted_end
+
+            if carry:
+                carry += b"\n"
+                yield from writer.write(carry, 0, len(carry), 1)
+
+    if output_buffer.tell() > 0:
+        yield from writer.flush()
+
+
+def combine_file_in_buffers(
+    files: List[str],
+    file_size_limit: int = 90000000,
+    output_buffer: io.BytesIO = None,
+    max_records: Optional[int] = None,
+    block_size: int = COMBINE_BLOCK_SIZE,
+) -> Iterator[io.BytesIO]:
+    """
+    Combines csv files into chunks, as split_csv_files does, yielding only the buffer of each chunk.
+    """
+    for chunk in split_csv_files(
+        files=files,
+        file_size_limit=file_size_limit,
+        max_records=max_records,
+        output_buffer=output_buffer,
+        block_size=block_size,
+    ):
+        yield chunk.buffer
 
 
 def combine_files(
@@ -57,24 +374,35 @@ def combine_files(
     output_directory: str,
     file_name: str = "batch",
     file_size_limit: int = 90000000,
+    max_records: Optional[int] = None,
 ) -> TaskResult:
     """
-    Combines files matching a glob pattern to be loaded in larger batches.
+    Combines files matching a glob pattern to be loaded in larger batches. The payload of the result lists the
+    batch files written, and record_counts the number of records in each of them.
     """
     file_list = get_target_files(path_or_file, pattern)
     out_path = Path(output_directory).expanduser()
     if not out_path.exists() or out_path.is_file():
         out_path.mkdir(parents=True, exist_ok=True)
 
-    result = TaskResult(status="failed", payload=[])
+    result = TaskResult(status="failed", payload=[], record_counts=[])
     try:
         for count, file in enumerate(
-            combine_file_in_buffers(files=file_list, file_size_limit=file_size_limit)
+            split_csv_files(
+                files=file_list,
+                file_size_limit=file_size_limit,
+                max_records=max_records,
+            )
         ):
-            print(Path(out_path, f"{file_name}_{count}.csv"))
-            with open(Path(out_path, f"{file_name}_{count}.csv"), "w") as out:
-                out.write(file.read())
+            print(
+                f"{Path(out_path, f'{file_name}_{count}.csv')}: {file.record_count} records",
+                file=sys.stderr,
+            )
+            with open(Path(out_path, f"{file_name}_{count}.csv"), "wb") as out:
+                with file.buffer.getbuffer() as chunk:
+                    out.write(chunk)
                 result.payload.append(str(Path(out_path, f"{file_name}_{count}.csv")))
+                result.record_counts.append(file.record_count)
         result.status = "success"
     except Exception as e:
         result.message = str(e)
@@ -0,0 +1,384 @@
+import random
+import sys
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+FIRST_NAMES = (
+    "James Mary Robert Patricia John Jennifer Michael Linda David Elizabeth William Barbara Richard Susan Joseph "
+    "Jessica Thomas Sarah Charles Karen Christopher Lisa Daniel Nancy Matthew Betty Anthony Sandra Mark Margaret "
+    "Donald Ashley Steven Kimberly Andrew Emily Paul Donna Joshua Michelle Kenneth Carol Kevin Amanda Brian Melissa "
+    "George Deborah Timothy Stephanie Ronald Rebecca Jason Sharon Edward Laura Jeffrey Cynthia Ryan Amy Jacob "
+    "Kathleen Gary Angela Nicholas Shirley Eric Brenda Jonathan Emma Stephen Anna Larry Pamela Justin Nicole Scott "
+    "Samantha Brandon Katherine Benjamin Christine Samuel Helen Gregory Debra Alexander Rachel Patrick Carolyn Frank "
+    "Janet Raymond Maria Jack Olivia Dennis Heather Jerry Diane Tyler Julie Aaron Joyce Jose Victoria Adam Ruth"
+).split()
+
+LAST_NAMES = (
+    "Smith Johnson Williams Brown Jones Garcia Miller Davis Rodriguez Martinez Hernandez Lopez Gonzalez Wilson "
+    "Anderson Thomas Taylor Moore Jackson Martin Lee Perez Thompson White Harris Sanchez Clark Ramirez Lewis "
+    "Robinson Walker Young Allen King Wright Scott Torres Nguyen Hill Flores Green Adams Nelson Baker Hall Rivera "
+    "Campbell Mitchell Carter Roberts Gomez Phillips Evans Turner Diaz Parker Cruz Edwards Collins Reyes Stewart "
+    "Morris Morales Murphy Cook Rogers Gutierrez Ortiz Morgan Cooper Peterson Bailey Reed Kelly Howard Ramos Kim "
+    "Cox Ward Richardson Watson Brooks Chavez Wood James Bennett Gray Mendoza Ruiz Hughes Price Alvarez Castillo "
+    "Sanders Patel Myers Long Ross Foster Jimenez"
+).split()
+
+# Names with characters outside ASCII, from two to four bytes each in UTF-8, mixed in by multibyte_rate.
+MULTIBYTE_FIRST_NAMES = (
+    "José Zoë Renée Björn Søren Łukasz Çağrı Dvořák Ærin Jürgen Ólafur Ἀλέξανδρος Дмитрий Анна 陽翔 さくら 민준 "
+    "محمد Ngọc 😀Sunny"
+).split()
+
+MULTIBYTE_LAST_NAMES = (
+    "Müller Nuñez Öztürk Gonçalves Śliwińska Kovačević Þórsson Ålund Παπαδόπουλος Иванов 山田 佐藤 김 "
+    "عبدالله Nguyễn Strauß Ferrò Dupré Lindqvist🚀"
+).split()
+
+COMPANY_WORDS = (
+    "Acme Apex Blue Bright Cedar Copper Crest Delta Eagle Echo Evergreen Falcon Frontier Global Granite Harbor "
+    "Horizon Iron Keystone Lakeside Liberty Lumen Maple Meridian Metro Nova Oak Pacific Peak Pioneer Prime Quantum "
+    "Redwood River Silver Summit Sterling Stone Titan Union Vertex Vista Willow Zenith"
+).split()
+
+COMPANY_SUFFIXES = (
+    "Inc. LLC Corp. Group Holdings Partners Systems Labs Industries Solutions Logistics Foods Energy Health "
+    "Capital Media Works"
+).split()
+
+STREET_NAMES = (
+    "Main Oak Pine Maple Cedar Elm Washington Lake Hill Park View Sunset Lincoln Church Highland Ridge Spring "
+    "Walnut Willow Jackson Franklin River Meadow Forest Center Mill Chestnut Adams Madison"
+).split()
+
+STREET_SUFFIXES = "St Ave Blvd Rd Ln Dr Ct Way Pl Ter".split()
+
+CITIES = (
+    "Springfield Riverside Franklin Greenville Bristol Clinton Fairview Salem Madison Georgetown Arlington Ashland "
+    "Burlington Manchester Milton Oxford Clayton Dayton Lexington Winchester Jackson Hudson Auburn Dover Kingston "
+    "Newport Marion Centerville Shelbyville Oakland"
+).split()
+
+STATES = (
+    "AL AK AZ AR CA CO CT DE FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO MT NE NV NH NJ NM NY NC ND OH OK "
+    "OR PA RI SC SD TN TX UT VT VA WA WV WI WY"
+).split()
+
+INDUSTRIES = (
+    "Agriculture Apparel Banking Biotechnology Chemicals Communications Construction Consulting Education "
+    "Electronics Energy Engineering Entertainment Finance Government Healthcare Hospitality Insurance Machinery "
+    "Manufacturing Media Retail Shipping Technology Telecommunications Transportation Utilities"
+).split()
+
+LEAD_SOURCES = ("Web", "Phone Inquiry", "Partner Referral", "Purchased List", "Other")
+
+DESCRIPTIONS = (
+    "Met at the regional trade show and asked for a follow up call.",
+    "Interested in the enterprise plan, budget approved for next quarter.",
+    "Downloaded the whitepaper, no contact made yet.",
+    'Prefers email, said "call after 3pm" in the last conversation.',
+    "Existing customer of a partner, referred for the analytics add-on.",
+    "Requested pricing for 250 seats, comparing against two competitors.",
+    "Left a voicemail, waiting to hear back.",
+    "Renewal due in six months, consider upsell to premium support.",
+)
+
+MULTIBYTE_DESCRIPTIONS = (
+    "Réunion prévue à Zürich — confirmer l’heure.",
+    "Kunde möchte ein Angebot für Größe XL.",
+    "お問い合わせありがとうございます。来週連絡します。",
+    "Клиент запросил демонстрацию продукта.",
+    "고객이 가격 견적을 요청했습니다 ✅",
+    "Cliente satisfeito, enviar pesquisa de satisfação 😊",
+)
+
+EMAIL_DOMAINS = ("example.com", "example.org", "example.net", "mail.example.com")
+
+
+class Column(NamedTuple):
+    """
+    A field of a generated object, made by a function that returns a batch of values at once.
+    """
+
+    name: str
+    make: Callable[["BatchContext"], List[str]]
+
+
+class BatchContext:
+    """
+    The random state and shared columns of one batch. The names, streets and so on are drawn a whole column at a
+    time, which is much faster than building records one by one.
+    """
+
+    def __init__(
+        self,
+        rng: random.Random,
+        start: int,
+        rows: int,
+        multibyte_rate: float,
+        newline_rate: float,
+    ):
+        self.rng = rng
+        self.start = start
+        self.rows = rows
+        self.multibyte_rate = multibyte_rate
+        self.newline_rate = newline_rate
+        self._cache: Dict[str, List[str]] = {}
+
+    def choices(self, values, multibyte_values=None) -> List[str]:
+        picked = self.rng.choices(values, k=self.rows)
+        if multibyte_values and self.multibyte_rate:
+            for index in self.sample(self.multibyte_rate):
+                picked[index] = self.rng.choice(multibyte_values)
+        return picked
+
+    def sample(self, rate: float) -> List[int]:
+        """
+        :return: The indexes of about rate of the rows.
+        """
+        count = min(int(self.rows * rate + self.rng.random()), self.rows)
+        return self.rng.sample(range(self.rows), count)
+
+    def digits(self, low: int, high: int) -> List[str]:
+        return [str(value) for value in self.rng.choices(range(low, high), k=self.rows)]
+
+    def shared(self, key: str, make: Callable[[], List[str]]) -> List[str]:
+        """
+        A column used by several fields, such as the first name also used in the email, made once per batch.
+        """
+        if key not in self._cache:
+            self._cache[key] = make()
+        return self._cache[key]
+
+
+def _first_names(context: BatchContext) -> List[str]:
+    return context.shared(
+        "first", lambda: context.choices(FIRST_NAMES, MULTIBYTE_FIRST_NAMES)
+    )
+
+
+def _last_names(context: BatchContext) -> List[str]:
+    return context.shared(
+        "last", lambda: context.choices(LAST_NAMES, MULTIBYTE_LAST_NAMES)
+    )
+
+
+def _emails(context: BatchContext) -> List[str]:
+    # The row number keeps every email unique across the whole file, and ASCII even for multibyte names.
+    domains = context.choices(EMAIL_DOMAINS)
+    return [
+        f"user{context.start + index}@{domain}" for index, domain in enumerate(domains)
+    ]
+
+
+def _companies(context: BatchContext) -> List[str]:
+    return context.shared(
+        "company",
+        lambda: [
+            f"{first} {second} {suffix}"
+            for first, second, suffix in zip(
+                context.choices(COMPANY_WORDS),
+                context.choices(COMPANY_WORDS),
+                context.choices(COMPANY_SUFFIXES),
+            )
+        ],
+    )
+
+
+def _streets(context: BatchContext) -> List[str]:
+    return [
+        f"{number} {name} {suffix}"
+        for number, name, suffix in zip(
+            context.digits(1, 10000),
+            context.choices(STREET_NAMES),
+            context.choices(STREET_SUFFIXES),
+        )
+    ]
+
+
+def _phones(context: BatchContext) -> List[str]:
+    return [
+        f"{area}-{exchange}-{line:0>4}"
+        for area, exchange, line in zip(
+            context.digits(200, 1000),
+            context.digits(200, 1000),
+            context.digits(0, 10000),
+        )
+    ]
+
+
+def _postal_codes(context: BatchContext) -> List[str]:
+    return [f"{code:0>5}" for code in context.digits(501, 99951)]
+
+
+def _descriptions(context: BatchContext) -> List[str]:
+    descriptions = context.choices(DESCRIPTIONS, MULTIBYTE_DESCRIPTIONS)
+    if context.newline_rate:
+        for index in context.sample(context.newline_rate):
+            descriptions[index] = "\n".join(
+                (descriptions[index], context.rng.choice(DESCRIPTIONS))
+            )
+    return descriptions
+
+
+def _cities(context: BatchContext) -> List[str]:
+    return context.choices(CITIES)
+
+
+def _states(context: BatchContext) -> List[str]:
+    return context.choices(STATES)
+
+
+OBJECT_COLUMNS: Dict[str, Tuple[Column, ...]] = {
+    "Lead": (
+        Column("FirstName", _first_names),
+        Column("LastName", _last_names),
+        Column("Email", _emails),
+        Column("Company", _companies),
+        Column("Street", _streets),
+        Column("City", _cities),
+        Column("State", _states),
+        Column("PostalCode", _postal_codes),
+        Column("Phone", _phones),
+        Column("LeadSource", lambda context: context.choices(LEAD_SOURCES)),
+        Column("Description", _descriptions),
+    ),
+    "Contact": (
+        Column("FirstName", _first_names),
+        Column("LastName", _last_names),
+        Column("Email", _emails),
+        Column("Phone", _phones),
+        Column("MailingStreet", _streets),
+        Column("MailingCity", _cities),
+        Column("MailingState", _states),
+        Column("MailingPostalCode", _postal_codes),
+        Column("Description", _descriptions),
+    ),
+    "Account": (
+        Column("Name", _companies),
+        Column("Industry", lambda context: context.choices(INDUSTRIES)),
+        Column("BillingStreet", _streets),
+        Column("BillingCity", _cities),
+        Column("BillingState", _states),
+        Column("BillingPostalCode", _postal_codes),
+        Column("Phone", _phones),
+        Column("NumberOfEmployees", lambda context: context.digits(1, 100000)),
+        Column("Description", _descriptions),
+    ),
+}
+
+
+class BatchSpec(NamedTuple):
+    object_name: str
+    seed: int
+    index: int
+    start: int
+    rows: int
+    multibyte_rate: float
+    newline_rate: float
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def csv_header(object_name: str) -> bytes:
+    return (
+        ",".join(_quote(column.name) for column in OBJECT_COLUMNS[object_name]) + "\n"
+    ).encode()
+
+
+def generate_batch(spec: BatchSpec) -> bytes:
+    """
+    Generates the csv records of one batch, without a header. The records only depend on the seed, the object and
+    the batch's index, so the same file is generated whatever the number of processes.
+    """
+    context = BatchContext(
+        rng=random.Random(f"{spec.seed}:{spec.object_name}:{spec.index}"),
+        start=spec.start,
+        rows=spec.rows,
+        multibyte_rate=spec.multibyte_rate,
+        newline_rate=spec.newline_rate,
+    )
+    columns = [
+        [_quote(value) for value in column.make(context)]
+        for column in OBJECT_COLUMNS[spec.object_name]
+    ]
+    return "".join(",".join(row) + "\n" for row in zip(*columns)).encode()
+
+
+def batch_specs(
+    object_name: str,
+    rows: int,
+    seed: int,
+    batch_size: int,
+    multibyte_rate: float = 0.0,
+    newline_rate: float = 0.0,
+) -> Iterator[BatchSpec]:
+    for index, start in enumerate(range(0, rows, batch_size)):
+        yield BatchSpec(
+            object_name=object_name,
+            seed=seed,
+            index=index,
+            start=start,
+            rows=min(batch_size, rows - start),
+            multibyte_rate=multibyte_rate,
+            newline_rate=newline_rate,
+        )
+
+
+def generate_csv(
+    out: BinaryIO,
+    object_name: str,
+    rows: int,
+    seed: int = 0,
+    batch_size: int = 50_000,
+    processes: int = None,
+    multibyte_rate: float = 0.0,
+    newline_rate: float = 0.0,
+) -> int:
+    """
+    Streams a csv of rows synthetic records of a Lead, Contact or Account to out, generating the batches in a pool
+    of processes. Only a few batches per process are held in memory at once, so any number of rows can be
+    generated.
+
+    :param multibyte_rate: The fraction of names and descriptions drawn from text outside ASCII.
+
+    :param newline_rate: The fraction of descriptions with a newline inside the quoted value.
+
+    :return: The bytes written.
+    """
+    if object_name not in OBJECT_COLUMNS:
+        raise ValueError(
+            f"Unknown object {object_name}, use one of {', '.join(OBJECT_COLUMNS)}"
+        )
+    if processes is None:
+        processes = cpu_count()
+    specs = batch_specs(
+        object_name, rows, seed, batch_size, multibyte_rate, newline_rate
+    )
+    written = out.write(csv_header(object_name))
+    if processes <= 1:
+        for spec in specs:
+            written += out.write(generate_batch(spec))
+        return written
+
+    with Pool(processes=processes) as pool:
+        window = processes * 2
+        while True:
+            batch_window = list(islice(specs, window))
+            if not batch_window:
+                break
+            for batch in pool.imap(generate_batch, batch_window):
+                written += out.write(batch)
+    return written
+
+
+def generate_to_path(output: str, **options) -> int:
+    """
+    Runs generate_csv into the file at output, or to stdout when output is "-".
+    """
+    if output == "-":
+        return generate_csv(sys.stdout.buffer, **options)
+    with open(output, "wb") as csv_out:
+        return generate_csv(csv_out, **options)
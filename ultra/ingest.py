@@ -1,6 +1,7 @@
 import typer
 import json
-from ultra import bulk2
+from ultra.progress import RunProgress
+from ultra.session import BulkSession
 
 ingest_app = typer.Typer()
 
@@ -18,12 +19,13 @@ def create_ingest_job(
         help="The API version to use when creating the job.",
     ),
 ):
-    bulk_ingest = bulk2.create_ingest_job(
-        object_name=object_name,
-        operation=operation,
-        external_id_field_name=external_id_field_name,
-        version=version,
-    )
+    with BulkSession() as session:
+        bulk_ingest = session.create_ingest_job(
+            object_name=object_name,
+            operation=operation,
+            external_id_field_name=external_id_field_name,
+            version=version,
+        )
     print(json.dumps(obj=bulk_ingest, indent=2))
 
 
@@ -52,17 +54,55 @@ def load(
         None,
         help="The directory to use while shifting files.",
     ),
+    max_concurrent_jobs: int = typer.Option(
+        4,
+        help="The number of batch files uploaded to their own jobs at the same time. Keep it below the org's "
+        "concurrent Bulk job limit.",
+    ),
+    pipeline: bool = typer.Option(
+        False,
+        help="Upload each combined batch from memory while the next one is combined, instead of writing the "
+        "batches to the working directory first.",
+    ),
+    max_records: int = typer.Option(
+        None,
+        help="The most records loaded by a single ingest job, batches are split to stay within it.",
+    ),
+    compress: bool = typer.Option(
+        False,
+        help="Gzip compress each batch as it is uploaded and report the bytes saved.",
+    ),
+    wait: bool = typer.Option(
+        False,
+        help="Wait for every job to finish and download its successful, failed and unprocessed records.",
+    ),
+    results_path: str = typer.Option(
+        "./results",
+        help="The directory the result files are downloaded to when waiting for the jobs.",
+    ),
 ):
-    bulk_ingest = bulk2.ingest_job_data_batches(
-        object_name=object_name,
-        operation=operation,
-        path_or_file=path_or_file,
-        pattern=pattern,
-        batch_size=batch_size,
-        working_directory=working_directory,
-        external_id_field_name=external_id_field_name,
-        version=version,
-    )
+    with BulkSession() as session:
+        with RunProgress("Loading"):
+            bulk_ingest = session.ingest_job_data_batches(
+                object_name=object_name,
+                operation=operation,
+                path_or_file=path_or_file,
+                pattern=pattern,
+                batch_size=batch_size,
+                working_directory=working_directory,
+                external_id_field_name=external_id_field_name,
+                version=version,
+                max_concurrent_jobs=max_concurrent_jobs,
+                pipeline=pipeline,
+                max_records=max_records,
+                compress=compress,
+            )
+        if wait:
+            bulk_ingest = session.wait_for_ingest_jobs(
+                ingest_job_results=bulk_ingest,
+                version=version,
+                download_path=results_path,
+            )
     print(json.dumps(obj=bulk_ingest, indent=2))
 
 
@@ -74,11 +114,17 @@ def load_ingest_job_data(
         "53.0",
         help="The API version to use when creating the job.",
     ),
+    compress: bool = typer.Option(
+        False,
+        help="Gzip compress the file as it is uploaded.",
+    ),
 ):
-    print(
-        bulk2.load_ingest_job_data(
-            job_id=job_id,
-            file_path=file_path,
-            version=version,
+    with BulkSession() as session:
+        print(
+            session.load_ingest_job_data(
+                job_id=job_id,
+                file_path=file_path,
+                version=version,
+                compress=compress,
+            )
         )
-    )
@@ -0,0 +1,233 @@
+import os
+import re
+import threading
+import time
+from sys import stderr
+from typing import Dict, Optional
+
+import httpx
+
+from ultra.sfjwt import CredentialModel, SalesforceAuth
+
+# The Bulk 2.0 allocations from /limits reported at the end of a run.
+REPORTED_LIMITS = (
+    "DailyBulkV2QueryJobs",
+    "DailyBulkV2QueryFileStorageMB",
+    "DailyBulkApiBatches",
+)
+
+# The Bulk 2.0 allocations a job of each kind uses, checked before the job is created, with how much of each
+# one job takes. The file storage a query job will use is not known up front.
+JOB_LIMITS = {
+    "query": {"DailyBulkV2QueryJobs": 1, "DailyBulkV2QueryFileStorageMB": 0},
+    "ingest": {"DailyBulkApiBatches": 1},
+}
+
+TRACKED_LIMITS = sorted(
+    {*REPORTED_LIMITS, *(name for limits in JOB_LIMITS.values() for name in limits)}
+)
+
+API_USAGE = re.compile(r"api-usage=(\d+)/(\d+)")
+
+API_VERSION = re.compile(r"/services/data/v(\d+\.\d+)/")
+
+# The API version /limits is read with until the run's version is known.
+DEFAULT_API_VERSION = "53.0"
+
+
+class LimitsMonitor:
+    """
+    Tracks how much of the org's daily API allocation is left, from the Sforce-Limit-Info header of every
+    response and from the /limits resource, and holds requests back when a run gets close to using it up.
+
+    With a reserve, the fraction of the daily API requests to leave for other integrations, requests are slowed
+    down once less than twice the reserve is left, by up to slow_delay seconds each as the reserve gets closer.
+    Once no more than the reserve is left, requests are paused, and /limits is checked again every
+    pause_interval seconds until requests are available again.
+
+    The Bulk 2.0 allocations in JOB_LIMITS are read from /limits during the run, at most every refresh_interval
+    seconds, and checked by check_job before every job is created. A job that would leave less than the reserve
+    of one of them, or go over it without a reserve, is not created. The allocations are counted over a rolling
+    day, so waiting for them would stall the run for hours.
+
+    /limits is read with the API version the run uses: the version given to attach, or else the version of the
+    first request observed.
+    """
+
+    def __init__(
+        self,
+        reserve: float = float(os.getenv("SFDC_API_RESERVE", 0)),
+        slow_delay: float = 1.0,
+        pause_interval: float = 60.0,
+        version: str = None,
+        refresh_interval: float = 60.0,
+    ):
+        self.reserve = reserve
+        self.slow_delay = slow_delay
+        self.pause_interval = pause_interval
+        self.version = version
+        self.refresh_interval = refresh_interval
+        self.allocations: Dict[str, Dict[str, int]] = {}
+        self._limits_read_at: Optional[float] = None
+        self.api_used: Optional[int] = None
+        self.api_max: Optional[int] = None
+        self.first_api_used: Optional[int] = None
+        self.credentials: Optional[CredentialModel] = None
+        self._lock = threading.Lock()
+
+    def attach(self, credentials: CredentialModel, version: str = None):
+        """
+        Gives the monitor the credentials to read /limits with, the first credentials attached are kept, and the
+        API version to read it with, if given.
+        """
+        if self.credentials is None:
+            self.credentials = credentials
+        if version is not None:
+            self.version = version
+
+    def fetch_limits(self) -> Optional[Dict]:
+        if self.credentials is None:
+            return None
+        # A plain client, a monitored one would wait on the monitor while it is paused.
+        with httpx.Client(
+            base_url=self.credentials.instance_url,
+            auth=SalesforceAuth(self.credentials),
+            timeout=httpx.Timeout(
+                self.credentials.client_timeout,
+                connect=self.credentials.client_connect_timeout,
+            ),
+        ) as client:
+            try:
+                data = client.get(
+                    f"services/data/v{self.version or DEFAULT_API_VERSION}/limits"
+                )
+            except httpx.HTTPError as e:
+                print(f"Could not read the org's limits: {e}", file=stderr)
+                return None
+        if data.status_code != 200:
+            print(f"Could not read the org's limits: {data.text}", file=stderr)
+            return None
+        limits = data.json()
+        with self._lock:
+            self._limits_read_at = time.monotonic()
+            for name in TRACKED_LIMITS:
+                limit = limits.get(name, {})
+                if "Remaining" in limit and "Max" in limit:
+                    self.allocations[name] = {
+                        "Remaining": limit["Remaining"],
+                        "Max": limit["Max"],
+                    }
+        api_requests = limits.get("DailyApiRequests", {})
+        if "Max" in api_requests and "Remaining" in api_requests:
+            self._record(
+                api_requests["Max"] - api_requests["Remaining"], api_requests["Max"]
+            )
+        return limits
+
+    def _record(self, used: int, maximum: int):
+        with self._lock:
+            if self.first_api_used is None:
+                self.first_api_used = used
+            self.api_used = used
+            self.api_max = maximum
+
+    def observe(self, response: httpx.Response, request: httpx.Request = None):
+        """
+        Records the API usage from the Sforce-Limit-Info header of a response, and the API version of its
+        request when no version is set yet.
+        """
+        match = API_USAGE.search(response.headers.get("Sforce-Limit-Info", ""))
+        if match:
+            self._record(int(match.group(1)), int(match.group(2)))
+        if self.version is None and request is not None:
+            version = API_VERSION.search(request.url.path)
+            if version:
+                self.version = version.group(1)
+
+    def remaining_fraction(self) -> Optional[float]:
+        if self.api_used is None or not self.api_max:
+            return None
+        return max(self.api_max - self.api_used, 0) / self.api_max
+
+    def delay(self) -> float:
+        """
+        :return: How long the next request should wait, pause_interval when the run should pause.
+        """
+        remaining = self.remaining_fraction()
+        if self.reserve <= 0 or remaining is None or remaining >= 2 * self.reserve:
+            return 0.0
+        if remaining <= self.reserve:
+            return self.pause_interval
+        return self.slow_delay * (2 * self.reserve - remaining) / self.reserve
+
+    def check_job(self, kind: str) -> Optional[str]:
+        """
+        Checks the Bulk 2.0 allocations a job of kind, "query" or "ingest", uses before it is created, reading
+        /limits first when the last read is older than refresh_interval, and counts the job against them.
+
+        :return: Why the job should not be created, or None if it can be.
+        """
+        if self.credentials is None:
+            return None
+        if (
+            self._limits_read_at is None
+            or time.monotonic() - self._limits_read_at >= self.refresh_interval
+        ):
+            self.fetch_limits()
+        with self._lock:
+            job_limits = JOB_LIMITS.get(kind, {})
+            for name, cost in job_limits.items():
+                limit = self.allocations.get(name)
+                if limit is None:
+                    continue
+                if limit["Remaining"] - max(cost, 1) < self.reserve * limit["Max"]:
+                    return (
+                        f"{name}: {limit['Remaining']} of {limit['Max']} left today, not creating the {kind} "
+                        f"job as it would go over the reserve of {self.reserve:.0%}"
+                    )
+            for name, cost in job_limits.items():
+                if name in self.allocations:
+                    self.allocations[name]["Remaining"] -= cost
+        return None
+
+    def wait(self):
+        """
+        Waits before a request is sent for as long as delay asks for, checking /limits again while paused.
+        """
+        delay = self.delay()
+        while delay >= self.pause_interval:
+            print(
+                f"{self.api_max - self.api_used} of {self.api_max} daily API requests left, within the reserve of "
+                f"{self.reserve:.0%}. Pausing for {self.pause_interval:.0f}s",
+                file=stderr,
+            )
+            time.sleep(self.pause_interval)
+            self.fetch_limits()
+            delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    def report(self):
+        """
+        Prints the API requests the run used and the Bulk 2.0 allocations left to stderr. Nothing is printed when
+        the run made no requests.
+        """
+        if self.api_used is None:
+            return
+        limits = self.fetch_limits() or {}
+        print(
+            f"API requests: {self.api_used - self.first_api_used} used by this run, "
+            f"{self.api_max - self.api_used} of {self.api_max} left today",
+            file=stderr,
+        )
+        for name in REPORTED_LIMITS:
+            limit = limits.get(name, {})
+            if "Remaining" in limit and "Max" in limit:
+                print(
+                    f"{name}: {limit['Remaining']} of {limit['Max']} left",
+                    file=stderr,
+                )
+
+
+# The monitor of every client in this process.
+default_monitor = LimitsMonitor()
@@ -0,0 +1,317 @@
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from ultra.file_operations import write_atomic
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RequestMetric(BaseModel):
+    """
+    An HTTP call, timed until its response headers arrived, across every retry of it.
+    """
+
+    method: str
+    path: str
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    elapsed: float
+    retries: int = 0
+    request_bytes: Optional[int] = None
+
+
+class BatchMetric(BaseModel):
+    """
+    A batch of results downloaded, or a batch file uploaded to an ingest job.
+
+    :param bytes: The bytes of csv written or read.
+
+    :param bytes_transferred: The bytes sent over the network for them, fewer when compressed.
+
+    :param queue_wait: The seconds the batch waited for a free slot before it was started.
+    """
+
+    kind: str
+    job_id: Optional[str] = None
+    name: Optional[str] = None
+    status: str
+    records: Optional[int] = None
+    bytes: Optional[int] = None
+    bytes_transferred: Optional[int] = None
+    elapsed: Optional[float] = None
+    time_to_first_byte: Optional[float] = None
+    queue_wait: Optional[float] = None
+    retries: int = 0
+
+    @classmethod
+    def from_query_batch(cls, batch: BaseModel) -> "BatchMetric":
+        return cls(
+            kind="query",
+            job_id=batch.job_id,
+            name=batch.file_name or f"{batch.job_id}_{batch.batch_start:012d}.csv",
+            status=batch.status,
+            records=batch.record_count,
+            bytes=batch.file_size,
+            bytes_transferred=(
+                batch.bytes_transferred
+                if batch.bytes_transferred is not None
+                else batch.file_size
+            ),
+            elapsed=batch.elapsed,
+            time_to_first_byte=batch.time_to_first_byte,
+            queue_wait=batch.queue_wait,
+            retries=max(batch.attempt_count - 1, 0) + batch.retry_count,
+        )
+
+    @classmethod
+    def from_ingest_result(cls, result: Dict) -> "BatchMetric":
+        return cls(
+            kind="ingest",
+            job_id=result.get("id"),
+            name=result.get("file_path"),
+            status=result.get("state"),
+            records=result.get("record_count"),
+            bytes=result.get("raw_bytes"),
+            bytes_transferred=result.get("transferred_bytes"),
+            elapsed=result.get("elapsed"),
+            queue_wait=result.get("queue_wait"),
+            retries=result.get("retry_count", 0),
+        )
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    """
+    :return: The quantile of the values, interpolated between the two closest ranks.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * quantile
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[Optional[float]]) -> Optional[Dict]:
+    """
+    :return: The count, sum, p50, p95, p99 and max of the values that are set, or None if none are.
+    """
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    summary = {"count": len(values), "sum": sum(values)}
+    for quantile in QUANTILES:
+        summary[f"p{quantile * 100:g}"] = percentile(values, quantile)
+    summary["max"] = max(values)
+    return summary
+
+
+def _megabytes_per_second(byte_count: int, seconds: float) -> Optional[float]:
+    return byte_count / 1_000_000 / seconds if seconds > 0 else None
+
+
+class MetricsRecorder:
+    """
+    Collects the timings of a run: every HTTP call made through a retry transport, and every batch downloaded or
+    uploaded. It is safe to share between threads. Batches downloaded in worker processes are recorded by the
+    process that gathers them, the HTTP calls those workers make are not recorded.
+
+    Running totals of the batches finished are kept alongside, with the records and batches the run expects to
+    process as they become known, and every listener is called after each change, to show progress.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._started = perf_counter()
+        self.requests: List[RequestMetric] = []
+        self.batches: List[BatchMetric] = []
+        self.records_done = 0
+        self.bytes_done = 0
+        self.retries = 0
+        self.expected_records: Optional[int] = None
+        self.expected_batches: Optional[int] = None
+        self.listeners: List[Callable[["MetricsRecorder"], None]] = []
+        self._lock = threading.Lock()
+
+    def _notify(self):
+        for listener in list(self.listeners):
+            listener(self)
+
+    def expect(self, records: int = None, batches: int = None):
+        """
+        Adds to the records and batches the run is expected to process, as each job's size becomes known.
+        """
+        with self._lock:
+            if records is not None:
+                self.expected_records = (self.expected_records or 0) + records
+            if batches is not None:
+                self.expected_batches = (self.expected_batches or 0) + batches
+        self._notify()
+
+    def record_request(
+        self,
+        request: httpx.Request,
+        elapsed: float,
+        retries: int,
+        response: httpx.Response = None,
+        error: Exception = None,
+    ):
+        content_length = request.headers.get("Content-Length")
+        metric = RequestMetric(
+            method=request.method,
+            path=request.url.path,
+            status_code=response.status_code if response is not None else None,
+            error=type(error).__name__ if error is not None else None,
+            elapsed=elapsed,
+            retries=retries,
+            request_bytes=int(content_length) if content_length else None,
+        )
+        with self._lock:
+            self.requests.append(metric)
+
+    def record_batch(self, metric: BatchMetric):
+        with self._lock:
+            self.batches.append(metric)
+            self.records_done += metric.records or 0
+            self.bytes_done += metric.bytes or 0
+            self.retries += metric.retries
+        self._notify()
+
+    def report(self) -> Dict:
+        """
+        :return: The run's totals, the distribution of batch and request timings, and every batch.
+        """
+        wall_time = perf_counter() - self._started
+        with self._lock:
+            batches = list(self.batches)
+            requests = list(self.requests)
+
+        byte_count = sum(batch.bytes or 0 for batch in batches)
+        transferred = sum(batch.bytes_transferred or 0 for batch in batches)
+        records = sum(batch.records or 0 for batch in batches)
+        return {
+            "started_at": self.started_at.isoformat(),
+            "wall_time": wall_time,
+            "totals": {
+                "batches": len(batches),
+                "failed_batches": sum(
+                    batch.status in ("FAILED", "Failed", "Aborted") for batch in batches
+                ),
+                "records": records,
+                "bytes": byte_count,
+                "bytes_transferred": transferred,
+                "retries": sum(batch.retries for batch in batches),
+                "mb_per_second": _megabytes_per_second(byte_count, wall_time),
+                "transferred_mb_per_second": _megabytes_per_second(
+                    transferred, wall_time
+                ),
+                "records_per_second": records / wall_time if wall_time > 0 else None,
+            },
+            "batch_seconds": summarize([batch.elapsed for batch in batches]),
+            "batch_time_to_first_byte_seconds": summarize(
+                [batch.time_to_first_byte for batch in batches]
+            ),
+            "batch_queue_wait_seconds": summarize(
+                [batch.queue_wait for batch in batches]
+            ),
+            "batch_mb_per_second": summarize(
+                [
+                    _megabytes_per_second(batch.bytes_transferred, batch.elapsed)
+                    for batch in batches
+                    if batch.bytes_transferred is not None and batch.elapsed
+                ]
+            ),
+            "requests": {
+                "count": len(requests),
+                "retries": sum(request.retries for request in requests),
+                "status_codes": dict(
+                    Counter(
+                        str(request.status_code or request.error)
+                        for request in requests
+                    )
+                ),
+                "seconds": summarize([request.elapsed for request in requests]),
+            },
+            "batches": [batch.dict() for batch in batches],
+        }
+
+
+def write_json_report(report: Dict, file_path: str):
+    write_atomic(file_path, json.dumps(report, indent=2))
+
+
+def write_prometheus_textfile(
+    report: Dict, file_path: str, prefix: str = "ultraloader"
+):
+    """
+    Writes the report's totals and timing distributions in the Prometheus text format, for the node exporter's
+    textfile collector. The file is replaced in one step so the collector never reads half of it.
+    """
+    lines = []
+
+    def gauge(name: str, value: Optional[float], description: str):
+        if value is None:
+            return
+        lines.extend(
+            [
+                f"# HELP {prefix}_{name} {description}",
+                f"# TYPE {prefix}_{name} gauge",
+                f"{prefix}_{name} {value}",
+            ]
+        )
+
+    def summary(name: str, values: Optional[Dict], description: str):
+        if values is None:
+            return
+        lines.extend(
+            [
+                f"# HELP {prefix}_{name} {description}",
+                f"# TYPE {prefix}_{name} summary",
+            ]
+        )
+        for quantile in QUANTILES:
+            lines.append(
+                f'{prefix}_{name}{{quantile="{quantile}"}} {values[f"p{quantile * 100:g}"]}'
+            )
+        lines.append(f"{prefix}_{name}_sum {values['sum']}")
+        lines.append(f"{prefix}_{name}_count {values['count']}")
+
+    totals = report["totals"]
+    gauge("run_seconds", report["wall_time"], "Wall time of the run.")
+    gauge("batches", totals["batches"], "Batches downloaded or uploaded.")
+    gauge("failed_batches", totals["failed_batches"], "Batches that failed.")
+    gauge("records", totals["records"], "Records downloaded or uploaded.")
+    gauge("bytes", totals["bytes"], "Bytes of csv written or read.")
+    gauge(
+        "bytes_transferred",
+        totals["bytes_transferred"],
+        "Bytes sent over the network for the batches.",
+    )
+    gauge("batch_retries", totals["retries"], "Retried batch requests.")
+    gauge("mb_per_second", totals["mb_per_second"], "Megabytes of csv per second.")
+    summary("batch_seconds", report["batch_seconds"], "Wall time of each batch.")
+    summary(
+        "batch_time_to_first_byte_seconds",
+        report["batch_time_to_first_byte_seconds"],
+        "Time to the first byte of each batch.",
+    )
+    summary(
+        "batch_queue_wait_seconds",
+        report["batch_queue_wait_seconds"],
+        "Time each batch waited to start.",
+    )
+    summary(
+        "request_seconds",
+        report["requests"]["seconds"],
+        "Time to the response headers of each HTTP call, across retries.",
+    )
+    write_atomic(file_path, "\n".join(lines) + "\n")
+
+
+# The recorder of every client and batch in this process.
+default_recorder = MetricsRecorder()
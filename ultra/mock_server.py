@@ -0,0 +1,431 @@
+import asyncio
+import base64
+import json
+import random
+import re
+import uuid
+import zlib
+from datetime import datetime, timezone
+from time import monotonic
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+from ultra import soql
+from ultra.file_operations import count_records
+
+# The size of the pieces result pages are generated and streamed in.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# The records per page of the REST query endpoint.
+QUERY_PAGE_SIZE = 2000
+
+# The queries the REST query endpoint answers, reading the Ids of the synthetic records in order.
+ID_QUERY = re.compile(
+    r"^\s*SELECT\s+Id\s+FROM\s+\w+(\s+WHERE\s+Id\s*!=\s*null)?\s+ORDER\s+BY\s+Id(\s+ASC|\s+DESC)?"
+    r"(\s+LIMIT\s+\d+)?\s*$",
+    re.IGNORECASE,
+)
+
+
+class MockServerOptions(BaseModel):
+    """
+    How the mock server behaves.
+
+    :param latency: Seconds added before every response.
+
+    :param bandwidth: Bytes per second shared by every result download, and separately by every upload. None is
+        unlimited.
+
+    :param error_rate: The fraction of job requests answered with one of error_status_codes instead.
+
+    :param records: The records every query job returns, fewer if the query has a lower LIMIT.
+
+    :param record_size: The approximate bytes of csv per record.
+
+    :param page_size: The records per results page when the request sets no maxRecords.
+
+    :param processing_seconds: How long a job stays InProgress after it is created or its upload completes.
+
+    :param seed: Seeds the error injection, so a run can be repeated.
+    """
+
+    latency: float = 0.0
+    bandwidth: Optional[int] = None
+    error_rate: float = 0.0
+    error_status_codes: Tuple[int, ...] = (429, 503)
+    records: int = 100_000
+    record_size: int = 200
+    page_size: int = 50_000
+    processing_seconds: float = 0.0
+    seed: Optional[int] = None
+    api_request_limit: int = 100_000
+
+
+class Pacer:
+    """
+    Spaces out bytes so that together they flow no faster than bytes_per_second.
+    """
+
+    def __init__(self, bytes_per_second: Optional[int]):
+        self.bytes_per_second = bytes_per_second
+        self._next = 0.0
+
+    async def consume(self, byte_count: int):
+        if not self.bytes_per_second:
+            return
+        now = monotonic()
+        start = max(now, self._next)
+        self._next = start + byte_count / self.bytes_per_second
+        await asyncio.sleep(self._next - now)
+
+
+def encode_locator(offset: int) -> str:
+    return base64.b64encode(str(offset).encode()).decode()
+
+
+def decode_locator(locator: Optional[str]) -> int:
+    return int(base64.b64decode(locator).decode()) if locator else 0
+
+
+async def synthetic_rows(
+    start: int, stop: int, record_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Yields the csv of the records from start to stop, each padded to about record_size bytes, with the header
+    ahead of the first record. A record only depends on its offset, so a page is the same every time it is read.
+    """
+    padding = b"x" * max(record_size - 56, 0)
+    row = b'"00Q%012dAAA","Synthetic Record %012d","' + padding + b'"\n'
+    rows_per_chunk = max(STREAM_CHUNK_SIZE // max(record_size, 1), 1)
+    if start == 0:
+        yield b'"Id","Name","Description"\n'
+    for chunk_start in range(start, stop, rows_per_chunk):
+        chunk_stop = min(chunk_start + rows_per_chunk, stop)
+        yield b"".join(row % (index, index) for index in range(chunk_start, chunk_stop))
+
+
+def synthetic_id(index: int) -> str:
+    """
+    The Id of the synthetic record at index, as in synthetic_rows.
+    """
+    return "00Q%012dAAA" % index
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+
+
+def _error(status_code: int, error_code: str, message: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code, content=[{"errorCode": error_code, "message": message}]
+    )
+
+
+def create_app(options: MockServerOptions = None) -> FastAPI:
+    """
+    Builds a stand-in for the parts of the Bulk API 2.0 ultra uses, holding its jobs in memory: creating and
+    polling query jobs, reading their results a page at a time with locators, creating ingest jobs, uploading
+    their data, closing them and reading their result files, /limits, and the REST query endpoint for the Ids
+    of the records in order.
+
+    Every query job returns synthetic records, and every response carries the Sforce-Limit-Info header. Any
+    bearer token is accepted.
+    """
+    if options is None:
+        options = MockServerOptions()
+    app = FastAPI(title="ultra mock Bulk API 2.0")
+    jobs: Dict[str, Dict] = {}
+    ready_at: Dict[str, float] = {}
+    errors = random.Random(options.seed)
+    download_pacer = Pacer(options.bandwidth)
+    upload_pacer = Pacer(options.bandwidth)
+    usage = {"api_requests": 0}
+    cursors: Dict[str, Tuple[int, bool]] = {}
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        usage["api_requests"] += 1
+        if options.latency:
+            await asyncio.sleep(options.latency)
+        if (
+            "/jobs/" in request.url.path
+            and options.error_rate
+            and errors.random() < options.error_rate
+        ):
+            status_code = errors.choice(options.error_status_codes)
+            response = _error(
+                status_code,
+                (
+                    "REQUEST_LIMIT_EXCEEDED"
+                    if status_code == 429
+                    else "SERVER_UNAVAILABLE"
+                ),
+                "Injected by the mock server",
+            )
+        else:
+            response = await call_next(request)
+        response.headers["Sforce-Limit-Info"] = (
+            f"api-usage={usage['api_requests']}/{options.api_request_limit}"
+        )
+        return response
+
+    def job_state(job_id: str) -> Optional[Dict]:
+        job = jobs.get(job_id)
+        if job is not None and job["state"] in ("UploadComplete", "InProgress"):
+            job["state"] = (
+                "JobComplete" if monotonic() >= ready_at[job_id] else "InProgress"
+            )
+        return job
+
+    @app.get("/services/data/v{version}/limits")
+    async def limits(version: str):
+        query_jobs = sum(job["jobType"] == "V2Query" for job in jobs.values())
+        ingest_jobs = len(jobs) - query_jobs
+        return {
+            "DailyApiRequests": {
+                "Max": options.api_request_limit,
+                "Remaining": options.api_request_limit - usage["api_requests"],
+            },
+            "DailyBulkV2QueryJobs": {"Max": 10_000, "Remaining": 10_000 - query_jobs},
+            "DailyBulkV2QueryFileStorageMB": {"Max": 1_000_000, "Remaining": 1_000_000},
+            "DailyBulkApiBatches": {"Max": 15_000, "Remaining": 15_000 - ingest_jobs},
+        }
+
+    def query_page(version: str, cursor: str, offset: int) -> Dict:
+        total, descending = cursors[cursor]
+        stop = min(offset + QUERY_PAGE_SIZE, total)
+        indexes = range(offset, stop)
+        if descending:
+            indexes = (options.records - 1 - index for index in indexes)
+        page = {
+            "totalSize": total,
+            "done": stop >= total,
+            "records": [
+                {"attributes": {"type": "Record"}, "Id": synthetic_id(index)}
+                for index in indexes
+            ],
+        }
+        if stop < total:
+            page["nextRecordsUrl"] = f"/services/data/v{version}/query/{cursor}-{stop}"
+        return page
+
+    @app.get("/services/data/v{version}/query")
+    @app.get("/services/data/v{version}/queryAll")
+    async def rest_query(version: str, q: str):
+        if not ID_QUERY.match(q):
+            return _error(
+                400, "MALFORMED_QUERY", "The mock server only reads Ids ordered by Id"
+            )
+        total = options.records
+        limit = soql.get_limit(q)
+        if limit is not None:
+            total = min(total, limit)
+        cursor = "01g" + uuid.uuid4().hex[:15]
+        cursors[cursor] = (total, bool(re.search(r"\bDESC\b", q, re.IGNORECASE)))
+        return query_page(version, cursor, 0)
+
+    @app.get("/services/data/v{version}/query/{locator}")
+    async def rest_query_more(version: str, locator: str):
+        cursor, _, offset = locator.partition("-")
+        if cursor not in cursors or not offset.isdigit():
+            return _error(404, "INVALID_QUERY_LOCATOR", f"Locator {locator} not found")
+        return query_page(version, cursor, int(offset))
+
+    @app.post("/services/data/v{version}/jobs/query")
+    async def create_query_job(version: str, request: Request):
+        body = await request.json()
+        query = body.get("query", "")
+        try:
+            object_name = soql.get_object_name(query)
+        except ValueError as e:
+            return _error(400, "INVALIDJOB", str(e))
+        record_count = options.records
+        limit = soql.get_limit(query)
+        if limit is not None:
+            record_count = min(record_count, limit)
+        job_id = "750" + uuid.uuid4().hex[:15]
+        jobs[job_id] = {
+            "id": job_id,
+            "operation": body.get("operation", "query"),
+            "object": object_name,
+            "createdDate": _now(),
+            "state": "UploadComplete",
+            "concurrencyMode": "Parallel",
+            "contentType": "CSV",
+            "apiVersion": float(version),
+            "jobType": "V2Query",
+            "lineEnding": "LF",
+            "columnDelimiter": "COMMA",
+            "numberRecordsProcessed": record_count,
+        }
+        ready_at[job_id] = monotonic() + options.processing_seconds
+        return {
+            key: value
+            for key, value in jobs[job_id].items()
+            if key != "numberRecordsProcessed"
+        }
+
+    @app.get("/services/data/v{version}/jobs/query/{job_id}")
+    async def get_query_job(version: str, job_id: str):
+        job = job_state(job_id)
+        if job is None:
+            return _error(404, "NOT_FOUND", f"Job {job_id} not found")
+        return job
+
+    @app.get("/services/data/v{version}/jobs/query/{job_id}/results")
+    async def get_query_results(
+        version: str,
+        job_id: str,
+        request: Request,
+        locator: Optional[str] = None,
+        maxRecords: Optional[int] = None,
+    ):
+        job = job_state(job_id)
+        if job is None:
+            return _error(404, "NOT_FOUND", f"Job {job_id} not found")
+        if job["state"] != "JobComplete":
+            return _error(400, "INVALIDJOBSTATE", f"Job {job_id} is {job['state']}")
+        record_count = job["numberRecordsProcessed"]
+        start = decode_locator(locator)
+        stop = min(start + (maxRecords or options.page_size), record_count)
+        next_locator = encode_locator(stop) if stop < record_count else "null"
+        gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+
+        async def body() -> AsyncIterator[bytes]:
+            compressor = zlib.compressobj(wbits=31) if gzip else None
+            async for chunk in synthetic_rows(start, stop, options.record_size):
+                if compressor is not None:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    await download_pacer.consume(len(chunk))
+                    yield chunk
+            if compressor is not None:
+                yield compressor.flush()
+
+        headers = {
+            "Sforce-Locator": next_locator,
+            "Sforce-NumberOfRecords": str(max(stop - start, 0)),
+        }
+        if gzip:
+            headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(body(), media_type="text/csv", headers=headers)
+
+    @app.post("/services/data/v{version}/jobs/ingest")
+    async def create_ingest_job(version: str, request: Request):
+        body = await request.json()
+        job_id = "750" + uuid.uuid4().hex[:15]
+        jobs[job_id] = {
+            "id": job_id,
+            "operation": body.get("operation"),
+            "object": body.get("object"),
+            "externalIdFieldName": body.get("externalIdFieldName"),
+            "createdDate": _now(),
+            "state": "Open",
+            "concurrencyMode": "Parallel",
+            "contentType": "CSV",
+            "apiVersion": float(version),
+            "jobType": "V2Ingest",
+            "lineEnding": "LF",
+            "columnDelimiter": "COMMA",
+            "contentUrl": f"services/data/v{version}/jobs/ingest/{job_id}/batches",
+            "numberRecordsProcessed": 0,
+            "numberRecordsFailed": 0,
+        }
+        return jobs[job_id]
+
+    @app.put("/services/data/v{version}/jobs/ingest/{job_id}/batches")
+    async def upload_ingest_data(version: str, job_id: str, request: Request):
+        job = jobs.get(job_id)
+        if job is None:
+            return _error(404, "NOT_FOUND", f"Job {job_id} not found")
+        if job["state"] != "Open":
+            return _error(400, "INVALIDJOBSTATE", f"Job {job_id} is {job['state']}")
+        decompressor = (
+            zlib.decompressobj(wbits=31)
+            if request.headers.get("Content-Encoding") == "gzip"
+            else None
+        )
+        lines = 0
+        in_quotes = False
+        # The body is read as it is sent, and counted rather than kept. Newlines inside quoted fields do not end
+        # a record, and a quoted field may span chunks.
+        async for chunk in request.stream():
+            await upload_pacer.consume(len(chunk))
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            records, in_quotes = count_records(chunk, 0, len(chunk), in_quotes)
+            lines += records
+        job["numberRecordsProcessed"] = max(lines - 1, 0)
+        return Response(status_code=201)
+
+    @app.patch("/services/data/v{version}/jobs/ingest/{job_id}")
+    async def close_ingest_job(version: str, job_id: str, request: Request):
+        job = jobs.get(job_id)
+        if job is None:
+            return _error(404, "NOT_FOUND", f"Job {job_id} not found")
+        state = (await request.json()).get("state")
+        if state == "UploadComplete":
+            ready_at[job_id] = monotonic() + options.processing_seconds
+        job["state"] = state
+        return job
+
+    @app.get("/services/data/v{version}/jobs/ingest/{job_id}")
+    async def get_ingest_job(version: str, job_id: str):
+        job = job_state(job_id)
+        if job is None:
+            return _error(404, "NOT_FOUND", f"Job {job_id} not found")
+        return job
+
+    # Salesforce serves the result files with and without a trailing slash, the client asks with one.
+    @app.get("/services/data/v{version}/jobs/ingest/{job_id}/{result_file}/")
+    @app.get("/services/data/v{version}/jobs/ingest/{job_id}/{result_file}")
+    async def get_ingest_results(version: str, job_id: str, result_file: str):
+        job = jobs.get(job_id)
+        if job is None:
+            return _error(404, "NOT_FOUND", f"Job {job_id} not found")
+        if result_file == "successfulResults":
+            rows = "".join(
+                f'"750{index:015d}","true"\n'
+                for index in range(job["numberRecordsProcessed"])
+            )
+            content = '"sf__Id","sf__Created"\n' + rows
+        elif result_file == "failedResults":
+            content = '"sf__Id","sf__Error"\n'
+        elif result_file == "unprocessedrecords":
+            content = "\n"
+        else:
+            return _error(404, "NOT_FOUND", f"Unknown result {result_file}")
+        return Response(content=content, media_type="text/csv")
+
+    return app
+
+
+def write_mock_credentials(file_path: str, instance_url: str):
+    """
+    Writes a credential file pointing ultra at a mock server, use it by setting ULTRALOADER_CREDENTIAL_FILE_PATH.
+    """
+    with open(file_path, "w") as credentials_out:
+        json.dump(
+            {
+                "username": "mock@example.com",
+                "consumer_id": "mock",
+                "environment": "sandbox",
+                "instance_url": instance_url,
+                "token": "mock",
+            },
+            credentials_out,
+            indent=2,
+        )
+
+
+def serve(options: MockServerOptions, host: str = "127.0.0.1", port: int = 8000):
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError(
+            "Running the mock server requires the uvicorn package, install it with: pip install ultra[mock]"
+        )
+    uvicorn.run(create_app(options), host=host, port=port, log_level="warning")
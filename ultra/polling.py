@@ -0,0 +1,88 @@
+import asyncio
+import random
+from sys import stderr
+from typing import AsyncIterator, Dict, Iterator, List, Tuple
+
+import httpx
+from pydantic import BaseModel
+
+# Job states after which a Bulk 2.0 job no longer changes.
+TERMINAL_STATES = ("JobComplete", "Failed", "Aborted")
+
+
+class PollBackoff(BaseModel):
+    """
+    How long to wait between job status checks. The wait starts at `initial` seconds and is multiplied by
+    `multiplier` after every check that finds the job still running, up to `maximum` seconds. Each wait is
+    moved by up to `jitter` times itself in either direction, so jobs started together are not all checked
+    at the same moment.
+    """
+
+    initial: float = 1.0
+    maximum: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.2
+
+    def delays(self) -> Iterator[float]:
+        delay = self.initial
+        while True:
+            yield delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            delay = min(delay * self.multiplier, self.maximum)
+
+
+async def a_get_job(
+    async_client: httpx.AsyncClient, job_id: str, kind: str, version: str
+) -> Dict:
+    """
+    Fetches the status of a job.
+
+    :param kind: The kind of job, "query" or "ingest", which selects the endpoint the job is read from.
+    """
+    data = await async_client.get(f"services/data/v{version}/jobs/{kind}/{job_id}")
+    if data.status_code != 200:
+        print(data.content.decode(), file=stderr)
+    return data.json()
+
+
+async def a_wait_for_job(
+    async_client: httpx.AsyncClient,
+    job_id: str,
+    kind: str,
+    version: str,
+    backoff: PollBackoff = None,
+) -> Dict:
+    """
+    Polls a job until it reaches one of the TERMINAL_STATES, waiting longer between each check.
+
+    :return: The last status read for the job.
+    """
+    if backoff is None:
+        backoff = PollBackoff()
+    for delay in backoff.delays():
+        job = await a_get_job(async_client, job_id=job_id, kind=kind, version=version)
+        if not isinstance(job, dict) or job.get("state") in TERMINAL_STATES:
+            return job
+        await asyncio.sleep(delay)
+
+
+async def a_watch_jobs(
+    async_client: httpx.AsyncClient,
+    job_ids: List[str],
+    kind: str,
+    version: str,
+    backoff: PollBackoff = None,
+) -> AsyncIterator[Tuple[str, Dict]]:
+    """
+    Polls several jobs at once over the same client, each on its own backoff.
+
+    :return: The id and last status read of each job, yielded as soon as that job finishes.
+    """
+
+    async def wait(job_id: str) -> Tuple[str, Dict]:
+        job = await a_wait_for_job(
+            async_client, job_id=job_id, kind=kind, version=version, backoff=backoff
+        )
+        return job_id, job
+
+    for finished in asyncio.as_completed([wait(job_id) for job_id in job_ids]):
+        yield await finished
@@ -0,0 +1,92 @@
+import sys
+from time import perf_counter
+
+from rich.console import Console
+from rich.progress import BarColumn, Progress, TextColumn, TimeRemainingColumn
+
+from ultra.metrics import MetricsRecorder, default_recorder
+
+
+class RunProgress:
+    """
+    Shows how far a command is through the batches it downloads or uploads, on stderr: the records done out of
+    those expected, batches done, records and MB per second, retries so far and the time left. It is updated by
+    the MetricsRecorder as each batch finishes, and the bar only fills once the size of a job is known.
+
+    Nothing is drawn unless stdout and stderr are terminals, so output piped to a file or another program is
+    left as it was.
+    """
+
+    def __init__(
+        self,
+        description: str,
+        recorder: MetricsRecorder = None,
+        enabled: bool = None,
+        console: Console = None,
+    ):
+        self.recorder = recorder if recorder is not None else default_recorder
+        if enabled is None:
+            enabled = sys.stdout.isatty() and sys.stderr.isatty()
+        self.progress = Progress(
+            TextColumn("[bold]{task.description}"),
+            BarColumn(),
+            TextColumn("{task.completed:,.0f}/{task.fields[expected]} records"),
+            TextColumn("{task.fields[batches]}"),
+            TextColumn("{task.fields[records_per_second]} records/s"),
+            TextColumn("{task.fields[mb_per_second]} MB/s"),
+            TextColumn("{task.fields[retries]} retries"),
+            TimeRemainingColumn(),
+            console=console if console is not None else Console(stderr=True),
+            redirect_stdout=False,
+            disable=not enabled,
+        )
+        # The task is started once the records expected are known, until then the bar pulses.
+        self.task = self.progress.add_task(
+            description,
+            start=False,
+            total=1,
+            expected="?",
+            batches="0 batches",
+            records_per_second="0",
+            mb_per_second="0.0",
+            retries=0,
+        )
+        self._task_started = False
+        self._started = perf_counter()
+
+    def update(self, recorder: MetricsRecorder):
+        elapsed = max(perf_counter() - self._started, 1e-9)
+        if recorder.expected_records is not None and not self._task_started:
+            self._task_started = True
+            self.progress.start_task(self.task)
+        batches_done = len(recorder.batches)
+        self.progress.update(
+            self.task,
+            total=max(recorder.expected_records or 0, recorder.records_done, 1),
+            completed=recorder.records_done,
+            expected=(
+                f"{recorder.expected_records:,}"
+                if recorder.expected_records is not None
+                else "?"
+            ),
+            batches=(
+                f"{batches_done}/{recorder.expected_batches} batches"
+                if recorder.expected_batches is not None
+                else f"{batches_done} batches"
+            ),
+            records_per_second=f"{recorder.records_done / elapsed:,.0f}",
+            mb_per_second=f"{recorder.bytes_done / 1_000_000 / elapsed:.1f}",
+            retries=recorder.retries,
+        )
+
+    def __enter__(self) -> "RunProgress":
+        self._started = perf_counter()
+        self.recorder.listeners.append(self.update)
+        self.update(self.recorder)
+        self.progress.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.listeners.remove(self.update)
+        self.update(self.recorder)
+        self.progress.stop()
@@ -3,8 +3,14 @@ import sys
 import typer
 import json
 from ultra import bulk2
-from sys import stdout
-from time import sleep
+from ultra.concurrency import AIMDController
+from ultra.polling import PollBackoff
+from ultra.progress import RunProgress
+from ultra import soql
+from ultra.session import BulkSession
+from ultra.watermarks import WatermarkStore, incremental_query
+from datetime import timedelta
+from sys import stdout, stderr
 
 query_app = typer.Typer()
 
@@ -32,15 +38,11 @@ def create_job(
         help="The API version to use when creating the job.",
     ),
 ):
-    print(
-        json.dumps(
-            obj=bulk2.create_query_job(
-                query=query, version=version, operation=operation
-            ),
-            indent=2,
-        ),
-        file=stdout,
-    )
+    with BulkSession() as session:
+        query_job = session.create_query_job(
+            query=query, version=version, operation=operation
+        )
+    print(json.dumps(obj=query_job, indent=2), file=stdout)
 
 
 @query_app.command()
@@ -62,18 +64,74 @@ def download_data(
         False,
         help="Should the download be simulated rather than downloaded.",
     ),
+    resume: bool = typer.Option(
+        False,
+        help="Keep the batches a previous download of this job already finished, and only download the rest.",
+    ),
+    chunk_size: int = typer.Option(
+        bulk2.DOWNLOAD_CHUNK_SIZE,
+        help="The largest number of bytes held in memory per batch while streaming results to disk.",
+    ),
+    parallel_offsets: bool = typer.Option(
+        False,
+        help="Split the results into offset based batches and download them in parallel instead of following the "
+        "Sforce-Locator header page by page.",
+    ),
+    max_connections: int = typer.Option(
+        100,
+        help="The maximum number of open connections per download worker.",
+    ),
+    max_keepalive_connections: int = typer.Option(
+        20,
+        help="The maximum number of idle connections each download worker keeps open for reuse.",
+    ),
+    http2: bool = typer.Option(
+        False,
+        help="Multiplex result downloads over HTTP/2, requires the h2 package.",
+    ),
+    initial_concurrency: int = typer.Option(
+        4,
+        help="The number of result requests in flight when a parallel offset download starts.",
+    ),
+    min_concurrency: int = typer.Option(
+        1,
+        help="The fewest result requests kept in flight when backing off from throttling.",
+    ),
+    max_concurrency: int = typer.Option(
+        32,
+        help="The most result requests allowed in flight while downloads stay healthy.",
+    ),
+    compress: bool = typer.Option(
+        False,
+        help="Request the results gzip compressed, decompress them off the event loop and report the bytes "
+        "saved. Without it the results are requested uncompressed.",
+    ),
 ):
 
-    print(
-        bulk2.download_query_data(
+    with BulkSession(
+        pool_options=bulk2.ClientPoolOptions(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            http2=http2,
+        )
+    ) as session, RunProgress("Downloading"):
+        completed_job = session.download_query_data(
             job_id=job_id,
             version=version,
             download_path=download_path,
             batch_size=batch_size,
             dry_run=download_dry_run,
-        ),
-        file=sys.stdout,
-    )
+            resume=resume,
+            chunk_size=chunk_size,
+            parallel_offsets=parallel_offsets,
+            compress=compress,
+            controller=AIMDController(
+                initial=initial_concurrency,
+                minimum=min_concurrency,
+                maximum=max_concurrency,
+            ),
+        )
+    print(completed_job, file=sys.stdout)
 
 
 @query_app.command()
@@ -87,9 +145,14 @@ def run(
         10000,
         help="The number of records to pull in a batch.",
     ),
-    check_interval: int = typer.Option(
-        5,
-        help="How long to wait between job status checks",
+    check_interval: float = typer.Option(
+        30,
+        help="The longest wait in seconds between job status checks. The wait starts at initial-check-interval "
+        "and doubles while the job runs.",
+    ),
+    initial_check_interval: float = typer.Option(
+        0.5,
+        help="The wait in seconds before the first job status check.",
     ),
     download_path: str = typer.Option(
         "./data",
@@ -100,27 +163,257 @@ def run(
         callback=query_option_callback,
         help="The query operation to perform: query or queryAll",
     ),
+    chunk_size: int = typer.Option(
+        bulk2.DOWNLOAD_CHUNK_SIZE,
+        help="The largest number of bytes held in memory per batch while streaming results to disk.",
+    ),
+    parallel_offsets: bool = typer.Option(
+        False,
+        help="Split the results into offset based batches and download them in parallel instead of following the "
+        "Sforce-Locator header page by page.",
+    ),
+    max_connections: int = typer.Option(
+        100,
+        help="The maximum number of open connections per download worker.",
+    ),
+    max_keepalive_connections: int = typer.Option(
+        20,
+        help="The maximum number of idle connections each download worker keeps open for reuse.",
+    ),
+    http2: bool = typer.Option(
+        False,
+        help="Multiplex result downloads over HTTP/2, requires the h2 package.",
+    ),
+    initial_concurrency: int = typer.Option(
+        4,
+        help="The number of result requests in flight when a parallel offset download starts.",
+    ),
+    min_concurrency: int = typer.Option(
+        1,
+        help="The fewest result requests kept in flight when backing off from throttling.",
+    ),
+    max_concurrency: int = typer.Option(
+        32,
+        help="The most result requests allowed in flight while downloads stay healthy.",
+    ),
+    compress: bool = typer.Option(
+        False,
+        help="Request the results gzip compressed, decompress them off the event loop and report the bytes "
+        "saved. Without it the results are requested uncompressed.",
+    ),
+    split: int = typer.Option(
+        1,
+        help="Split the query into this many queries over ranges of split-field, run as parallel jobs whose "
+        "results are downloaded together.",
+    ),
+    split_field: str = typer.Option(
+        "Id",
+        help="The field the query is split on when split is more than 1: Id, or a datetime field such as "
+        "CreatedDate.",
+    ),
+    incremental: bool = typer.Option(
+        False,
+        help="Only load the records modified since the last incremental run of this object downloaded in full.",
+    ),
+    overlap_minutes: float = typer.Option(
+        5,
+        help="How far before the watermark an incremental run starts, to pick up records from late commits.",
+    ),
 ):
     """
     Creates a query job and polls until the job is complete before downloading the data.
     """
 
-    query_job = bulk2.create_query_job(
-        query=query, version=version, operation=operation
+    pool_options = bulk2.ClientPoolOptions(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        http2=http2,
     )
-    job_id = query_job.get("id")
-    job_status = query_job.get("state")
-    while job_status in ["UploadComplete", "InProgress"]:
-        query_job = bulk2.get_job(job_id=job_id, version=version)
-        job_status = query_job.get("state")
-        sleep(check_interval)
-
-    print(
-        bulk2.download_query_data(
-            job_id=job_id,
-            version=version,
-            download_path=download_path,
-            batch_size=batch_size,
-        ),
-        file=sys.stdout,
+    controller = AIMDController(
+        initial=initial_concurrency,
+        minimum=min_concurrency,
+        maximum=max_concurrency,
     )
+    backoff = PollBackoff(initial=initial_check_interval, maximum=check_interval)
+
+    with BulkSession(pool_options=pool_options) as session:
+        if split > 1:
+            with RunProgress("Downloading"):
+                split_manifest = session.run_split_query(
+                    query=query,
+                    chunks=split,
+                    field=split_field,
+                    version=version,
+                    operation=operation,
+                    download_path=download_path,
+                    batch_size=batch_size,
+                    chunk_size=chunk_size,
+                    parallel_offsets=parallel_offsets,
+                    compress=compress,
+                    backoff=backoff,
+                    controller=controller,
+                    incremental=incremental,
+                    overlap=timedelta(minutes=overlap_minutes),
+                )
+            print(json.dumps(split_manifest, indent=2), file=sys.stdout)
+            return
+
+        if incremental:
+            watermarks = WatermarkStore()
+            instance_url = session.credentials.instance_url
+            object_name = soql.get_object_name(query)
+            query = incremental_query(
+                query,
+                watermarks.get(instance_url, object_name),
+                timedelta(minutes=overlap_minutes),
+            )
+
+        query_job = session.create_query_job(
+            query=query, version=version, operation=operation
+        )
+        if not isinstance(query_job, dict) or query_job.get("id") is None:
+            # create_query_job has already printed the error.
+            raise typer.Exit(code=1)
+        job_id = query_job["id"]
+        created_date = query_job.get("createdDate")
+        query_job = session.wait_for_job(
+            job_id=job_id, kind="query", version=version, backoff=backoff
+        )
+        if not isinstance(query_job, dict) or query_job.get("state") != "JobComplete":
+            print(json.dumps(obj=query_job, indent=2), file=stderr)
+            raise typer.Exit(code=1)
+
+        if query_job.get("numberRecordsProcessed") == 0:
+            print("Record Count is 0, No results to process", file=stderr)
+            if incremental:
+                watermarks.set(
+                    instance_url, object_name, soql.parse_datetime(created_date)
+                )
+            return
+
+        with RunProgress("Downloading"):
+            completed_job = session.download_query_data(
+                job_id=job_id,
+                version=version,
+                download_path=download_path,
+                batch_size=batch_size,
+                chunk_size=chunk_size,
+                parallel_offsets=parallel_offsets,
+                compress=compress,
+                controller=controller,
+            )
+    if incremental:
+        batches = bulk2.CompletedJob.parse_raw(completed_job).batches
+        if all(batch.status == "COMPLETE" for batch in batches):
+            watermarks.set(instance_url, object_name, soql.parse_datetime(created_date))
+        else:
+            print(
+                f"{object_name}: the watermark was left as it was, not every batch downloaded",
+                file=stderr,
+            )
+    print(completed_job, file=sys.stdout)
+
+
+@query_app.command()
+def run_manifest(
+    manifest_path: str = typer.Argument(
+        ...,
+        help="A JSON, or YAML with PyYAML installed, list of queries, each with an object, query, and optionally "
+        "an operation, download_path, batch_size and whether it is incremental.",
+    ),
+    version: str = typer.Option(
+        "53.0",
+        help="The API version to use when creating the jobs.",
+    ),
+    download_path: str = typer.Option(
+        "./data",
+        help="The directory results are downloaded under, in a directory per object, unless a query sets its own "
+        "download_path.",
+    ),
+    batch_size: int = typer.Option(
+        10000,
+        help="The number of records to pull in a batch, unless a query sets its own batch_size.",
+    ),
+    check_interval: float = typer.Option(
+        30,
+        help="The longest wait in seconds between status checks of a job.",
+    ),
+    initial_check_interval: float = typer.Option(
+        0.5,
+        help="The wait in seconds before the first status check of each job.",
+    ),
+    chunk_size: int = typer.Option(
+        bulk2.DOWNLOAD_CHUNK_SIZE,
+        help="The largest number of bytes held in memory per batch while streaming results to disk.",
+    ),
+    parallel_offsets: bool = typer.Option(
+        False,
+        help="Split the results into offset based batches and download them in parallel instead of following the "
+        "Sforce-Locator header page by page.",
+    ),
+    max_connections: int = typer.Option(
+        100,
+        help="The maximum number of open connections per download worker.",
+    ),
+    max_keepalive_connections: int = typer.Option(
+        20,
+        help="The maximum number of idle connections each download worker keeps open for reuse.",
+    ),
+    http2: bool = typer.Option(
+        False,
+        help="Multiplex result downloads over HTTP/2, requires the h2 package.",
+    ),
+    initial_concurrency: int = typer.Option(
+        4,
+        help="The number of result requests in flight, across every job, when the downloads start.",
+    ),
+    min_concurrency: int = typer.Option(
+        1,
+        help="The fewest result requests kept in flight when backing off from throttling.",
+    ),
+    max_concurrency: int = typer.Option(
+        32,
+        help="The most result requests allowed in flight across every job while downloads stay healthy.",
+    ),
+    compress: bool = typer.Option(
+        False,
+        help="Request the results gzip compressed and decompress them off the event loop. Without it the "
+        "results are requested uncompressed.",
+    ),
+    overlap_minutes: float = typer.Option(
+        5,
+        help="How far before the watermark incremental queries start, to pick up records from late commits.",
+    ),
+):
+    """
+    Creates a query job for every query in a manifest at once, then downloads the results of each job as soon as
+    it completes, with every download sharing one concurrency limit.
+    """
+
+    with BulkSession(
+        pool_options=bulk2.ClientPoolOptions(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            http2=http2,
+        )
+    ) as session:
+        with RunProgress("Downloading"):
+            results = session.run_query_manifest(
+                queries=bulk2.load_query_manifest(manifest_path),
+                version=version,
+                download_path=download_path,
+                batch_size=batch_size,
+                chunk_size=chunk_size,
+                parallel_offsets=parallel_offsets,
+                compress=compress,
+                backoff=PollBackoff(
+                    initial=initial_check_interval, maximum=check_interval
+                ),
+                controller=AIMDController(
+                    initial=initial_concurrency,
+                    minimum=min_concurrency,
+                    maximum=max_concurrency,
+                ),
+                overlap=timedelta(minutes=overlap_minutes),
+            )
+    print(json.dumps([result.dict() for result in results], indent=2), file=sys.stdout)
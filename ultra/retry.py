@@ -0,0 +1,305 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from time import perf_counter
+from email.utils import parsedate_to_datetime
+from sys import stderr
+from typing import List, Optional, Tuple
+
+import httpx
+from pydantic import BaseModel
+from tenacity import AsyncRetrying, RetryCallState
+
+from ultra.file_operations import request_is_replayable
+from ultra.limits import LimitsMonitor, default_monitor
+from ultra.metrics import MetricsRecorder, default_recorder
+
+# Errors raised before a request reached Salesforce, which are safe to retry for any request.
+CONNECTION_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Errors raised after a request may have been processed, only retried for requests that can be repeated.
+READ_ERRORS = (httpx.ReadError, httpx.ReadTimeout, httpx.RemoteProtocolError)
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+
+class RetryPolicy(BaseModel):
+    """
+    Which failed requests are sent again and how long to wait before each attempt. The wait doubles from
+    `initial` up to `maximum` seconds and a random part of it is taken, so clients throttled together do not
+    all come back together. A Retry-After header, when sent, is waited for instead.
+
+    Requests that are not idempotent, like creating a job, are only retried when Salesforce cannot have acted
+    on them: connection errors, and the statuses in `retry_unsafe_status_codes`.
+    """
+
+    max_attempts: int = int(os.getenv("SFDC_MAX_ATTEMPTS", 5))
+    initial: float = 1.0
+    maximum: float = 60.0
+    multiplier: float = 2.0
+    retry_status_codes: Tuple[int, ...] = (429, 500, 502, 503, 504)
+    retry_unsafe_status_codes: Tuple[int, ...] = (429, 503)
+    retry_error_codes: Tuple[str, ...] = ("REQUEST_LIMIT_EXCEEDED",)
+
+    def delay(self, attempt: int, response: Optional[httpx.Response] = None) -> float:
+        retry_after = parse_retry_after(response) if response is not None else None
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(
+            0, min(self.initial * self.multiplier ** (attempt - 1), self.maximum)
+        )
+
+
+class RetryBudget:
+    """
+    The number of retries left for a run, shared by every client built with it, so a run against an org that
+    is down gives up rather than retrying every request max_attempts times. It is safe to share between threads,
+    each worker process has its own.
+    """
+
+    def __init__(self, retries: int = int(os.getenv("SFDC_RETRY_BUDGET", 200))):
+        self.retries = retries
+        self.used = 0
+        self._lock = threading.Lock()
+        self._exhausted_reported = False
+
+    def take(self) -> bool:
+        """
+        :return: Whether a retry was left and has been taken.
+        """
+        with self._lock:
+            if self.used >= self.retries:
+                if not self._exhausted_reported:
+                    self._exhausted_reported = True
+                    print(
+                        f"The retry budget of {self.retries} is used up, failed requests are no longer retried",
+                        file=stderr,
+                    )
+                return False
+            self.used += 1
+            return True
+
+
+# The budget used by clients built without one, which makes it the budget of a run of the CLI.
+default_budget = RetryBudget()
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """
+    :return: The seconds to wait given by the Retry-After header, in seconds or as an HTTP date, if any.
+    """
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def _retry_reason(
+    policy: RetryPolicy, request: httpx.Request, response: httpx.Response
+) -> Optional[str]:
+    """
+    :return: Why the response should be retried, or None if it should be returned. The body of error responses
+        that may carry a retryable error code is read.
+    """
+    idempotent = request.method in IDEMPOTENT_METHODS
+    status_codes = (
+        policy.retry_status_codes if idempotent else policy.retry_unsafe_status_codes
+    )
+    if response.status_code in status_codes:
+        return f"HTTP {response.status_code}"
+    if response.status_code in (400, 403):
+        for error_code in policy.retry_error_codes:
+            if error_code.encode() in response.content:
+                return error_code
+    return None
+
+
+def _retry_exception(
+    policy: RetryPolicy, request: httpx.Request, error: Exception
+) -> bool:
+    if isinstance(error, CONNECTION_ERRORS):
+        return True
+    return isinstance(error, READ_ERRORS) and request.method in IDEMPOTENT_METHODS
+
+
+class StreamInterrupted(Exception):
+    """
+    Raised when the body of a response is cut off by a read error after its headers arrived. The transports
+    return as soon as the headers arrive, so they cannot retry it.
+    """
+
+
+def retry_interrupted_streams(
+    max_attempts: int, policy: RetryPolicy = None, budget: RetryBudget = None
+) -> AsyncRetrying:
+    """
+    Retries a download only when its body was interrupted, as a StreamInterrupted error. Every retry is taken
+    from the budget and waits as the policy does, so downloads share the retries and backoff of the transports.
+    Once the attempts or the budget run out, the StreamInterrupted error is raised.
+    """
+    policy = policy if policy is not None else RetryPolicy()
+    budget = budget if budget is not None else default_budget
+
+    def should_retry(retry_state: RetryCallState) -> bool:
+        return (
+            retry_state.attempt_number < max_attempts
+            and retry_state.outcome.failed
+            and isinstance(retry_state.outcome.exception(), StreamInterrupted)
+            and budget.take()
+        )
+
+    return AsyncRetrying(
+        retry=should_retry,
+        wait=lambda retry_state: policy.delay(retry_state.attempt_number),
+    )
+
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    Wraps a transport to retry failed requests according to a RetryPolicy while the RetryBudget lasts. The
+    reason for every retry of a request is listed in its response's extensions under "retries". A request whose
+    body cannot be sent twice, like one streamed from a generator, is never retried. Every attempt
+    waits on the LimitsMonitor first, and reports the API usage of its response to it. Every request is timed
+    by the MetricsRecorder.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport = None,
+        policy: RetryPolicy = None,
+        budget: RetryBudget = None,
+        monitor: LimitsMonitor = None,
+        recorder: MetricsRecorder = None,
+    ):
+        self.transport = transport if transport is not None else httpx.HTTPTransport()
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.budget = budget if budget is not None else default_budget
+        self.monitor = monitor if monitor is not None else default_monitor
+        self.recorder = recorder if recorder is not None else default_recorder
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        retries: List[str] = []
+        started = perf_counter()
+        replayable = request_is_replayable(request)
+        for attempt in range(1, self.policy.max_attempts + 1):
+            last_attempt = attempt == self.policy.max_attempts
+            self.monitor.wait()
+            try:
+                response = self.transport.handle_request(request)
+            except Exception as error:
+                if (
+                    last_attempt
+                    or not replayable
+                    or not _retry_exception(self.policy, request, error)
+                    or not self.budget.take()
+                ):
+                    self.recorder.record_request(
+                        request, perf_counter() - started, len(retries), error=error
+                    )
+                    raise
+                retries.append(type(error).__name__)
+                time.sleep(self.policy.delay(attempt))
+                continue
+
+            self.monitor.observe(response, request)
+            if response.status_code >= 400:
+                response.read()
+            reason = _retry_reason(self.policy, request, response)
+            if (
+                reason is None
+                or last_attempt
+                or not replayable
+                or not self.budget.take()
+            ):
+                response.extensions["retries"] = retries
+                self.recorder.record_request(
+                    request, perf_counter() - started, len(retries), response=response
+                )
+                return response
+            retries.append(reason)
+            response.close()
+            time.sleep(self.policy.delay(attempt, response))
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """
+    The async counterpart of RetryTransport.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport = None,
+        policy: RetryPolicy = None,
+        budget: RetryBudget = None,
+        monitor: LimitsMonitor = None,
+        recorder: MetricsRecorder = None,
+    ):
+        self.transport = (
+            transport if transport is not None else httpx.AsyncHTTPTransport()
+        )
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.budget = budget if budget is not None else default_budget
+        self.monitor = monitor if monitor is not None else default_monitor
+        self.recorder = recorder if recorder is not None else default_recorder
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        retries: List[str] = []
+        started = perf_counter()
+        replayable = request_is_replayable(request)
+        for attempt in range(1, self.policy.max_attempts + 1):
+            last_attempt = attempt == self.policy.max_attempts
+            if self.monitor.delay() > 0:
+                # A pause reads /limits, which is done in a thread to keep the event loop free.
+                await asyncio.to_thread(self.monitor.wait)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except Exception as error:
+                if (
+                    last_attempt
+                    or not replayable
+                    or not _retry_exception(self.policy, request, error)
+                    or not self.budget.take()
+                ):
+                    self.recorder.record_request(
+                        request, perf_counter() - started, len(retries), error=error
+                    )
+                    raise
+                retries.append(type(error).__name__)
+                await asyncio.sleep(self.policy.delay(attempt))
+                continue
+
+            self.monitor.observe(response, request)
+            if response.status_code >= 400:
+                await response.aread()
+            reason = _retry_reason(self.policy, request, response)
+            if (
+                reason is None
+                or last_attempt
+                or not replayable
+                or not self.budget.take()
+            ):
+                response.extensions["retries"] = retries
+                self.recorder.record_request(
+                    request, perf_counter() - started, len(retries), response=response
+                )
+                return response
+            retries.append(reason)
+            await response.aclose()
+            await asyncio.sleep(self.policy.delay(attempt, response))
+
+    async def aclose(self):
+        await self.transport.aclose()
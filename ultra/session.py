@@ -0,0 +1,244 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import httpx
+
+from ultra import bulk2
+from ultra.limits import default_monitor
+from ultra.polling import PollBackoff
+from ultra.sfjwt import CredentialModel, load_credentials
+
+
+class BulkSession:
+    """
+    Owns the credentials and the pooled clients used to talk to an org, and exposes the bulk2 operations as
+    methods that share them, so connections are opened once per session rather than once per call.
+
+    The operations that poll or download asynchronously, such as wait_for_job and download_query_data, are run
+    on an event loop the session keeps, so they all share its async client and connections. The clients and the
+    loop are closed with close, or by using the session as a context manager.
+
+    The async client can also be used directly from another event loop, it is bound to the loop it is first used
+    on. It is then closed with aclose, or by using the session as an async context manager, from that loop.
+    """
+
+    def __init__(
+        self,
+        credentials: CredentialModel = None,
+        pool_options: bulk2.ClientPoolOptions = None,
+    ):
+        self.credentials = (
+            credentials if credentials is not None else load_credentials()
+        )
+        self.pool_options = (
+            pool_options if pool_options is not None else bulk2.ClientPoolOptions()
+        )
+        default_monitor.attach(self.credentials)
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = bulk2.build_client(
+                credentials=self.credentials, pool_options=self.pool_options
+            )
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = bulk2.build_async_client(
+                credentials=self.credentials, pool_options=self.pool_options
+            )
+        return self._async_client
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        The event loop the session runs its async operations on, with the async client bound to it.
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+        if self._loop is not None:
+            if self._async_client is not None:
+                self._loop.run_until_complete(self._async_client.aclose())
+                self._async_client = None
+            self._loop.close()
+            self._loop = None
+
+    async def aclose(self):
+        self.close()
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def __enter__(self) -> "BulkSession":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    async def __aenter__(self) -> "BulkSession":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def get_job(self, job_id: str, version: str) -> Dict:
+        return bulk2.get_job(
+            job_id=job_id,
+            version=version,
+            client=self.client,
+            credentials=self.credentials,
+        )
+
+    def wait_for_job(
+        self, job_id: str, kind: str, version: str, backoff: PollBackoff = None
+    ) -> Dict:
+        return bulk2.wait_for_job(
+            job_id=job_id,
+            kind=kind,
+            version=version,
+            credentials=self.credentials,
+            backoff=backoff,
+            async_client=self.async_client,
+            loop=self.loop,
+        )
+
+    def get_query_job(self, job_id: str, version: str) -> Dict:
+        return bulk2.get_query_job(
+            job_id=job_id,
+            version=version,
+            client=self.client,
+            credentials=self.credentials,
+        )
+
+    def create_query_job(
+        self, query: str, version: str, operation: str = "query"
+    ) -> Dict:
+        return bulk2.create_query_job(
+            query=query,
+            version=version,
+            operation=operation,
+            client=self.client,
+            credentials=self.credentials,
+        )
+
+    def get_query_data(
+        self, job_id: str, locator: int, max_records: int, version: str
+    ) -> str:
+        return bulk2.get_query_data(
+            job_id=job_id,
+            locator=locator,
+            max_records=max_records,
+            version=version,
+            client=self.client,
+            credentials=self.credentials,
+        )
+
+    def download_query_data(self, job_id: str, **options) -> str:
+        """
+        See bulk2.download_query_data for the options.
+        """
+        return bulk2.download_query_data(
+            job_id=job_id,
+            pool_options=options.pop("pool_options", self.pool_options),
+            client=self.client,
+            credentials=self.credentials,
+            async_client=self.async_client,
+            loop=self.loop,
+            **options,
+        )
+
+    def run_query_manifest(
+        self, queries: List[bulk2.QuerySpec], **options
+    ) -> List[bulk2.QueryRunResult]:
+        """
+        See bulk2.run_query_manifest for the options.
+        """
+        return bulk2.run_query_manifest(
+            queries=queries,
+            pool_options=options.pop("pool_options", self.pool_options),
+            client=self.client,
+            credentials=self.credentials,
+            async_client=self.async_client,
+            loop=self.loop,
+            **options,
+        )
+
+    def run_split_query(self, query: str, chunks: int, **options) -> Dict:
+        """
+        See bulk2.run_split_query for the options.
+        """
+        return bulk2.run_split_query(
+            query=query,
+            chunks=chunks,
+            pool_options=options.pop("pool_options", self.pool_options),
+            client=self.client,
+            credentials=self.credentials,
+            async_client=self.async_client,
+            loop=self.loop,
+            **options,
+        )
+
+    def create_ingest_job(
+        self,
+        object_name: str,
+        operation: str,
+        version: str,
+        external_id_field_name: str = None,
+    ) -> Dict:
+        return bulk2.create_ingest_job(
+            object_name=object_name,
+            operation=operation,
+            external_id_field_name=external_id_field_name,
+            version=version,
+            client=self.client,
+            credentials=self.credentials,
+        )
+
+    def load_ingest_job_data(
+        self, job_id: str, file_path: str, version: str, compress: bool = False
+    ) -> Dict:
+        return bulk2.load_ingest_job_data(
+            job_id=job_id,
+            file_path=file_path,
+            version=version,
+            client=self.client,
+            credentials=self.credentials,
+            compress=compress,
+        )
+
+    def ingest_job_data_batches(self, **options) -> List[Dict]:
+        """
+        See bulk2.ingest_job_data_batches for the options.
+        """
+        return bulk2.ingest_job_data_batches(
+            client=self.client, credentials=self.credentials, **options
+        )
+
+    def wait_for_ingest_jobs(
+        self,
+        ingest_job_results: List[Dict],
+        version: str,
+        download_path: str = "./results",
+        backoff: PollBackoff = None,
+    ) -> List[Dict]:
+        return bulk2.wait_for_ingest_jobs(
+            ingest_job_results=ingest_job_results,
+            version=version,
+            download_path=download_path,
+            credentials=self.credentials,
+            backoff=backoff,
+            pool_options=self.pool_options,
+            async_client=self.async_client,
+            loop=self.loop,
+        )
@@ -1,18 +1,22 @@
-from httpx import Client  # Used to make http/s requests
+from httpx import Auth, Client, Request, Response  # Used to make http/s requests
 import jwt  # JWT Library
 import datetime
-from typing import Tuple
+from typing import AsyncGenerator, Dict, Generator, Tuple
 import json
 from pydantic import BaseModel
 import sys
 import pathlib
+import asyncio
+import threading
 from typing import Optional
 from os import environ
 from ultra import config
+from ultra.file_operations import request_is_replayable, write_atomic
 
 
 class CredentialModel(BaseModel):
     private_key: Optional[str]
+    private_key_path: Optional[str]
     username: str
     consumer_id: str
     environment: str
@@ -97,6 +101,14 @@ def jwt_login(
     return str(body["instance_url"]), str(body["access_token"])
 
 
+# Credentials loaded from a file, keyed by the file's path, so the file is read once per process and every
+# caller shares the same object, and with it any token refreshed since.
+_credential_cache: Dict[str, CredentialModel] = {}
+
+# Held while a token is refreshed, so concurrent requests that all failed with the old token refresh it once.
+_refresh_lock = threading.Lock()
+
+
 # TODO: Really Need Tests For This
 def load_credentials(
     username: str = None,
@@ -105,7 +117,6 @@ def load_credentials(
     environment: str = None,
     json_credential_file: str = config.ULTRALOADER_CREDENTIAL_FILE_PATH,
 ) -> CredentialModel:
-
     """
     Loads the credentials to a dictionary and raises exceptions if the credentials are specified incorrectly.
     If the credential file is specified, the other values must be None.
@@ -129,11 +140,16 @@ def load_credentials(
         and json_credential_file is not None
         and pathlib.Path(json_credential_file).expanduser().is_file()
     ):
+        cache_key = str(pathlib.Path(json_credential_file).expanduser().resolve())
+        if cache_key in _credential_cache:
+            return _credential_cache[cache_key]
         try:
             with open(
                 pathlib.Path(json_credential_file).expanduser(), "r"
             ) as json_cred_file:
-                return CredentialModel(**json.load(json_cred_file))
+                credentials = CredentialModel(**json.load(json_cred_file))
+                _credential_cache[cache_key] = credentials
+                return credentials
         except FileNotFoundError as e:
             print(
                 f"Private key not found at: {private_key}, make sure it's there!",
@@ -154,3 +170,96 @@ def load_credentials(
         raise RuntimeError(
             f"Only a credential file or a set of raw credentials may be passed to the load_credentials method. "
         )
+
+
+def refresh_credentials(
+    credentials: CredentialModel, stale_token: Optional[str] = None
+) -> CredentialModel:
+    """
+    Logs in again with the JWT flow and updates the token and instance url of credentials in place. When the
+    credentials were loaded from a credential file, the file is updated with the new token as well.
+
+    :param stale_token: The token a request was rejected with. If the credentials already hold a different
+        token, another request refreshed it in the meantime and no new login is made.
+
+    :return: The refreshed credentials.
+    """
+    with _refresh_lock:
+        if stale_token is not None and credentials.token != stale_token:
+            return credentials
+
+        private_key = credentials.private_key or _load_private_key(
+            credentials.private_key_path
+        )
+        instance_url, token = jwt_login(
+            consumer_id=credentials.consumer_id,
+            username=credentials.username,
+            private_key=private_key,
+            environment=credentials.environment,
+        )
+        credentials.instance_url = instance_url
+        credentials.token = token
+
+        for file_path, cached in _credential_cache.items():
+            if cached is credentials:
+                # Several processes may refresh the same file at once.
+                write_atomic(
+                    file_path,
+                    credentials.json(
+                        exclude_none=True, exclude={"private_key"}, indent=2
+                    ),
+                )
+        return credentials
+
+
+class SalesforceAuth(Auth):
+    """
+    Sends the current token of credentials with every request. When a request is rejected with a 401, the
+    token is refreshed with refresh_credentials, once no matter how many requests were rejected with it, and
+    the request is sent again with the new token.
+
+    Request bodies have to be re-iterable to be sent again, as bytes or file_operations.FileChunks are. The 401
+    response of a request streamed from a generator is returned as is, after the token is refreshed. When the
+    token cannot be refreshed, e.g. no private key is configured, the error is printed and the 401 returned.
+    """
+
+    def __init__(self, credentials: CredentialModel):
+        self.credentials = credentials
+
+    def _authorize(self, request: Request) -> str:
+        token = self.credentials.token
+        request.headers["Authorization"] = f"Bearer {token}"
+        return token
+
+    def _refresh(self, stale_token: str) -> bool:
+        """
+        :return: Whether the token was refreshed.
+        """
+        try:
+            refresh_credentials(self.credentials, stale_token=stale_token)
+        except Exception as e:
+            print(
+                f"Could not refresh the token: {type(e).__name__}: {e}", file=sys.stderr
+            )
+            return False
+        return True
+
+    def sync_auth_flow(self, request: Request) -> Generator[Request, Response, None]:
+        token = self._authorize(request)
+        response = yield request
+        if response.status_code == 401:
+            if self._refresh(token) and request_is_replayable(request):
+                self._authorize(request)
+                yield request
+
+    async def async_auth_flow(
+        self, request: Request
+    ) -> AsyncGenerator[Request, Response]:
+        token = self._authorize(request)
+        response = yield request
+        if response.status_code == 401:
+            # The login is a blocking request, so it waits for the lock in a thread rather than on the event loop.
+            refreshed = await asyncio.to_thread(self._refresh, token)
+            if refreshed and request_is_replayable(request):
+                self._authorize(request)
+                yield request
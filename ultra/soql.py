@@ -0,0 +1,134 @@
+import re
+from datetime import datetime, timezone
+from typing import List, Optional
+
+# The clauses that can follow WHERE in a SOQL query, in the order they are allowed to appear.
+TRAILING_CLAUSES = re.compile(
+    r"\b(WITH|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT|OFFSET|FOR)\b", re.IGNORECASE
+)
+
+
+def _mask(query: str) -> str:
+    """
+    Blanks out string literals and anything in parentheses, keeping the length of the query, so the clauses of
+    the outer query can be found with regular expressions.
+    """
+    masked = []
+    depth = 0
+    in_string = False
+    escaped = False
+    for char in query:
+        if in_string:
+            masked.append(" ")
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == "'":
+                in_string = False
+        elif char == "'":
+            in_string = True
+            masked.append(" ")
+        elif char == "(":
+            depth += 1
+            masked.append(" ")
+        elif char == ")":
+            depth -= 1
+            masked.append(" ")
+        else:
+            masked.append(" " if depth > 0 else char)
+    return "".join(masked)
+
+
+def get_object_name(query: str) -> str:
+    """
+    :return: The object the outer query selects from.
+    """
+    match = re.search(r"\bFROM\s+(\w+)", _mask(query), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Could not find the object queried in: {query}")
+    return match.group(1)
+
+
+def get_limit(query: str) -> Optional[int]:
+    """
+    :return: The LIMIT of the outer query, if it has one.
+    """
+    match = re.search(r"\bLIMIT\s+(\d+)", _mask(query), re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def add_where_clause(query: str, predicate: str) -> str:
+    """
+    Adds a condition to the outer query. It is ANDed with the existing WHERE clause if there is one, otherwise a
+    WHERE clause is added ahead of any ORDER BY, LIMIT or other trailing clause.
+    """
+    masked = _mask(query)
+    from_match = re.search(r"\bFROM\s+\w+", masked, re.IGNORECASE)
+    if from_match is None:
+        raise ValueError(f"Could not find the object queried in: {query}")
+
+    where_match = re.compile(r"\bWHERE\b", re.IGNORECASE).search(
+        masked, from_match.end()
+    )
+    clause_start = where_match.end() if where_match else from_match.end()
+    trailing_match = TRAILING_CLAUSES.search(masked, clause_start)
+    clause_end = trailing_match.start() if trailing_match else len(query)
+
+    head = query[: where_match.start() if where_match else clause_end].rstrip()
+    tail = query[clause_end:].strip()
+    if where_match:
+        condition = f"WHERE ({query[clause_start:clause_end].strip()}) AND {predicate}"
+    else:
+        condition = f"WHERE {predicate}"
+    return " ".join(part for part in (head, condition, tail) if part)
+
+
+def datetime_boundaries(
+    min_datetime: datetime, max_datetime: datetime, chunks: int
+) -> List[str]:
+    """
+    Splits the time between min_datetime and max_datetime into chunks equal parts.
+
+    :return: The chunks - 1 datetimes between the parts as SOQL datetime literals.
+    """
+    boundaries = []
+    for index in range(1, chunks):
+        boundary = format_datetime(
+            min_datetime + (max_datetime - min_datetime) * index / chunks
+        )
+        if boundary not in boundaries:
+            boundaries.append(boundary)
+    return boundaries
+
+
+def parse_datetime(value: str) -> datetime:
+    """
+    Parses a datetime as returned by the REST API, e.g. 2021-07-01T12:30:00.000+0000.
+    """
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+
+def format_datetime(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def range_predicates(field: str, boundaries: List[str], quote: bool) -> List[str]:
+    """
+    Builds a predicate for each range between the boundaries. The first range is open below and the last open
+    above, so together they match every record exactly once.
+
+    :param quote: Whether the boundaries are string literals, which is the case for Ids but not datetimes.
+    """
+    literals = [f"'{boundary}'" if quote else boundary for boundary in boundaries]
+    lower: List[Optional[str]] = [None] + literals
+    upper: List[Optional[str]] = literals + [None]
+    predicates = []
+    for low, high in zip(lower, upper):
+        conditions = []
+        if low is not None:
+            conditions.append(f"{field} >= {low}")
+        if high is not None:
+            conditions.append(f"{field} < {high}")
+        predicates.append(" AND ".join(conditions) if conditions else "")
+    return predicates
@@ -0,0 +1,54 @@
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from ultra import config, soql
+from ultra.file_operations import write_atomic
+
+# The field incremental queries filter on, it changes whenever a record or anything rolled up into it does.
+WATERMARK_FIELD = "SystemModstamp"
+
+
+class WatermarkStore:
+    """
+    The high water marks of incremental queries, kept in a json file keyed by instance url and then object. A
+    watermark is the createdDate of the last query job whose results were downloaded in full, so every record
+    modified after it is picked up by the next run.
+    """
+
+    def __init__(self, file_path: str = config.ULTRALOADER_WATERMARK_FILE_PATH):
+        self.path = Path(file_path).expanduser()
+
+    def _load(self) -> Dict[str, Dict[str, str]]:
+        if not self.path.is_file():
+            return {}
+        with open(self.path) as watermarks_in:
+            return json.load(watermarks_in)
+
+    def get(self, instance_url: str, object_name: str) -> Optional[datetime]:
+        watermark = self._load().get(instance_url, {}).get(object_name)
+        return soql.parse_datetime(watermark) if watermark else None
+
+    def set(self, instance_url: str, object_name: str, watermark: datetime):
+        watermarks = self._load()
+        watermarks.setdefault(instance_url, {})[object_name] = watermark.strftime(
+            "%Y-%m-%dT%H:%M:%S.%f%z"
+        )
+        # Written atomically so a run killed part way through cannot leave the store corrupt.
+        write_atomic(self.path, json.dumps(watermarks, indent=2))
+
+
+def incremental_query(
+    query: str, watermark: Optional[datetime], overlap: timedelta = timedelta(0)
+) -> str:
+    """
+    Limits a query to the records modified after the watermark, less the overlap, which picks up records from
+    transactions that committed after the watermark was taken but carry an earlier SystemModstamp. Without a
+    watermark, the query is returned unchanged and loads everything.
+    """
+    if watermark is None:
+        return query
+    return soql.add_where_clause(
+        query, f"{WATERMARK_FIELD} > {soql.format_datetime(watermark - overlap)}"
+    )